@@ -1,23 +1,1378 @@
 # CALCULADORA FINANCIERA PERSONAL
 
+# Arriba solo van los módulos livianos que usa casi todo el programa. Los demás
+# (json, csv, mmap, decimal, numpy, asyncio, argparse...) se importan dentro de
+# la función que los necesita: así abrir el programa para una sola tarea no paga
+# por cargar lo que esa tarea no usa (ver PASO 18)
+import math
+import os
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+from itertools import compress, count, islice
+from operator import itemgetter
+
 # =============================================================================
 # PASO 1: CREACION DE ESTRUCTURAS DE DATOS
 # =============================================================================
-# Aquí guardamos todos nuestros datos. Usamos listas de diccionarios porque:
-# - Las listas pueden crecer (agregar más elementos)
-# - Los diccionarios nos permiten guardar información organizada (como nombre y valor juntos)
+# Aquí guardamos todos nuestros datos. Antes usábamos listas de diccionarios,
+# pero cada diccionario ocupa cientos de bytes. Ahora guardamos los datos por
+# columnas: un arreglo para los valores, otro para las categorías y una lista
+# para los textos. Así cada registro ocupa muy poca memoria.
+
+# Las categorías de los gastos forman un árbol (servicios > energia > electricidad)
+# y se pueden crear más mientras el programa corre. Cada una tiene un código fijo
+# (un número) y los libros guardan ese código, no el nombre
+MAXIMO_CATEGORIAS = 65_536  # Los códigos se guardan en un array('H'): 2 bytes por registro
+
+
+class RegistroCategorias:
+    """
+    El catálogo de categorías de gastos:
+    - nombres: código -> nombre (una lista: el código es la posición)
+    - ids: nombre -> código (un diccionario: buscar un nombre cuesta O(1), sin recorrer la lista)
+    - padres: código -> código de la categoría que la contiene (-1 si es una categoría principal)
+    Un hijo siempre se crea después que su padre, así su código es mayor. Por eso, al
+    visitar los códigos de mayor a menor cada categoría se ve después de todas sus
+    subcategorías, y los totales suben por el árbol en una sola pasada (ver acumular)
+    """
+
+    def __init__(self, nombres=()):
+        self.nombres = []
+        self.ids = {}
+        self.padres = array("i")
+        self.profundidades = array("H")  # 0 para las principales, 1 para sus hijas...
+        self._hijos = {}                 # código -> códigos de sus subcategorías (solo las que tienen)
+        self._ramas = None               # Los códigos de _hijos de mayor a menor (se arma al usarla)
+        self.observadores = []           # Funciones que se llaman con el código de cada categoría nueva
+        for nombre in nombres:
+            self.agregar(nombre)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def __contains__(self, nombre):
+        return nombre in self.ids
+
+    @property
+    def tiene_jerarquia(self):
+        """True si alguna categoría tiene subcategorías"""
+        return bool(self._hijos)
+
+    def codigo(self, nombre):
+        """El código de una categoría por su nombre (ValueError si no existe)"""
+        codigo = self.ids.get(str(nombre).strip().lower())
+        if codigo is None:
+            raise ValueError(f"Categoría desconocida: {nombre!r}")
+        return codigo
+
+    def agregar(self, nombre, padre=None):
+        """
+        Crea la categoría nombre (dentro de padre, si se indica) y devuelve su código
+        Si ya existe dentro del mismo padre devuelve su código: crearla dos veces
+        (por ejemplo al repetir el diario) no es un error
+        """
+        nombre = str(nombre).strip().lower()
+        if not nombre or nombre.isdigit() or ">" in nombre:
+            # Un número se confundiría con la opción del menú y ">" separa la ruta
+            raise ValueError(f"Nombre de categoría no válido: {nombre!r}")
+        codigo_padre = -1 if padre is None else self.codigo(padre)
+        existente = self.ids.get(nombre)
+        if existente is not None:
+            if self.padres[existente] != codigo_padre:
+                raise ValueError(f"La categoría {nombre!r} ya existe en {self.ruta(existente)!r}")
+            return existente
+        if len(self.nombres) >= MAXIMO_CATEGORIAS:
+            raise ValueError(f"No se pueden crear más de {MAXIMO_CATEGORIAS} categorías")
+        codigo = len(self.nombres)
+        self.nombres.append(nombre)
+        self.ids[nombre] = codigo
+        self.padres.append(codigo_padre)
+        if codigo_padre < 0:
+            self.profundidades.append(0)
+        else:
+            self.profundidades.append(self.profundidades[codigo_padre] + 1)
+            if codigo_padre not in self._hijos:
+                self._hijos[codigo_padre] = []
+                self._ramas = None
+            self._hijos[codigo_padre].append(codigo)
+        for observador in self.observadores:
+            observador(codigo)
+        return codigo
+
+    def hijos(self, codigo):
+        """Los códigos de las subcategorías directas de una categoría"""
+        return self._hijos.get(codigo, [])
+
+    def ruta(self, codigo, separador=" > "):
+        """El nombre completo de una categoría: "servicios > energia > electricidad" """
+        partes = []
+        while codigo >= 0:
+            partes.append(self.nombres[codigo])
+            codigo = self.padres[codigo]
+        return separador.join(reversed(partes))
+
+    def en_orden(self):
+        """Todos los códigos en orden de árbol: cada categoría seguida de sus subcategorías"""
+        if not self._hijos:
+            return range(len(self.nombres))
+        resultado = []
+        pendientes = [codigo for codigo in range(len(self.nombres) - 1, -1, -1) if self.padres[codigo] < 0]
+        while pendientes:
+            codigo = pendientes.pop()
+            resultado.append(codigo)
+            pendientes.extend(reversed(self._hijos.get(codigo, ())))
+        return resultado
+
+    def acumular(self, totales):
+        """
+        Sube los totales por el árbol: recibe {código: número} y devuelve otro diccionario
+        donde cada categoría suma lo suyo más lo de todas sus subcategorías
+        Es una sola pasada por los totales, no una por cada nivel del árbol:
+        1. Cada categoría sin subcategorías le pasa su total a su padre
+        2. Las categorías con subcategorías (las ramas) le pasan el suyo al padre, de
+           mayor a menor código. Como las hijas tienen códigos mayores, cuando le toca
+           a una rama ya recibió lo de todas sus hijas
+        """
+        acumulado = dict(totales)
+        padres, hijos = self.padres, self._hijos
+        for codigo, total in totales.items():
+            padre = padres[codigo]
+            if padre >= 0 and codigo not in hijos:
+                acumulado[padre] = acumulado.get(padre, 0) + total
+        if self._ramas is None:
+            self._ramas = sorted(hijos, reverse=True)
+        for codigo in self._ramas:
+            padre = padres[codigo]
+            if padre >= 0 and codigo in acumulado:
+                acumulado[padre] = acumulado.get(padre, 0) + acumulado[codigo]
+        return acumulado
+
+    def a_estado(self):
+        """El catálogo como datos simples: [[nombre, código del padre], ...] en orden de código"""
+        return [[nombre, padre] for nombre, padre in zip(self.nombres, self.padres)]
+
+    def cargar_estado(self, estado):
+        """
+        Crea las categorías de un catálogo guardado con a_estado() que todavía no existan
+        Devuelve un array con el código actual de cada código guardado (para traducir columnas)
+        """
+        traduccion = array("i")
+        for nombre, padre in estado:
+            traduccion.append(self.agregar(nombre, None if padre < 0 else self.nombres[traduccion[padre]]))
+        return traduccion
+
+
+# Las categorías de siempre. Cada cuenta tiene su propio catálogo, que empieza con
+# estas y crece con las que esa cuenta agregue (las de una no se ven en las otras)
+CATEGORIAS_INICIALES = ("alimentacion", "transporte", "entretenimiento", "salud", "educacion", "servicios")
+
+# El catálogo de la cuenta del menú (cuenta_actual); también lo usan los libros sueltos
+categorias = RegistroCategorias(CATEGORIAS_INICIALES)
+
+# Lista de categorías para los gastos (como un menú de opciones). Es la misma lista
+# del catálogo, así que crece sola cuando se agregan categorías
+categorias_gastos = categorias.nombres
+
+# Diccionario para convertir el nombre de una categoría en su código (también del catálogo)
+codigo_categoria = categorias.ids
+
+# Cuántos registros se muestran por página en las listas
+TAMANO_PAGINA = 20
+
+
+# El monto más grande que se acepta, en centavos (diez billones de pesos)
+MAXIMO_CENTAVOS = 10**15
+
+# Las formas de redondear al centavo. Son los mismos textos que decimal.ROUND_HALF_UP,
+# etc., así no hace falta importar decimal para nombrarlas (solo para usarlas)
+ROUND_HALF_UP = "ROUND_HALF_UP"
+ROUND_CEILING = "ROUND_CEILING"
+ROUND_FLOOR = "ROUND_FLOOR"
+
+
+def a_centavos(valor, redondeo=ROUND_HALF_UP):
+    """
+    Convierte un monto (texto, int, float, Decimal o Dinero) en un número entero de centavos
+    El texto se lee con Decimal, así "0.1" son exactamente 10 centavos (con float serían 0.1000000000000000055...)
+    Si trae más de dos decimales se redondea al centavo según redondeo (por defecto, la mitad hacia arriba)
+    Si el valor no es un número lanza ValueError
+    """
+    if isinstance(valor, Dinero):
+        return valor.centavos
+    if isinstance(valor, bool):  # True es un int para Python (y Decimal(True) es 1), pero no es un monto
+        raise ValueError("Debe escribir solo números (ejemplo correcto: 1500 o 1500.50)")
+    if isinstance(valor, int):
+        return valor * 100
+    if isinstance(valor, float):
+        # Lo más común es un float que ya es un monto con centavos: se convierte sin Decimal
+        centavos = round(valor * 100) if abs(valor) < 1e12 else None
+        if centavos is not None and centavos / 100 == valor:
+            return centavos
+        valor = repr(valor)  # repr() da el número que se escribió: 0.1 y no 0.1000000000000000055...
+    elif isinstance(valor, str):
+        valor = valor.strip()
+        entero, punto, decimales = valor.partition(".")
+        if entero.isdecimal() and len(decimales) <= 2 and (decimales.isdecimal() or not decimales):
+            return int(entero) * 100 + int(decimales.ljust(2, "0"))  # "1500.5" -> 150050, sin Decimal
+    from decimal import Decimal
+    try:
+        numero = Decimal(valor)
+    except (TypeError, ValueError, ArithmeticError):
+        raise ValueError("Debe escribir solo números (ejemplo correcto: 1500 o 1500.50)") from None
+    if not numero.is_finite():  # "inf" o "nan" no son montos de dinero
+        raise ValueError("Debe escribir solo números (ejemplo correcto: 1500 o 1500.50)")
+    return int(numero.scaleb(2).to_integral_value(redondeo))
+
+def formatear_centavos(centavos, miles=","):
+    """
+    Centavos -> "1,234.56": lo mismo que f"{valor:,.2f}" pero exacto con cualquier cantidad
+    Con miles="" no se separan los miles ("1234.56"), como se escribe en un CSV
+    """
+    signo = "-" if centavos < 0 else ""
+    pesos, resto = divmod(abs(centavos), 100)
+    return f"{signo}{pesos:{miles}d}.{resto:02d}"
+
+
+class Dinero:
+    """
+    Una cantidad de dinero exacta, guardada como un número entero de centavos
+    - Dinero.desde("1500.50") o Dinero.desde(1500.5) son 150050 centavos
+    - f"{dinero:,.2f}" se ve igual que con un float: 1,500.50
+    - Se suma, se resta y se compara sin perder nunca un centavo
+    Sumar enteros es exacto y tan rápido como sumar float, así los totales no acumulan
+    errores de redondeo aunque se sumen millones de montos. Los libros no guardan objetos
+    Dinero sino solo los centavos, en un array('q') de 8 bytes por registro
+    """
+    __slots__ = ("centavos",)
+
+    def __init__(self, centavos=0):
+        self.centavos = centavos
+
+    @classmethod
+    def desde(cls, valor):
+        """Crea un Dinero desde un texto o un número (ver a_centavos)"""
+        return cls(a_centavos(valor))
+
+    def __add__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return Dinero(self.centavos + otro.centavos)
+
+    def __sub__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return Dinero(self.centavos - otro.centavos)
+
+    def __neg__(self):
+        return Dinero(-self.centavos)
+
+    def __eq__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return self.centavos == otro.centavos
+
+    def __lt__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return self.centavos < otro.centavos
+
+    def __le__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return self.centavos <= otro.centavos
+
+    def __gt__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return self.centavos > otro.centavos
+
+    def __ge__(self, otro):
+        if not isinstance(otro, Dinero):
+            return NotImplemented
+        return self.centavos >= otro.centavos
+
+    def __hash__(self):
+        return hash(self.centavos)
+
+    def __bool__(self):
+        return self.centavos != 0
+
+    def __float__(self):
+        return self.centavos / 100
+
+    def __format__(self, formato):
+        # Con Decimal el resultado es exacto y acepta los mismos formatos que un float (",.2f", ">10,.2f"...)
+        from decimal import Decimal
+        return format(Decimal(self.centavos).scaleb(-2), formato)
+
+    def __str__(self):
+        return formatear_centavos(self.centavos, miles="")
+
+    def __repr__(self):
+        return f"Dinero('{self}')"
+
+
+class Agregados:
+    """
+    Totales que se actualizan con cada cambio (registrar, modificar, eliminar)
+    Así el resumen no tiene que recorrer todos los registros: cada cambio cuesta O(1)
+    Las sumas se llevan en centavos (números enteros), así son exactas siempre
+    """
+
+    def __init__(self, usa_categoria=False):
+        self.cantidad = 0
+        self.total = 0  # En centavos
+        self.usa_categoria = usa_categoria
+        # Por cada categoría con registros guardamos su suma y cuántos registros tiene
+        # (diccionarios código -> número: con miles de categorías solo ocupan lugar las que se usan)
+        self.por_categoria = {}
+        self.cantidad_por_categoria = {}
+
+    def sumar(self, centavos, codigo=None):
+        self.cantidad += 1
+        self.total += centavos
+        if self.usa_categoria:
+            self.cantidad_por_categoria[codigo] = self.cantidad_por_categoria.get(codigo, 0) + 1
+            self.por_categoria[codigo] = self.por_categoria.get(codigo, 0) + centavos
+
+    def sumar_grupo(self, suma, cantidad, codigo=None):
+        """Suma de una vez un grupo de registros de la misma categoría ya sumados"""
+        self.cantidad += cantidad
+        self.total += suma
+        if self.usa_categoria:
+            cantidad += self.cantidad_por_categoria.get(codigo, 0)
+            if cantidad:
+                self.cantidad_por_categoria[codigo] = cantidad
+                self.por_categoria[codigo] = self.por_categoria.get(codigo, 0) + suma
+            else:  # La categoría se quedó sin registros: la sacamos
+                self.cantidad_por_categoria.pop(codigo, None)
+                self.por_categoria.pop(codigo, None)
+
+    def _grupos(self, centavos, codigos):
+        # Suma los montos de cada categoría en una sola pasada (enteros: la suma es exacta)
+        # Counter cuenta las filas en C; solo las sumas necesitan el bucle de Python
+        if not self.usa_categoria:
+            return [(sum(centavos), len(centavos), None)]
+        cantidades = Counter(codigos)
+        sumas = dict.fromkeys(cantidades, 0)
+        for codigo, monto in zip(codigos, centavos):
+            sumas[codigo] += monto
+        return [(sumas[codigo], cantidad, codigo) for codigo, cantidad in cantidades.items()]
+
+    def sumar_bloque(self, centavos, codigos=None):
+        """Suma muchos montos de una vez (se usa en la importación masiva)"""
+        for suma, cantidad, codigo in self._grupos(centavos, codigos):
+            self.sumar_grupo(suma, cantidad, codigo)
+
+    def restar_grupo(self, suma, cantidad, codigo=None):
+        """Descuenta de una vez un grupo de registros de la misma categoría"""
+        self.sumar_grupo(-suma, -cantidad, codigo)
+
+    def restar(self, centavos, codigo=None):
+        self.restar_grupo(centavos, 1, codigo)
+
+    def restar_bloque(self, centavos, codigos=None):
+        """Descuenta muchos montos de una vez (se usa al eliminar varios registros)"""
+        for suma, cantidad, codigo in self._grupos(centavos, codigos):
+            self.restar_grupo(suma, cantidad, codigo)
+
+    def combinar(self, otro):
+        """Suma a estos totales los de otro Agregados (por ejemplo los de un día)"""
+        self.cantidad += otro.cantidad
+        self.total += otro.total
+        for codigo, cantidad in otro.cantidad_por_categoria.items():
+            self.cantidad_por_categoria[codigo] = self.cantidad_por_categoria.get(codigo, 0) + cantidad
+            self.por_categoria[codigo] = self.por_categoria.get(codigo, 0) + otro.por_categoria[codigo]
+
+    def a_estado(self):
+        """Devuelve los totales como datos simples para guardarlos en disco"""
+        return {
+            "cantidad": self.cantidad,
+            "total": self.total,
+            "por_categoria": {str(codigo): centavos for codigo, centavos in self.por_categoria.items()},
+            "cantidad_por_categoria": {str(codigo): cantidad for codigo, cantidad in self.cantidad_por_categoria.items()},
+        }
+
+    def cargar_estado(self, estado):
+        """Recupera los totales guardados con a_estado()"""
+        self.cantidad = estado["cantidad"]
+        self.total = estado["total"]
+        por_categoria = estado["por_categoria"]
+        cantidades = estado["cantidad_por_categoria"]
+        if isinstance(por_categoria, list):  # Formato viejo: una posición por cada categoría
+            por_categoria, cantidades = dict(enumerate(por_categoria)), dict(enumerate(cantidades))
+        self.por_categoria = {int(codigo): por_categoria[codigo] for codigo, cantidad in cantidades.items() if cantidad}
+        self.cantidad_por_categoria = {int(codigo): cantidad for codigo, cantidad in cantidades.items() if cantidad}
+
+    def total_por_categoria(self, nombres=None):
+        """
+        Devuelve un diccionario {categoria: centavos} solo con las categorías que tienen gastos
+        nombres es la lista de nombres del catálogo del libro (por defecto, el de la cuenta del menú)
+        """
+        nombres = categorias_gastos if nombres is None else nombres
+        return {nombres[codigo]: self.por_categoria[codigo] for codigo in sorted(self.por_categoria)}
+
+
+def numero_de_mes(dia):
+    """Convierte un día (número ordinal de fecha) en un número de mes: año * 12 + (mes - 1)"""
+    fecha = date.fromordinal(dia)
+    return fecha.year * 12 + fecha.month - 1
+
+def primer_dia_de_mes(numero_mes):
+    """Día (ordinal) en que empieza un número de mes"""
+    return date(numero_mes // 12, numero_mes % 12 + 1, 1).toordinal()
+
+
+class IndiceFechas:
+    """
+    Totales por día y por mes, para poder resumir cualquier periodo sin recorrer registros
+    - Cada día y cada mes con movimientos tiene su propio Agregados (una "cubeta")
+    - Las listas dias y meses están ordenadas, así un rango se encuentra con bisect
+    Para un rango se suman los meses completos y solo los días sueltos de las puntas,
+    así años de historia cuestan unas pocas decenas de sumas
+    """
+
+    def __init__(self, usa_categoria=False):
+        self.usa_categoria = usa_categoria
+        self.por_dia = {}   # día (ordinal) -> Agregados
+        self.dias = []      # días con movimientos, ordenados
+        self.por_mes = {}   # número de mes -> Agregados
+        self.meses = []     # meses con movimientos, ordenados
+
+    def _cubeta(self, cubetas, claves, clave):
+        cubeta = cubetas.get(clave)
+        if cubeta is None:
+            cubeta = cubetas[clave] = Agregados(self.usa_categoria)
+            claves.insert(bisect_left(claves, clave), clave)
+        return cubeta
+
+    def _quitar_si_vacia(self, cubetas, claves, clave):
+        if cubetas[clave].cantidad == 0:
+            del cubetas[clave]
+            del claves[bisect_left(claves, clave)]
+
+    def sumar(self, centavos, codigo, dia):
+        mes = numero_de_mes(dia)
+        self._cubeta(self.por_dia, self.dias, dia).sumar(centavos, codigo)
+        self._cubeta(self.por_mes, self.meses, mes).sumar(centavos, codigo)
+
+    def restar(self, centavos, codigo, dia):
+        mes = numero_de_mes(dia)
+        self.por_dia[dia].restar(centavos, codigo)
+        self.por_mes[mes].restar(centavos, codigo)
+        self._quitar_si_vacia(self.por_dia, self.dias, dia)
+        self._quitar_si_vacia(self.por_mes, self.meses, mes)
+
+    def _grupos(self, centavos, codigos, fechas):
+        """
+        Suma los montos por (día, categoría) en una sola pasada
+        Devuelve dos diccionarios con la clave día * MAXIMO_CATEGORIAS + código (un entero,
+        más barato que una tupla): cantidad de filas y suma de cada grupo
+        Counter cuenta las filas en C; solo las sumas necesitan el bucle de Python
+        """
+        if self.usa_categoria:
+            claves = list(map(int.__add__, map(MAXIMO_CATEGORIAS.__mul__, fechas), codigos))
+        else:
+            claves = list(map(MAXIMO_CATEGORIAS.__mul__, fechas))
+        cantidades = Counter(claves)
+        sumas = dict.fromkeys(cantidades, 0)
+        for clave, monto in zip(claves, centavos):
+            sumas[clave] += monto
+        return cantidades, sumas
+
+    def _repartir(self, centavos, codigos, fechas, signo):
+        # Suma (signo 1) o descuenta (signo -1) un bloque en las cubetas de sus días y sus meses
+        # Con miles de categorías casi cada fila es un grupo (día, categoría) distinto: los
+        # meses se juntan aparte para tocar cada cubeta mensual una vez por categoría
+        cantidades, sumas = self._grupos(centavos, codigos, fechas)
+        sin_categoria = not self.usa_categoria
+        cubetas = {}  # día -> (su cubeta, su número de mes), para buscarlos una vez por día
+        por_mes = {}  # mes * MAXIMO_CATEGORIAS + código -> [suma, cantidad]
+        for clave, cantidad in cantidades.items():
+            suma = sumas[clave]
+            dia, codigo = divmod(clave, MAXIMO_CATEGORIAS)
+            cubeta_mes = cubetas.get(dia)
+            if cubeta_mes is None:
+                cubeta_mes = cubetas[dia] = (self._cubeta(self.por_dia, self.dias, dia), numero_de_mes(dia))
+            cubeta_mes[0].sumar_grupo(signo * suma, signo * cantidad, None if sin_categoria else codigo)
+            clave_mes = cubeta_mes[1] * MAXIMO_CATEGORIAS + codigo
+            grupo = por_mes.get(clave_mes)
+            if grupo is None:
+                por_mes[clave_mes] = [suma, cantidad]
+            else:
+                grupo[0] += suma
+                grupo[1] += cantidad
+        for clave_mes, (suma, cantidad) in por_mes.items():
+            mes, codigo = divmod(clave_mes, MAXIMO_CATEGORIAS)
+            self._cubeta(self.por_mes, self.meses, mes).sumar_grupo(
+                signo * suma, signo * cantidad, None if sin_categoria else codigo)
+        if signo < 0:
+            for dia, (_, mes) in cubetas.items():
+                self._quitar_si_vacia(self.por_dia, self.dias, dia)
+            for mes in {mes for _, mes in cubetas.values()}:
+                self._quitar_si_vacia(self.por_mes, self.meses, mes)
+
+    def sumar_bloque(self, centavos, codigos, fechas):
+        """Reparte un bloque de montos en sus días (se usa en la importación masiva)"""
+        self._repartir(centavos, codigos, fechas, 1)
+
+    def restar_bloque(self, centavos, codigos, fechas):
+        """Descuenta un bloque de montos de sus días (se usa al eliminar varios registros)"""
+        self._repartir(centavos, codigos, fechas, -1)
+
+    def _sumar_claves(self, resultado, cubetas, claves, desde, hasta):
+        for clave in claves[bisect_left(claves, desde):bisect_right(claves, hasta)]:
+            resultado.combinar(cubetas[clave])
+
+    def rango(self, desde, hasta):
+        """Devuelve un Agregados con los totales entre dos días (ordinales, ambos incluidos)"""
+        resultado = Agregados(self.usa_categoria)
+        if desde > hasta:
+            return resultado
+        # Meses completos que caben dentro del rango
+        primer_mes = numero_de_mes(desde)
+        if date.fromordinal(desde).day != 1:
+            primer_mes += 1
+        ultimo_mes = numero_de_mes(hasta)
+        if hasta < date.max.toordinal() and date.fromordinal(hasta + 1).day != 1:
+            ultimo_mes -= 1
+
+        if primer_mes <= ultimo_mes:
+            self._sumar_claves(resultado, self.por_mes, self.meses, primer_mes, ultimo_mes)
+            self._sumar_claves(resultado, self.por_dia, self.dias, desde, primer_dia_de_mes(primer_mes) - 1)
+            if hasta < date.max.toordinal():  # Con el último día posible no quedan días sueltos al final
+                self._sumar_claves(resultado, self.por_dia, self.dias, primer_dia_de_mes(ultimo_mes + 1), hasta)
+        else:
+            self._sumar_claves(resultado, self.por_dia, self.dias, desde, hasta)
+        return resultado
+
+    def a_estado(self):
+        """Devuelve las cubetas diarias como datos simples (las mensuales se reconstruyen)"""
+        return {str(dia): self.por_dia[dia].a_estado() for dia in self.dias}
+
+    def cargar_estado(self, estado):
+        self.__init__(self.usa_categoria)
+        for dia, estado_dia in estado.items():
+            dia = int(dia)
+            self._cubeta(self.por_dia, self.dias, dia).cargar_estado(estado_dia)
+            self._cubeta(self.por_mes, self.meses, numero_de_mes(dia)).combinar(self.por_dia[dia])
+
+
+class RegistroVista:
+    """
+    Representa un registro guardado dentro de un LibroColumnar
+    Se usa igual que el diccionario de antes:
+    - registro["valor"] lee el valor desde el arreglo
+    - registro["valor"] = 100 escribe el nuevo valor en el arreglo
+    - registro.id es su número fijo (no cambia aunque se eliminen otros registros)
+    """
+    __slots__ = ("_libro", "_indice")
+
+    def __init__(self, libro, indice):
+        self._libro = libro
+        self._indice = indice
+
+    @property
+    def id(self):
+        return self._libro._ids[self._indice]
+
+    def __getitem__(self, campo):
+        return self._libro._leer(self._indice, campo)
+
+    def __setitem__(self, campo, valor):
+        self._libro._escribir(self._indice, campo, valor)
+
+    def keys(self):
+        return self._libro.campos
+
+    def a_diccionario(self):
+        """Devuelve una copia del registro como diccionario normal (con su "id")"""
+        registro = {campo: self[campo] for campo in self._libro.campos}
+        registro["id"] = self.id
+        return registro
+
+    def __repr__(self):
+        return repr(self.a_diccionario())
+
+
+_numeros_libro = count(1)  # Cada libro recibe un número distinto, para las claves de la caché
+BLOQUE_POSICIONES = 1 << 16  # Filas de la columna de vivos que se cuentan de una vez (ver _posicion)
+
+
+class LibroColumnar:
+    """
+    Guarda muchos registros (ingresos o gastos) en columnas compactas:
+    - centavos: array('q') con 8 bytes por registro (el valor en centavos, exacto)
+    - categorias: array('H') con 2 bytes por registro (código de la categoría en el catálogo)
+    - textos: array('I') con 4 bytes por registro, que apunta a una tabla de textos
+      (cada texto distinto se guarda una sola vez, como un internado de cadenas)
+    - fechas: array('i') con 4 bytes por registro (el día como número ordinal)
+    - ids: array('q') con el número fijo de cada registro (1, 2, 3... siempre en orden)
+    - vivos: array('B') con 1 si el registro existe y 0 si fue eliminado
+    Eliminar no corre los demás registros: solo se marca el registro con una "lápida"
+    (vivos = 0) y se descuenta de los totales. De vez en cuando compactar() saca las
+    lápidas de las columnas. Así los id que se ven en las listas nunca cambian
+    Conserva append, acceso por índice y pop para que el código viejo siga funcionando
+    """
+
+    def __init__(self, campo_texto, usa_categoria=False, catalogo=None):
+        self.campo_texto = campo_texto  # "descripcion" para ingresos, "nombre" para gastos
+        self.usa_categoria = usa_categoria
+        if usa_categoria:
+            # El catálogo que da sentido a los códigos de la columna de categorías
+            self.categorias = categorias if catalogo is None else catalogo
+            self.campos_obligatorios = (campo_texto, "valor", "categoria")
+        else:
+            self.categorias = None
+            self.campos_obligatorios = (campo_texto, "valor")
+        self.campos = self.campos_obligatorios + ("fecha",)  # La fecha es opcional: por defecto es hoy
+
+        self._tabla_textos = []  # Textos distintos, en el orden en que aparecieron
+        self._id_texto = {}      # Texto -> posición en la tabla
+        self._textos = array("I")
+        self._centavos = array("q")
+        self._categorias = array("H")
+        self._fechas = array("i")
+        self._ids = array("q")
+        self._vivos = array("B")
+        self._eliminados = 0     # Cuántas lápidas hay todavía en las columnas
+        self.siguiente_id = 1
+        self.agregados = Agregados(usa_categoria)
+        self.por_fecha = IndiceFechas(usa_categoria)
+
+        # Funciones que se llaman después de cada cambio: observador(operacion, *datos)
+        # Por ejemplo el almacén persistente las usa para escribir el diario
+        self.observadores = []
+        # La versión sube con cada cambio de los datos (no al compactar, que no los cambia):
+        # con (numero_libro, version) la caché de resúmenes sabe si lo guardado sigue valiendo
+        self.numero_libro = next(_numeros_libro)
+        self.version = 0
+        self._indice_busqueda = None  # Se crea la primera vez que alguien busca
+
+    def __len__(self):
+        return len(self._centavos) - self._eliminados
+
+    def _notificar(self, operacion, *datos):
+        if operacion != "compactar":
+            self.version += 1
+        for observador in self.observadores:
+            observador(operacion, *datos)
+
+    def _interno(self, texto):
+        # Devuelve el número del texto en la tabla, agregándolo si es nuevo
+        numero = self._id_texto.get(texto)
+        if numero is None:
+            numero = len(self._tabla_textos)
+            self._tabla_textos.append(texto)
+            self._id_texto[texto] = numero
+        return numero
+
+    def _posicion(self, indice):
+        # Índice como en una lista (contando solo los registros vivos)
+        # Aceptamos índices negativos igual que una lista normal
+        cantidad = len(self)
+        if indice < 0:
+            indice += cantidad
+        if indice < 0 or indice >= cantidad:
+            raise IndexError("índice fuera del libro")
+        if not self._eliminados:
+            return indice
+        # Con lápidas no se compacta (sería O(n) en cada acceso): se saltan bloques enteros
+        # contando sus vivos con bytes.count, que corre en C, y solo el último bloque se recorre
+        vivos = self._vivos
+        inicio = 0
+        while True:
+            bloque = vivos[inicio:inicio + BLOQUE_POSICIONES].tobytes()
+            en_bloque = bloque.count(1)
+            if indice < en_bloque:
+                return next(islice(compress(count(inicio), bloque), indice, None))
+            indice -= en_bloque
+            inicio += BLOQUE_POSICIONES
+
+    def _posicion_de_id(self, id_registro):
+        # Los id están ordenados, así que bisect encuentra la posición en O(log n)
+        posicion = bisect_left(self._ids, id_registro)
+        if posicion < len(self._ids) and self._ids[posicion] == id_registro and self._vivos[posicion]:
+            return posicion
+        return -1
+
+    def _leer(self, indice, campo):
+        if campo == "valor":
+            return self._centavos[indice] / 100  # Como float, igual que antes (el valor exacto está en centavos)
+        if campo == self.campo_texto:
+            return self._tabla_textos[self._textos[indice]]
+        if campo == "categoria" and self.usa_categoria:
+            return self.categorias.nombres[self._categorias[indice]]
+        if campo == "fecha":
+            return date.fromordinal(self._fechas[indice]).isoformat()
+        raise KeyError(campo)
+
+    def _codigo(self, indice):
+        return self._categorias[indice] if self.usa_categoria else None
+
+    def _sumar_a_totales(self, indice):
+        codigo = self._codigo(indice)
+        self.agregados.sumar(self._centavos[indice], codigo)
+        self.por_fecha.sumar(self._centavos[indice], codigo, self._fechas[indice])
+
+    def _restar_de_totales(self, indice):
+        codigo = self._codigo(indice)
+        self.agregados.restar(self._centavos[indice], codigo)
+        self.por_fecha.restar(self._centavos[indice], codigo, self._fechas[indice])
 
-lista_ingresos = []  # Esta lista guardará todos nuestros ingresos
-lista_gastos = []    # Esta lista guardará todos nuestros gastos
+    def _escribir(self, indice, campo, valor):
+        anterior = self._leer(indice, campo)
+        if campo == self.campo_texto:
+            self._textos[indice] = self._interno(valor)
+        elif campo in ("valor", "fecha") or (campo == "categoria" and self.usa_categoria):
+            # Quitamos el registro de los totales, lo cambiamos y lo volvemos a sumar
+            if campo == "valor":
+                nuevo = a_centavos(valor)
+                columna = self._centavos
+            elif campo == "fecha":
+                nuevo = validar_fecha(valor)
+                valor = date.fromordinal(nuevo).isoformat()
+                columna = self._fechas
+            else:
+                nuevo = self.categorias.ids[valor]
+                columna = self._categorias
+            self._restar_de_totales(indice)
+            columna[indice] = nuevo
+            self._sumar_a_totales(indice)
+            if campo == "valor":
+                valor = nuevo / 100
+        else:
+            raise KeyError(campo)
+        self._notificar("modificar", self._ids[indice], campo, valor, anterior)
+
+    def total(self):
+        """Suma exacta de todos los valores del libro (un Dinero), sin recorrer los registros"""
+        return Dinero(self.agregados.total)
+
+    def __getitem__(self, indice):
+        return RegistroVista(self, self._posicion(indice))
+
+    def __iter__(self):
+        vivos = self._vivos
+        for i in range(len(self._centavos)):
+            if vivos[i]:
+                yield RegistroVista(self, i)
+
+    def existe(self, id_registro):
+        """True si hay un registro (no eliminado) con ese id"""
+        return self._posicion_de_id(id_registro) >= 0
+
+    def obtener(self, id_registro):
+        """Devuelve el registro con ese id (KeyError si no existe o fue eliminado)"""
+        posicion = self._posicion_de_id(id_registro)
+        if posicion < 0:
+            raise KeyError(id_registro)
+        return RegistroVista(self, posicion)
+
+    def en_posicion(self, posicion):
+        """El registro en una posición interna (las que devuelven posiciones() y buscar())"""
+        return RegistroVista(self, posicion)
+
+    def posiciones(self, inicio=0, fin=None):
+        """
+        Posiciones internas de los registros vivos, en el orden en que se crearon
+        Con inicio y fin solo se recorre hasta fin (por ejemplo, para mostrar una página)
+        """
+        if not self._eliminados:
+            return range(len(self._centavos))[inicio:fin]
+        return list(islice(compress(range(len(self._vivos)), self._vivos), inicio, fin))
+
+    def append(self, registro):
+        """Agrega un registro (un diccionario con los mismos campos de antes) y devuelve su id"""
+        # Convertimos primero todo para no dejar columnas a medio llenar si algo falla
+        texto = registro[self.campo_texto]
+        centavos = a_centavos(registro["valor"])
+        dia = validar_fecha(registro.get("fecha"))
+        codigo = None
+        if self.usa_categoria:
+            codigo = self.categorias.ids[registro["categoria"]]
+            self._categorias.append(codigo)
+        id_registro = self.siguiente_id
+        self.siguiente_id += 1
+        self._textos.append(self._interno(texto))
+        self._centavos.append(centavos)
+        self._fechas.append(dia)
+        self._ids.append(id_registro)
+        self._vivos.append(1)
+        self._sumar_a_totales(len(self._centavos) - 1)
+        self._notificar("agregar", RegistroVista(self, len(self._centavos) - 1).a_diccionario())
+        return id_registro
+
+    def extender(self, textos, centavos, codigos=None, fechas=None):
+        """
+        Agrega un bloque completo de registros ya validados
+        textos es una lista, centavos un array('q') con los valores en centavos,
+        codigos un array('H') y fechas un array('i') de días ordinales (si no se da, todos son de hoy)
+        """
+        if fechas is None:
+            fechas = array("i", [date.today().toordinal()]) * len(centavos)
+        interno = self._interno
+        self._textos.extend(array("I", [interno(texto) for texto in textos]))
+        self._centavos.extend(centavos)
+        self._fechas.extend(fechas)
+        self._ids.extend(array("q", range(self.siguiente_id, self.siguiente_id + len(centavos))))
+        self._vivos.frombytes(b"\x01" * len(centavos))
+        self.siguiente_id += len(centavos)
+        if self.usa_categoria:
+            if not isinstance(codigos, array) or codigos.typecode != "H":
+                codigos = array("H", codigos)  # Por ejemplo un array('B') de antes del catálogo
+            self._categorias.extend(codigos)
+        self.agregados.sumar_bloque(centavos, codigos)
+        self.por_fecha.sumar_bloque(centavos, codigos, fechas)
+        self._notificar("extender", len(centavos))
+
+    def buscar(self, **filtros):
+        """Posiciones de los registros que cumplen los filtros (ver IndiceBusqueda.buscar)"""
+        if self._indice_busqueda is None:
+            self._indice_busqueda = IndiceBusqueda(self)
+        return self._indice_busqueda.buscar(**filtros)
+
+    def recalcular_agregados(self):
+        """Vuelve a calcular todos los totales recorriendo las columnas (O(n))"""
+        self.compactar()
+        self.agregados = Agregados(self.usa_categoria)
+        self.por_fecha = IndiceFechas(self.usa_categoria)
+        codigos = self._categorias if self.usa_categoria else None
+        self.agregados.sumar_bloque(self._centavos, codigos)
+        self.por_fecha.sumar_bloque(self._centavos, codigos, self._fechas)
+
+    # ---------------------------------------------------------------- eliminar
+    def eliminar(self, id_registro):
+        """
+        Elimina el registro con ese id y lo devuelve como diccionario
+        No mueve nada: pone la lápida y descuenta el valor de los totales
+        """
+        posicion = self._posicion_de_id(id_registro)
+        if posicion < 0:
+            raise KeyError(id_registro)
+        eliminado = RegistroVista(self, posicion).a_diccionario()
+        self._restar_de_totales(posicion)
+        self._vivos[posicion] = 0
+        self._eliminados += 1
+        self._notificar("eliminar", id_registro)
+        self.compactar_si_conviene(0.5)
+        return eliminado
+
+    def eliminar_varios(self, ids):
+        """Elimina todos los registros de una lista de id y devuelve cuántos eran"""
+        posiciones = set()
+        for id_registro in ids:
+            posicion = self._posicion_de_id(id_registro)
+            if posicion < 0:  # Revisamos todos antes de eliminar cualquiera
+                raise KeyError(id_registro)
+            posiciones.add(posicion)
+        return self._eliminar_posiciones(sorted(posiciones))
+
+    def eliminar_donde(self, **filtros):
+        """
+        Elimina de una vez todos los registros que cumplen los filtros de buscar()
+        Por ejemplo: gastos.eliminar_donde(categoria="entretenimiento", valor_max=4.99)
+        Devuelve cuántos registros se eliminaron
+        """
+        # Un texto de solo espacios busca "" (que está en todos los registros): no cuenta como
+        # filtro, y prefijo solo cambia cómo se usa el texto, así que tampoco cuenta
+        if isinstance(filtros.get("texto"), str):
+            filtros["texto"] = filtros["texto"].strip() or None
+        if all(valor is None or valor == "" for nombre, valor in filtros.items() if nombre != "prefijo"):
+            raise ValueError("Debe indicar al menos un filtro para eliminar")
+        return self._eliminar_posiciones(self.buscar(**filtros))
+
+    def _eliminar_posiciones(self, posiciones):
+        # Los totales se descuentan por grupos (día, categoría), no registro por registro
+        if len(posiciones) == 0:
+            return 0
+        ids = array("q", map(self._ids.__getitem__, posiciones))
+        centavos = array("q", map(self._centavos.__getitem__, posiciones))
+        fechas = array("i", map(self._fechas.__getitem__, posiciones))
+        codigos = array("H", map(self._categorias.__getitem__, posiciones)) if self.usa_categoria else None
+        vivos = self._vivos
+        for posicion in posiciones:
+            vivos[posicion] = 0
+        self._eliminados += len(ids)
+        self.agregados.restar_bloque(centavos, codigos)
+        self.por_fecha.restar_bloque(centavos, codigos, fechas)
+        self._notificar("eliminar_varios", ids)
+        self.compactar_si_conviene(0.5)
+        return len(ids)
+
+    def pop(self, indice=-1):
+        """Elimina el registro en esa posición (como una lista) y lo devuelve como diccionario"""
+        return self.eliminar(self[indice].id)
+
+    def compactar(self):
+        """
+        Saca las lápidas de las columnas (O(n)). Los id no cambian, solo las posiciones internas
+        Se hace de vez en cuando: cuando hay muchas lápidas o en segundo plano en el servidor
+        """
+        if not self._eliminados:
+            return
+        # Primero se arman todas las columnas nuevas y después se cambian todas juntas
+        # (con las lápidas en cero) en una sola asignación: el servidor compacta en otro
+        # hilo mientras se leen los resúmenes, y nadie debe ver columnas de antes y de después
+        vivos = self._vivos
+        centavos = array("q", compress(self._centavos, vivos))
+        textos = array("I", compress(self._textos, vivos))
+        fechas = array("i", compress(self._fechas, vivos))
+        ids = array("q", compress(self._ids, vivos))
+        codigos = array("H", compress(self._categorias, vivos)) if self.usa_categoria else self._categorias
+        todos_vivos = array("B", b"\x01" * len(centavos))
+        (self._centavos, self._textos, self._fechas, self._ids, self._categorias,
+         self._vivos, self._eliminados) = centavos, textos, fechas, ids, codigos, todos_vivos, 0
+        self._notificar("compactar")
+
+    def compactar_si_conviene(self, proporcion=0.25):
+        """Compacta si más de esa proporción de las filas son lápidas; devuelve True si compactó"""
+        if self._eliminados and self._eliminados >= proporcion * len(self._centavos):
+            self.compactar()
+            return True
+        return False
+
+    def memoria_bytes(self):
+        """Calcula aproximadamente cuántos bytes ocupan las columnas"""
+        total = sys.getsizeof(self._centavos) + sys.getsizeof(self._textos) + sys.getsizeof(self._fechas)
+        total += sys.getsizeof(self._ids) + sys.getsizeof(self._vivos)
+        total += sys.getsizeof(self._tabla_textos) + sum(sys.getsizeof(texto) for texto in self._tabla_textos)
+        if self.usa_categoria:
+            total += sys.getsizeof(self._categorias)
+        return total
+
+def trigramas(texto):
+    """Los pedazos de 3 letras de un texto (en minúsculas): "taxi" -> {"tax", "axi"}"""
+    texto = texto.lower()
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceBusqueda:
+    """
+    Índices para buscar registros de un libro sin recorrerlos todos:
+    - trigramas: pedazo de 3 letras -> textos de la tabla que lo contienen
+    - por_texto: número de texto -> posiciones de los registros con ese texto
+    - por_categoria: código de categoría -> posiciones de sus registros
+    - orden por valor: posiciones ordenadas por valor (para buscar por rango con bisect)
+    Se construye la primera vez que se busca y después se mantiene con cada cambio
+    (escucha al libro como observador). Los registros eliminados siguen en las listas
+    hasta que el libro se compacta; mientras tanto se saltan mirando las lápidas.
+    Al compactar las posiciones cambian y el índice se reconstruye en la siguiente búsqueda
+    """
+
+    def __init__(self, libro):
+        self.libro = libro
+        self._valido = False
+        self._orden_valores = None
+        libro.observadores.append(self._al_cambiar)
+
+    # ---------------------------------------------------------------- construcción
+    def _construir(self):
+        libro = self.libro
+        self._trigramas = {}
+        self._textos_indexados = 0
+        self._por_texto = [array("I") for _ in libro._tabla_textos]
+        self._por_categoria = {}  # Solo las categorías que tienen registros
+        for posicion, numero_texto in enumerate(libro._textos):
+            self._por_texto[numero_texto].append(posicion)
+        for posicion, codigo in enumerate(libro._categorias):
+            self._posiciones_categoria(codigo).append(posicion)
+        self._indexar_textos_nuevos()
+        self._orden_valores = None
+        self._valido = True
+
+    def _indexar_textos_nuevos(self):
+        # Los textos nuevos de la tabla se agregan al índice de trigramas
+        tabla = self.libro._tabla_textos
+        for numero in range(self._textos_indexados, len(tabla)):
+            for trigrama in trigramas(tabla[numero]):
+                self._trigramas.setdefault(trigrama, set()).add(numero)
+        while len(self._por_texto) < len(tabla):
+            self._por_texto.append(array("I"))
+        self._textos_indexados = len(tabla)
+
+    def _asegurar(self):
+        if not self._valido:
+            self._construir()
+
+    def _posiciones_categoria(self, codigo):
+        posiciones = self._por_categoria.get(codigo)
+        if posiciones is None:
+            posiciones = self._por_categoria[codigo] = array("I")
+        return posiciones
+
+    @staticmethod
+    def _insertar(posiciones, posicion):
+        posiciones.insert(bisect_left(posiciones, posicion), posicion)
+
+    @staticmethod
+    def _quitar(posiciones, posicion):
+        del posiciones[bisect_left(posiciones, posicion)]
+
+    def _al_cambiar(self, operacion, *datos):
+        if not self._valido:
+            return
+        libro = self.libro
+        if operacion == "agregar":
+            posicion = len(libro._centavos) - 1
+            self._indexar_textos_nuevos()
+            self._por_texto[libro._textos[posicion]].append(posicion)
+            if libro.usa_categoria:
+                self._posiciones_categoria(libro._categorias[posicion]).append(posicion)
+            self._orden_valores = None
+        elif operacion == "modificar":
+            id_registro, campo, valor, anterior = datos
+            posicion = libro._posicion_de_id(id_registro)
+            if campo == libro.campo_texto:
+                self._indexar_textos_nuevos()
+                self._quitar(self._por_texto[libro._id_texto[anterior]], posicion)
+                self._insertar(self._por_texto[libro._textos[posicion]], posicion)
+            elif campo == "categoria":
+                self._quitar(self._por_categoria[libro.categorias.ids[anterior]], posicion)
+                self._insertar(self._posiciones_categoria(libro._categorias[posicion]), posicion)
+            elif campo == "valor":
+                self._orden_valores = None
+        elif operacion in ("compactar", "extender"):
+            # Compactar cambia las posiciones y extender agrega muchas de golpe
+            self._valido = False
+        # Al eliminar no hay nada que hacer: las búsquedas saltan las lápidas
+
+    def _solo_vivos(self, posiciones):
+        libro = self.libro
+        if not libro._eliminados:
+            return posiciones
+        return list(compress(posiciones, map(libro._vivos.__getitem__, posiciones)))
+
+    # ---------------------------------------------------------------- consultas
+    def _numeros_de_texto(self, busqueda, prefijo):
+        """Números de los textos de la tabla que contienen (o empiezan con) la búsqueda"""
+        tabla = self.libro._tabla_textos
+        if len(busqueda) >= 3:
+            # Solo revisamos los textos que tienen todos los trigramas de la búsqueda
+            conjuntos = sorted((self._trigramas.get(t, set()) for t in trigramas(busqueda)), key=len)
+            candidatos = set(conjuntos[0]).intersection(*conjuntos[1:])
+        else:
+            candidatos = range(len(tabla))
+        if prefijo:
+            return sorted(n for n in candidatos if tabla[n].lower().startswith(busqueda))
+        return sorted(n for n in candidatos if busqueda in tabla[n].lower())
+
+    def _posiciones_por_valor(self, minimo, maximo):
+        # Devuelve las posiciones en orden de valor (no de posición)
+        if self._orden_valores is None:
+            centavos = self.libro._centavos
+            self._orden_valores = array("I", sorted(range(len(centavos)), key=centavos.__getitem__))
+            self._valores_ordenados = array("q", (centavos[p] for p in self._orden_valores))
+        inicio = 0 if minimo is None else bisect_left(self._valores_ordenados, minimo)
+        fin = len(self._valores_ordenados) if maximo is None else bisect_right(self._valores_ordenados, maximo)
+        return self._orden_valores[inicio:fin]
+
+    def buscar(self, texto=None, prefijo=False, categoria=None, valor_min=None, valor_max=None):
+        """
+        Devuelve las posiciones internas (ordenadas) de los registros vivos que cumplen
+        todos los filtros
+        - texto: parte del texto (o su comienzo si prefijo=True), sin importar mayúsculas
+        - categoria: nombre de una categoría del catálogo (solo esa, sin sus subcategorías)
+        - valor_min / valor_max: rango de valores (incluidos)
+        """
+        if texto is not None and not isinstance(texto, str):
+            raise ValueError("El texto a buscar debe ser un texto")
+        self._asegurar()
+        libro = self.libro
+        # Los límites se pasan a centavos redondeando hacia adentro del rango
+        minimo = None if valor_min is None else a_centavos(valor_min, ROUND_CEILING)
+        maximo = None if valor_max is None else a_centavos(valor_max, ROUND_FLOOR)
+        candidatos = []  # Listas de posiciones de cada filtro, para empezar por la más corta
+        por_categoria = por_valor = None
+        if texto:
+            numeros = self._numeros_de_texto(texto.strip().lower(), prefijo)
+            if len(numeros) == 1:
+                candidatos.append(self._por_texto[numeros[0]])
+            else:
+                candidatos.append(sorted(p for n in numeros for p in self._por_texto[n]))
+        if categoria is not None:
+            por_categoria = self._por_categoria.get(validar_categoria(categoria, libro.categorias), array("I"))
+            candidatos.append(por_categoria)
+        if minimo is not None or maximo is not None:
+            por_valor = self._posiciones_por_valor(minimo, maximo)
+            candidatos.append(por_valor)
+        if not candidatos:
+            return libro.posiciones()
+
+        # Partimos de la lista más corta y le aplicamos los demás filtros uno por uno
+        # con compress, que recorre las posiciones en C (sin un bucle de Python)
+        menor = min(candidatos, key=len)
+        posiciones = self._solo_vivos(menor)
+        if texto and menor is not candidatos[0]:
+            posiciones = list(compress(posiciones, map(set(candidatos[0]).__contains__, posiciones)))
+        if por_categoria is not None and menor is not por_categoria:
+            codigo = validar_categoria(categoria, libro.categorias)
+            posiciones = list(compress(posiciones, map(codigo.__eq__, map(libro._categorias.__getitem__, posiciones))))
+        if por_valor is not None and menor is not por_valor:
+            centavos = libro._centavos
+            if minimo is not None:
+                posiciones = list(compress(posiciones, map(minimo.__le__, map(centavos.__getitem__, posiciones))))
+            if maximo is not None:
+                posiciones = list(compress(posiciones, map(maximo.__ge__, map(centavos.__getitem__, posiciones))))
+        if menor is por_valor:  # Venían en orden de valor: las ordenamos por posición al final
+            posiciones = sorted(posiciones)
+        return posiciones
+
+
+class CuentaFinanciera:
+    """
+    Todos los datos y operaciones de una persona (un "inquilino" del servidor):
+    sus ingresos, sus gastos y las acciones para registrar, modificar, eliminar y resumir
+    Los menús usan cuenta_actual; el servidor crea una CuentaFinanciera por usuario
+    Los registros se eligen por su id (el número que se ve en las listas, no cambia nunca)
+    Cada cuenta tiene su propio catálogo de categorías (por defecto, uno nuevo con las iniciales)
+    """
+
+    def __init__(self, catalogo=None):
+        self.categorias = RegistroCategorias(CATEGORIAS_INICIALES) if catalogo is None else catalogo
+        self.ingresos = LibroColumnar("descripcion")
+        self.gastos = LibroColumnar("nombre", usa_categoria=True, catalogo=self.categorias)
+        self._presupuestos = None  # Se crean la primera vez que se usan (ver PASO 16)
+
+    @property
+    def presupuestos(self):
+        """Los presupuestos por categoría de los gastos de esta cuenta (con sus alertas)"""
+        if self._presupuestos is None:
+            self._presupuestos = Presupuestos(self.gastos)
+        return self._presupuestos
+
+    def libros(self):
+        """Los libros con el nombre que usa el almacén persistente"""
+        return {"ingresos": self.ingresos, "gastos": self.gastos}
+
+    def agregar_categoria(self, nombre, padre=None):
+        """
+        Crea una categoría de gastos (dentro de padre, si se indica) y la devuelve como diccionario
+        La categoría queda solo en el catálogo de esta cuenta
+        """
+        nombre = validar_texto(nombre, "nombre")
+        padre = None if padre is None else self.categorias.nombres[validar_categoria(padre, self.categorias)]
+        codigo = self.categorias.agregar(nombre, padre)
+        return {"categoria": self.categorias.nombres[codigo], "padre": padre,
+                "ruta": self.categorias.ruta(codigo), "numero": codigo + 1}
+
+    def lista_categorias(self):
+        """Las categorías del catálogo de esta cuenta en orden de árbol, con su número y su ruta"""
+        catalogo = self.categorias
+        return [{"numero": codigo + 1, "categoria": catalogo.nombres[codigo], "ruta": catalogo.ruta(codigo)}
+                for codigo in catalogo.en_orden()]
+
+    def registrar_ingreso(self, descripcion, valor, fecha=None):
+        registro = {"descripcion": validar_texto(descripcion, "descripcion"),
+                    "valor": validar_numero_positivo(valor),
+                    "fecha": date.fromordinal(validar_fecha(fecha)).isoformat()}
+        registro["id"] = self.ingresos.append(registro)
+        registro["valor"] = float(registro["valor"])  # Como float, igual que los registros guardados
+        return registro
+
+    def registrar_gasto(self, nombre, valor, categoria, fecha=None):
+        registro = {"nombre": validar_texto(nombre, "nombre"),
+                    "valor": validar_numero_positivo(valor),
+                    "categoria": self.categorias.nombres[validar_categoria(categoria, self.categorias)],
+                    "fecha": date.fromordinal(validar_fecha(fecha)).isoformat()}
+        registro["id"] = self.gastos.append(registro)
+        registro["valor"] = float(registro["valor"])  # Como float, igual que los registros guardados
+        return registro
+
+    def _validar_id(self, libro, id_registro):
+        if isinstance(id_registro, bool) or not isinstance(id_registro, int) or not libro.existe(id_registro):
+            raise ValueError(f"No existe el registro número {id_registro}")
+        return id_registro
+
+    def modificar_ingreso(self, id_registro, descripcion=None, valor=None, fecha=None):
+        """Cambia solo los campos que no son None"""
+        id_registro = self._validar_id(self.ingresos, id_registro)
+        # Validamos todo antes de cambiar nada, para no dejar el registro a medias
+        if descripcion is not None:
+            descripcion = validar_texto(descripcion, "descripcion")
+        if valor is not None:
+            valor = validar_numero_positivo(valor)
+        if fecha is not None:
+            fecha = validar_fecha(fecha)
+        ingreso = self.ingresos.obtener(id_registro)
+        if descripcion is not None:
+            ingreso["descripcion"] = descripcion
+        if valor is not None:
+            ingreso["valor"] = valor
+        if fecha is not None:
+            ingreso["fecha"] = fecha
+        return ingreso.a_diccionario()
+
+    def modificar_gasto(self, id_registro, nombre=None, valor=None, categoria=None, fecha=None):
+        """Cambia solo los campos que no son None"""
+        id_registro = self._validar_id(self.gastos, id_registro)
+        if nombre is not None:
+            nombre = validar_texto(nombre, "nombre")
+        if valor is not None:
+            valor = validar_numero_positivo(valor)
+        if categoria is not None:
+            categoria = self.categorias.nombres[validar_categoria(categoria, self.categorias)]
+        if fecha is not None:
+            fecha = validar_fecha(fecha)
+        gasto = self.gastos.obtener(id_registro)
+        if nombre is not None:
+            gasto["nombre"] = nombre
+        if valor is not None:
+            gasto["valor"] = valor
+        if categoria is not None:
+            gasto["categoria"] = categoria
+        if fecha is not None:
+            gasto["fecha"] = fecha
+        return gasto.a_diccionario()
+
+    def eliminar_ingreso(self, id_registro):
+        return self.ingresos.eliminar(self._validar_id(self.ingresos, id_registro))
+
+    def eliminar_gasto(self, id_registro):
+        return self.gastos.eliminar(self._validar_id(self.gastos, id_registro))
+
+    def _libro(self, libro):
+        libros = self.libros()
+        if not isinstance(libro, str) or libro not in libros:
+            raise ValueError('El libro debe ser "ingresos" o "gastos"')
+        return libros[libro]
+
+    def eliminar_donde(self, libro, **filtros):
+        """
+        Elimina de "ingresos" o "gastos" todos los registros que cumplen los filtros
+        (los mismos de buscar) y devuelve cuántos se eliminaron
+        """
+        return self._libro(libro).eliminar_donde(**filtros)
+
+    def compactar_si_conviene(self):
+        """Compacta los libros que tienen muchas lápidas (lo llama el servidor en segundo plano)"""
+        compacto = False
+        for libro in self.libros().values():
+            compacto = libro.compactar_si_conviene() or compacto
+        return compacto
+
+    def buscar(self, libro, pagina=1, tamano=TAMANO_PAGINA, **filtros):
+        """
+        Busca en "ingresos" o "gastos" y devuelve solo una página de resultados
+        Cada registro trae su "id" (el que se usa para modificar o eliminar)
+        """
+        if isinstance(pagina, bool) or not isinstance(pagina, int):
+            raise ValueError("El campo pagina debe ser un número entero")
+        if isinstance(tamano, bool) or not isinstance(tamano, int) or tamano < 1:
+            raise ValueError("El campo tamano debe ser un número entero mayor que cero")
+        libro = self._libro(libro)
+        posiciones = libro.buscar(**filtros)
+        paginas = max(1, -(-len(posiciones) // tamano))  # División hacia arriba
+        pagina = min(max(1, pagina), paginas)
+        registros = [libro.en_posicion(posicion).a_diccionario()
+                     for posicion in posiciones[(pagina - 1) * tamano:pagina * tamano]]
+        return {"total": len(posiciones), "pagina": pagina, "paginas": paginas, "registros": registros}
+
+    def resumen(self, desde=None, hasta=None):
+        """
+        Resumen de todos los registros, o solo de los que están entre desde y hasta
+        Sale de la caché si nada cambió desde la última vez (el diccionario se comparte: no lo modifique)
+        """
+        return resumen_en_cache(self.ingresos, self.gastos, desde, hasta)
+
+    def resumen_categoria(self, categoria, desde=None, hasta=None):
+        """Cuánto se gastó en una categoría (en todo el libro o en un periodo), también desde la caché"""
+        return resumen_categoria_en_cache(self.gastos, categoria, desde, hasta)
 
-# Lista de categorías para los gastos (como un menú de opciones)
-categorias_gastos = ["alimentacion", "transporte", "entretenimiento", "salud", "educacion", "servicios"]
+
+cuenta_actual = CuentaFinanciera(categorias)  # La cuenta de quien usa el programa desde el menú
+lista_ingresos = cuenta_actual.ingresos  # Aquí se guardan todos nuestros ingresos
+lista_gastos = cuenta_actual.gastos      # Aquí se guardan todos nuestros gastos
 
 # =============================================================================
 # PASO 2: FUNCIONES PARA VALIDAR DATOS
 # =============================================================================
 # Esta función se asegura de que el usuario escriba un número válido
 
+def validar_numero_positivo(texto):
+    """
+    Convierte un texto en dinero (un Dinero, exacto en centavos) y verifica que sea mayor que cero
+    Si el texto no sirve lanza ValueError con el motivo
+    Se usa tanto al pedir datos por teclado como al importar archivos
+    """
+    centavos = a_centavos(texto)  # "inf", "nan" o letras también dan ValueError
+    if centavos <= 0:  # Si el número es cero, negativo o menos de medio centavo
+        raise ValueError("El número debe ser mayor que cero")
+    if centavos > MAXIMO_CENTAVOS:  # No cabría con exactitud en las columnas de 8 bytes
+        raise ValueError("El número es demasiado grande")
+    return Dinero(centavos)
+
+def validar_texto(texto, campo):
+    """Verifica que un texto no esté vacío y lo devuelve sin espacios al inicio y al final"""
+    if texto is not None and not isinstance(texto, str):  # Por ejemplo un número en un comando JSON
+        raise ValueError(f"El campo {campo} debe ser un texto")
+    texto = (texto or "").strip()
+    if not texto:
+        raise ValueError(f"El campo {campo} no puede estar vacío")
+    return texto
+
+def validar_opcion(texto, maximo):
+    """
+    Convierte un texto en una opción de menú (un número entero entre 1 y maximo)
+    Si el texto no sirve lanza ValueError con el motivo
+    """
+    try:
+        opcion = int(texto)  # Convertimos a número entero
+    except (TypeError, ValueError):
+        raise ValueError("Debe escribir solo números del menú") from None
+    if opcion < 1 or opcion > maximo:  # Si la opción está fuera del rango
+        raise ValueError(f"Debe elegir un número entre 1 y {maximo}")
+    return opcion
+
+def validar_categoria(texto, catalogo=None):
+    """
+    Verifica que la categoría exista en el catálogo y devuelve su código
+    También acepta el número de la categoría tal como aparece en el menú (1 = la primera)
+    y la ruta completa ("servicios > energia > electricidad")
+    catalogo es el de la cuenta (por defecto, el de la cuenta del menú)
+    """
+    catalogo = cuenta_actual.categorias if catalogo is None else catalogo
+    if isinstance(texto, bool) or not isinstance(texto, (int, str, type(None))):
+        # True sería la categoría 1 y 1.5 se cortaría a 1: en un comando JSON son errores
+        raise ValueError(f"Categoría desconocida: {texto!r}")
+    if isinstance(texto, int) or (isinstance(texto, str) and texto.strip().isdigit()):
+        return validar_opcion(texto, len(catalogo)) - 1
+    partes = [parte.strip() for parte in (texto or "").lower().split(">")]
+    codigo = catalogo.ids.get(partes[-1])  # Buscar por nombre es O(1): no se recorre la lista
+    if codigo is None or (len(partes) > 1 and catalogo.ruta(codigo, ">").split(">") != partes):
+        raise ValueError(f"Categoría desconocida: {texto!r}")
+    return codigo
+
+def validar_fecha(fecha):
+    """
+    Convierte una fecha en su número de día (ordinal) para guardarla en el libro
+    Acepta un texto AAAA-MM-DD, un objeto date o un número de día ya convertido
+    Si la fecha está vacía (None o "") se usa la fecha de hoy
+    """
+    if fecha is None or fecha == "":
+        return date.today().toordinal()
+    if isinstance(fecha, date):
+        return fecha.toordinal()
+    if isinstance(fecha, int) and not isinstance(fecha, bool) and 1 <= fecha <= date.max.toordinal():
+        return fecha
+    try:
+        return date.fromisoformat(fecha.strip()).toordinal()
+    except (AttributeError, ValueError):
+        raise ValueError("La fecha debe tener el formato AAAA-MM-DD (ejemplo: 2024-03-15)") from None
+
+def pedir_fecha(mensaje):
+    """Pide una fecha; si el usuario deja el espacio en blanco se usa la fecha de hoy"""
+    while True:
+        texto = input(mensaje).strip()
+        try:
+            return date.fromordinal(validar_fecha(texto)).isoformat()
+        except ValueError as error:
+            print(f"❌ ERROR: {error}")
+
 def pedir_numero_positivo(mensaje):
     """
     Esta función pide un número al usuario y se asegura de que sea válido
@@ -27,16 +1382,10 @@ def pedir_numero_positivo(mensaje):
     """
     while True:  # Este bucle se repite hasta que el número sea correcto
         try:  # "try" significa "intenta hacer esto"
-            numero = float(input(mensaje))  # Convertimos el texto a número decimal
-            if numero <= 0:  # Si el número es cero o negativo
-                print("❌ ERROR: El número debe ser mayor que cero")
-                print("Por favor intente de nuevo\n")
-            else:  # Si el número es positivo
-                return numero  # Devolvemos el número y salimos de la función
-        except ValueError:  # "except" significa "si algo sale mal, haz esto"
-            print("❌ ERROR: Debe escribir solo números")
-            print("Ejemplo correcto: 1500 o 1500.50")
-            print("No escriba letras ni símbolos\n")
+            return validar_numero_positivo(input(mensaje))  # Devolvemos el número y salimos de la función
+        except ValueError as error:  # "except" significa "si algo sale mal, haz esto"
+            print(f"❌ ERROR: {error}")
+            print("Por favor intente de nuevo\n")
 
 def pedir_opcion_menu(mensaje, maximo):
     """
@@ -44,13 +1393,51 @@ def pedir_opcion_menu(mensaje, maximo):
     """
     while True:
         try:
-            opcion = int(input(mensaje))  # Convertimos a número entero
-            if opcion < 1 or opcion > maximo:  # Si la opción está fuera del rango
-                print(f"❌ ERROR: Debe elegir un número entre 1 y {maximo}")
-            else:
-                return opcion  # Devolvemos la opción válida
-        except ValueError:
-            print("❌ ERROR: Debe escribir solo números del menú")
+            return validar_opcion(input(mensaje), maximo)  # Devolvemos la opción válida
+        except ValueError as error:
+            print(f"❌ ERROR: {error}")
+
+def lineas_categorias():
+    """
+    Las categorías como se muestran en los menús: en forma de árbol, cada subcategoría
+    con sangría debajo de su padre. El número de cada una es su código + 1, así no
+    cambia cuando se agregan categorías nuevas
+    """
+    catalogo = cuenta_actual.categorias
+    for codigo in catalogo.en_orden():
+        sangria = "   " * catalogo.profundidades[codigo]
+        yield f"{sangria}{codigo + 1}. {etiqueta_categoria(catalogo.nombres[codigo])}"
+
+# Con más categorías que esto no se muestra el árbol completo: se escribe el nombre
+MAXIMO_CATEGORIAS_EN_MENU = 60
+
+def pedir_categoria(mensaje, permitir_crear=False, mostrar=True):
+    """
+    Muestra las categorías y pide una (por número, nombre o ruta); devuelve su nombre
+    Con permitir_crear=True, si se escribe un nombre que no existe se ofrece crearlo
+    Con mostrar=False no se listan (por ejemplo, si el menú ya las mostró)
+    """
+    catalogo = cuenta_actual.categorias
+    if mostrar and len(catalogo) <= MAXIMO_CATEGORIAS_EN_MENU:
+        for linea in lineas_categorias():
+            print(linea)
+    elif mostrar:
+        print(f"(Hay {len(catalogo)} categorías: escriba su nombre o su número)")
+    while True:
+        texto = input(mensaje).strip()
+        try:
+            return catalogo.nombres[validar_categoria(texto, catalogo)]
+        except ValueError as error:
+            if not (permitir_crear and texto and not texto.isdigit() and ">" not in texto):
+                print(f"❌ ERROR: {error}")
+                continue
+        if input(f"La categoría {texto!r} no existe. ¿Crearla? (s/n): ").strip().lower() != "s":
+            continue
+        padre = input("Dentro de qué categoría (Enter = ninguna, es principal): ").strip()
+        try:
+            return cuenta_actual.agregar_categoria(texto, padre or None)["categoria"]
+        except ValueError as error:
+            print(f"❌ ERROR: {error}")
 
 # =============================================================================
 # PASO 3: FUNCIÓN PARA REGISTRAR INGRESOS
@@ -82,14 +1469,11 @@ def registrar_ingresos():
         # Pedimos el valor usando nuestra función de validación
         valor = pedir_numero_positivo("Valor del ingreso $: ")
         
-        # Creamos un diccionario con los datos del ingreso
-        nuevo_ingreso = {
-            "descripcion": descripcion,
-            "valor": valor
-        }
+        # Pedimos la fecha (si la deja en blanco se usa la de hoy)
+        fecha = pedir_fecha("Fecha (AAAA-MM-DD, Enter = hoy): ")
         
-        # Agregamos el diccionario a nuestra lista
-        lista_ingresos.append(nuevo_ingreso)
+        # Guardamos el ingreso en la cuenta
+        cuenta_actual.registrar_ingreso(descripcion, valor, fecha)
         
         # Confirmamos que se guardó correctamente
         print(f"✅ Ingreso guardado: {descripcion} - ${valor:,.2f}")
@@ -129,155 +1513,398 @@ def registrar_gastos():
         valor = pedir_numero_positivo("Valor del gasto $: ")
         
         # Mostramos las categorías disponibles
-        print("\nCategorías disponibles:")  #len se usa para contar el numero total de categorias 
-        for j in range(len(categorias_gastos)):  # Bucle for para mostrar cada categoría
-            print(f"{j+1}. {categorias_gastos[j].title()}")  # .title() pone la primera letra en mayúscula
-        
-        # Pedimos que elija una categoría
-        opcion_categoria = pedir_opcion_menu("Seleccione el número de la categoría: ", len(categorias_gastos)) # len(categorias_gastos) establece el máximo permitido
-        categoria_seleccionada = categorias_gastos[opcion_categoria - 1]  # -1 porque las listas empiezan en 0 Ej: Si usuario selecciona 1 → accede al índice 0 de la lista
+        print("\nCategorías disponibles:")
+        # Pedimos que elija una categoría: por su número o escribiendo su nombre
+        # (el nombre se busca en un diccionario, sin recorrer la lista). Si escribe
+        # un nombre nuevo se le ofrece crear la categoría
+        categoria_seleccionada = pedir_categoria("Seleccione el número de la categoría: ", permitir_crear=True)
         
-        # Creamos el diccionario del gasto
-        nuevo_gasto = {
-            "nombre": nombre,
-            "valor": valor,
-            "categoria": categoria_seleccionada
-        }
+        # Pedimos la fecha (si la deja en blanco se usa la de hoy)
+        fecha = pedir_fecha("Fecha (AAAA-MM-DD, Enter = hoy): ")
         
-        # Lo agregamos a la lista
-        lista_gastos.append(nuevo_gasto)
+        # Lo guardamos en la cuenta
+        cuenta_actual.registrar_gasto(nombre, valor, categoria_seleccionada, fecha)
         
-        print(f"✅ Gasto guardado: {nombre} - ${valor:,.2f} ({categoria_seleccionada.title()})")
+        print(f"✅ Gasto guardado: {nombre} - ${valor:,.2f} ({etiqueta_categoria(categoria_seleccionada)})")
     
     print(f"\n🎉 Se registraron {cantidad} gastos exitosamente!")
 
 # =============================================================================
 # PASO 5: FUNCIÓN PARA MOSTRAR EL RESUMEN
 # =============================================================================
-def mostrar_resumen():
+# Mensajes de cada nivel de recomendación (según qué porcentaje de los ingresos se gasta)
+MENSAJES_RECOMENDACION = {
+    "sin_ingresos": ["⚠️  No ha registrado ingresos. Comience por ahí."],
+    "critico": ["🚨 ¡ALERTA! Está gastando más de lo que gana.",
+                "   Debe reducir gastos urgentemente."],
+    "alto": ["⚠️  ¡Alerta! Está gastando más de lo recomendable.",
+             "   Trate de reducir algunos gastos."],
+    "excelente": ["🌟 ¡Excelente! Tiene muy buenos hábitos financieros.",
+                  "   Está ahorrando más del 50% de sus ingresos."],
+    "equilibrado": ["👍 Sus finanzas están en buen estado.",
+                    "   Mantenga este equilibrio."],
+}
+
+def nivel_recomendacion(porcentaje_gasto):
     """
-    Esta función calcula y muestra todo el resumen financiero
-    Usa bucles for para recorrer las listas y sumar los valores
+    Decide qué recomendación dar según el porcentaje de los ingresos que se gasta
+    porcentaje_gasto es None cuando no hay ingresos
     """
-    print("\n" + "="*60)
-    print("              RESUMEN FINANCIERO MENSUAL")
-    print("="*60)
-    
-    # Verificamos si hay datos para mostrar
-    if len(lista_ingresos) == 0 and len(lista_gastos) == 0:
-        print("📋 No hay datos registrados aún.")
-        print("Primero registre algunos ingresos y gastos.")
-        return  # Salimos de la función si no hay datos
-    
-    # CALCULAMOS EL TOTAL DE INGRESOS
-    total_ingresos = 0  # Empezamos en cero
-    for ingreso in lista_ingresos:  # Recorremos cada ingreso en la lista
-        total_ingresos = total_ingresos + ingreso["valor"]  # Sumamos el valor
-    
-    # CALCULAMOS EL TOTAL DE GASTOS
-    total_gastos = 0
-    for gasto in lista_gastos:  # Recorremos cada gasto
-        total_gastos = total_gastos + gasto["valor"]
-    
-    # CALCULAMOS EL SALDO
-    saldo_disponible = total_ingresos - total_gastos
-    
-    # MOSTRAMOS LOS RESULTADOS BÁSICOS
-    print(f"💰 Total de Ingresos:    ${total_ingresos:,.2f}")
-    print(f"💸 Total de Gastos:      ${total_gastos:,.2f}")
-    print("-" * 40)
-    print(f"💳 Saldo Disponible:     ${saldo_disponible:,.2f}")
-    
-    # CALCULAMOS EL PORCENTAJE DE AHORRO
-    if total_ingresos > 0:  # Solo si hay ingresos (para evitar división por cero)
-        porcentaje_ahorro = (saldo_disponible / total_ingresos) * 100
-        print(f"📊 Porcentaje de Ahorro: {porcentaje_ahorro:.1f}%")
-    else:
-        print("📊 Porcentaje de Ahorro: No calculable (sin ingresos)")
-    
-    # GASTOS POR CATEGORÍA (solo si hay gastos)
-    if len(lista_gastos) > 0:
-        print("\n" + "="*50)
-        print("         GASTOS POR CATEGORÍA")
-        print("="*50)
-        
-        # Creamos un diccionario para sumar por categoría
-        gastos_por_categoria = {}
-        
-        # Recorremos todos los gastos
-        for gasto in lista_gastos:
-            categoria = gasto["categoria"]
-            valor = gasto["valor"]
-            
-            # Si la categoría ya existe en el diccionario, sumamos
-            if categoria in gastos_por_categoria:
-                gastos_por_categoria[categoria] = gastos_por_categoria[categoria] + valor
-            else:  # Si es la primera vez, la creamos
-                gastos_por_categoria[categoria] = valor
-        
-        # Mostramos cada categoría con su total y porcentaje
-        for categoria, total in gastos_por_categoria.items():
-            if total_gastos > 0:  # Para evitar división por cero
-                porcentaje = (total / total_gastos) * 100
-                print(f"🏷️  {categoria.title():<15}: ${total:>8,.2f} ({porcentaje:.1f}%)")
-    
-    # RECOMENDACIONES AUTOMÁTICAS
-    print("\n" + "="*50)
-    print("           RECOMENDACIONES")
-    print("="*50)
-    
-    if total_ingresos == 0:
-        print("⚠️  No ha registrado ingresos. Comience por ahí.")
+    # Usamos if/elif/else para dar diferentes recomendaciones
+    if porcentaje_gasto is None:
+        return "sin_ingresos"
+    elif porcentaje_gasto > 100:
+        return "critico"
+    elif porcentaje_gasto > 80:
+        return "alto"
+    elif porcentaje_gasto < 50:
+        return "excelente"
     else:
-        # Calculamos qué porcentaje de los ingresos se está gastando
-        porcentaje_gasto = (total_gastos / total_ingresos) * 100
-        
-        # Usamos if/elif/else para dar diferentes recomendaciones
-        if porcentaje_gasto > 100:
-            print("🚨 ¡ALERTA! Está gastando más de lo que gana.")
-            print("   Debe reducir gastos urgentemente.")
-        elif porcentaje_gasto > 80:
-            print("⚠️  ¡Alerta! Está gastando más de lo recomendable.")
-            print("   Trate de reducir algunos gastos.")
-        elif porcentaje_gasto < 50:
-            print("🌟 ¡Excelente! Tiene muy buenos hábitos financieros.")
-            print("   Está ahorrando más del 50% de sus ingresos.")
-        else:
-            print("👍 Sus finanzas están en buen estado.")
-            print("   Mantenga este equilibrio.")
+        return "equilibrado"
 
-# =============================================================================
+def armar_resumen(cantidad_ingresos, cantidad_gastos, centavos_ingresos, centavos_gastos, centavos_por_categoria,
+                  catalogo=None):
+    """
+    Arma el diccionario del resumen a partir de los totales (en centavos, enteros)
+    Como las sumas son exactas, cualquier forma de sumar (incremental, NumPy,
+    por procesos) da el mismo resultado; los montos se pasan a float solo al final
+    catalogo es el de las categorías de los gastos (por defecto, el de la cuenta del menú)
+    """
+    porcentaje_ahorro = None  # None significa "no calculable"
+    porcentaje_gasto = None
+    if centavos_ingresos > 0:  # Solo si hay ingresos (para evitar división por cero)
+        porcentaje_ahorro = (centavos_ingresos - centavos_gastos) / centavos_ingresos * 100
+        porcentaje_gasto = centavos_gastos / centavos_ingresos * 100
+
+    # Para cada categoría guardamos su total y qué porcentaje del gasto representa
+    gastos_por_categoria = {}
+    for categoria, centavos in centavos_por_categoria.items():
+        porcentaje = centavos / centavos_gastos * 100 if centavos_gastos > 0 else 0.0
+        gastos_por_categoria[categoria] = (centavos / 100, porcentaje)
+
+    resumen = {
+        "cantidad_ingresos": cantidad_ingresos,
+        "cantidad_gastos": cantidad_gastos,
+        "total_ingresos": centavos_ingresos / 100,
+        "total_gastos": centavos_gastos / 100,
+        "saldo_disponible": (centavos_ingresos - centavos_gastos) / 100,
+        "porcentaje_ahorro": porcentaje_ahorro,
+        "porcentaje_gasto": porcentaje_gasto,
+        "gastos_por_categoria": gastos_por_categoria,
+        "recomendacion": nivel_recomendacion(porcentaje_gasto),
+    }
+    catalogo = cuenta_actual.categorias if catalogo is None else catalogo
+    if catalogo.tiene_jerarquia:
+        resumen["gastos_por_rama"] = gastos_por_rama(
+            {catalogo.ids[categoria]: centavos for categoria, centavos in centavos_por_categoria.items()},
+            centavos_gastos, catalogo)
+    return resumen
+
+def gastos_por_rama(centavos_por_codigo, centavos_gastos, catalogo=None):
+    """
+    Para cada categoría con subcategorías, el total de toda su rama y su porcentaje del gasto
+    centavos_por_codigo es {código: centavos} de cada categoría sola; los totales suben
+    por el árbol en una sola pasada (ver RegistroCategorias.acumular)
+    """
+    catalogo = cuenta_actual.categorias if catalogo is None else catalogo
+    acumulado = catalogo.acumular(centavos_por_codigo)
+    return {
+        catalogo.nombres[codigo]: (acumulado[codigo] / 100,
+                                   acumulado[codigo] / centavos_gastos * 100 if centavos_gastos > 0 else 0.0)
+        for codigo in sorted(acumulado) if catalogo.hijos(codigo)
+    }
+
+def calcular_resumen(libro_ingresos=None, libro_gastos=None, desde=None, hasta=None):
+    """
+    Calcula los números del resumen financiero y los devuelve en un diccionario
+    No recorre los registros: usa los totales que cada libro va actualizando,
+    así que cuesta lo mismo con 10 registros que con 10 millones
+    Con desde/hasta (fechas) solo se cuentan los registros de ese periodo
+    """
+    libro_ingresos = lista_ingresos if libro_ingresos is None else libro_ingresos
+    libro_gastos = lista_gastos if libro_gastos is None else libro_gastos
+    catalogo = libro_gastos.categorias
+    if desde is None and hasta is None:
+        # Las cantidades salen de los totales y no de len(libro): si otro hilo está compactando
+        # el libro, sus columnas pueden estar a mitad del cambio
+        return armar_resumen(libro_ingresos.agregados.cantidad, libro_gastos.agregados.cantidad,
+                             libro_ingresos.agregados.total, libro_gastos.agregados.total,
+                             libro_gastos.agregados.total_por_categoria(catalogo.nombres), catalogo)
+
+    # Sin desde o sin hasta, el periodo queda abierto por ese lado
+    dia_desde = 1 if desde is None else validar_fecha(desde)
+    dia_hasta = date.max.toordinal() if hasta is None else validar_fecha(hasta)
+    ingresos = libro_ingresos.por_fecha.rango(dia_desde, dia_hasta)
+    gastos = libro_gastos.por_fecha.rango(dia_desde, dia_hasta)
+    return armar_resumen(ingresos.cantidad, gastos.cantidad, ingresos.total,
+                         gastos.total, gastos.total_por_categoria(catalogo.nombres), catalogo)
+
+def calcular_resumen_categoria(libro_gastos, categoria, desde=None, hasta=None):
+    """
+    Los números de una sola categoría: cuántos gastos tiene, cuánto suman y qué
+    porcentaje del gasto total son (en todo el libro o entre desde y hasta)
+    Si la categoría tiene subcategorías también se dan los números de toda la rama
+    (la categoría más todas sus subcategorías): cantidad_rama, total_rama y porcentaje_rama
+    """
+    catalogo = libro_gastos.categorias
+    codigo = validar_categoria(categoria, catalogo)
+    if desde is None and hasta is None:
+        agregados = libro_gastos.agregados
+    else:
+        dia_desde = 1 if desde is None else validar_fecha(desde)
+        dia_hasta = date.max.toordinal() if hasta is None else validar_fecha(hasta)
+        agregados = libro_gastos.por_fecha.rango(dia_desde, dia_hasta)
+    centavos = agregados.por_categoria.get(codigo, 0)
+    resumen = {
+        "categoria": catalogo.nombres[codigo],
+        "cantidad": agregados.cantidad_por_categoria.get(codigo, 0),
+        "total": centavos / 100,
+        "porcentaje": centavos / agregados.total * 100 if agregados.total > 0 else 0.0,
+    }
+    if catalogo.hijos(codigo):
+        centavos_rama = catalogo.acumular(agregados.por_categoria).get(codigo, 0)
+        resumen["cantidad_rama"] = catalogo.acumular(agregados.cantidad_por_categoria).get(codigo, 0)
+        resumen["total_rama"] = centavos_rama / 100
+        resumen["porcentaje_rama"] = centavos_rama / agregados.total * 100 if agregados.total > 0 else 0.0
+    return resumen
+
+def periodo_mes(anio, mes):
+    """Primer y último día de un mes"""
+    inicio = date(anio, mes, 1)
+    siguiente = date(anio + mes // 12, mes % 12 + 1, 1)
+    return inicio, siguiente - timedelta(days=1)
+
+def periodo_trimestre(anio, trimestre):
+    """Primer y último día de un trimestre (1 a 4)"""
+    inicio, _ = periodo_mes(anio, 3 * trimestre - 2)
+    _, fin = periodo_mes(anio, 3 * trimestre)
+    return inicio, fin
+
+def periodo_ultimos_dias(dias, hoy=None):
+    """Los últimos N días contando hoy (por ejemplo 30 o 90)"""
+    hoy = hoy or date.today()
+    return hoy - timedelta(days=dias - 1), hoy
+
+def elegir_periodo():
+    """
+    Pregunta de qué periodo quiere ver el resumen
+    Devuelve (desde, hasta); (None, None) significa todos los registros
+    """
+    hoy = date.today()
+    print("\n¿De qué periodo desea ver el resumen?")
+    print("1. Todos los registros")
+    print("2. Este mes")
+    print("3. Un mes específico")
+    print("4. Un trimestre")
+    print("5. Últimos 30 días")
+    print("6. Últimos 90 días")
+    opcion = pedir_opcion_menu("Seleccione una opción: ", 6)
+    
+    if opcion == 1:
+        return None, None
+    elif opcion == 2:
+        return periodo_mes(hoy.year, hoy.month)
+    elif opcion == 3:
+        anio = pedir_opcion_menu("Año (ej: 2024): ", date.max.year)
+        mes = pedir_opcion_menu("Mes (1 a 12): ", 12)
+        return periodo_mes(anio, mes)
+    elif opcion == 4:
+        anio = pedir_opcion_menu("Año (ej: 2024): ", date.max.year)
+        trimestre = pedir_opcion_menu("Trimestre (1 a 4): ", 4)
+        return periodo_trimestre(anio, trimestre)
+    elif opcion == 5:
+        return periodo_ultimos_dias(30, hoy)
+    else:
+        return periodo_ultimos_dias(90, hoy)
+
+def mostrar_resumen(desde=None, hasta=None):
+    """
+    Esta función muestra todo el resumen financiero (o solo el de un periodo)
+    Los cálculos los hace calcular_resumen(); las líneas las arma lineas_resumen()
+    y se escriben todas juntas de una sola vez. Si nada cambió desde la última vez
+    que se mostró, las líneas salen ya armadas de la caché (PASO 17)
+    """
+    with SalidaBuffer() as salida:
+        salida.escribir_lineas(lineas_resumen_en_cache(cuenta_actual.ingresos, cuenta_actual.gastos, desde, hasta))
+
+def lineas_resumen(resumen, desde=None, hasta=None, catalogo=None):
+    """
+    Genera las líneas de texto del resumen financiero, una por una
+    catalogo es el de la cuenta del resumen (por defecto, el de la cuenta del menú):
+    de él salen las rutas de las ramas, como "Servicios > Luz"
+    """
+    catalogo = cuenta_actual.categorias if catalogo is None else catalogo
+    yield "\n" + "="*60
+    yield "              RESUMEN FINANCIERO MENSUAL"
+    yield "="*60
+    if desde is not None or hasta is not None:
+        yield f"📅 Periodo: {desde or 'inicio'} a {hasta or 'hoy'}"
+    
+    # Verificamos si hay datos para mostrar
+    if resumen["cantidad_ingresos"] == 0 and resumen["cantidad_gastos"] == 0:
+        yield "📋 No hay datos registrados aún."
+        yield "Primero registre algunos ingresos y gastos."
+        return  # Salimos de la función si no hay datos
+    
+    total_ingresos = resumen["total_ingresos"]
+    total_gastos = resumen["total_gastos"]
+    saldo_disponible = resumen["saldo_disponible"]
+    
+    # MOSTRAMOS LOS RESULTADOS BÁSICOS
+    yield f"💰 Total de Ingresos:    ${total_ingresos:,.2f}"
+    yield f"💸 Total de Gastos:      ${total_gastos:,.2f}"
+    yield "-" * 40
+    yield f"💳 Saldo Disponible:     ${saldo_disponible:,.2f}"
+    
+    # MOSTRAMOS EL PORCENTAJE DE AHORRO
+    if resumen["porcentaje_ahorro"] is not None:
+        yield f"📊 Porcentaje de Ahorro: {resumen['porcentaje_ahorro']:.1f}%"
+    else:
+        yield "📊 Porcentaje de Ahorro: No calculable (sin ingresos)"
+    
+    # GASTOS POR CATEGORÍA (solo si hay gastos)
+    if resumen["cantidad_gastos"] > 0:
+        yield "\n" + "="*50
+        yield "         GASTOS POR CATEGORÍA"
+        yield "="*50
+        
+        # Mostramos cada categoría con su total y porcentaje
+        for categoria, (total, porcentaje) in resumen["gastos_por_categoria"].items():
+            if total_gastos > 0:  # Para evitar división por cero
+                yield f"🏷️  {etiqueta_categoria(categoria):<15}: ${total:>8,.2f} ({porcentaje:.1f}%)"
+
+        # Las categorías con subcategorías, sumando toda su rama
+        if resumen.get("gastos_por_rama"):
+            yield "\n" + "="*50
+            yield "   GASTOS POR RAMA (CON SUBCATEGORÍAS)"
+            yield "="*50
+            for categoria, (total, porcentaje) in resumen["gastos_por_rama"].items():
+                ruta = etiqueta_categoria(catalogo.ruta(catalogo.ids[categoria]))
+                yield f"🌳 {ruta}: ${total:>8,.2f} ({porcentaje:.1f}%)"
+    
+    # RECOMENDACIONES AUTOMÁTICAS
+    yield "\n" + "="*50
+    yield "           RECOMENDACIONES"
+    yield "="*50
+    
+    yield from MENSAJES_RECOMENDACION[resumen["recomendacion"]]
+
+# =============================================================================
 # PASO 6: FUNCIONES PARA MODIFICAR Y ELIMINAR
 # =============================================================================
-def mostrar_lista_ingresos():
+def formatear_ingreso(numero, ingreso):
+    return f"{numero}. {ingreso['fecha']} {ingreso['descripcion']} - ${ingreso['valor']:,.2f}"
+
+def formatear_gasto(numero, gasto):
+    return f"{numero}. {gasto['fecha']} {gasto['nombre']} - ${gasto['valor']:,.2f} ({etiqueta_categoria(gasto['categoria'])})"
+
+def mostrar_pagina(libro, titulo, formato, posiciones=None, pagina=1):
+    """
+    Muestra una sola página de registros (solo se leen los registros de esa página)
+    posiciones es el resultado de una búsqueda; None significa todos los registros
+    Devuelve cuántas páginas hay en total (0 si no hay nada que mostrar)
+    """
+    total = len(libro) if posiciones is None else len(posiciones)
+    if total == 0:
+        return 0
+    paginas = -(-total // TAMANO_PAGINA)  # División hacia arriba
+    pagina = min(max(1, pagina), paginas)
+    inicio = (pagina - 1) * TAMANO_PAGINA
+    if posiciones is None:
+        posiciones_pagina = libro.posiciones(inicio, inicio + TAMANO_PAGINA)
+    else:
+        posiciones_pagina = posiciones[inicio:inicio + TAMANO_PAGINA]
+    
+    lineas = [f"\n--- {titulo} ---"]
+    for posicion in posiciones_pagina:
+        registro = libro.en_posicion(posicion)
+        lineas.append(formato(registro.id, registro))  # Mostramos el id: no cambia aunque se eliminen otros
+    lineas.append(f"Página {pagina} de {paginas} ({total:,} registros)")
+    with SalidaBuffer() as salida:  # Toda la página de una sola vez
+        salida.escribir_lineas(lineas)
+    return paginas
+
+def mostrar_lista_ingresos(posiciones=None, pagina=1):
     """
-    Muestra todos los ingresos con números para que el usuario pueda elegir
+    Muestra una página de ingresos con números para que el usuario pueda elegir
     """
     if len(lista_ingresos) == 0:
         print("📋 No hay ingresos registrados.")
         return False  # Devolvemos False para indicar que no hay datos
-    
-    print("\n--- LISTA DE INGRESOS ---")
-    for i in range(len(lista_ingresos)):  # Bucle for con índices
-        ingreso = lista_ingresos[i]
-        print(f"{i+1}. {ingreso['descripcion']} - ${ingreso['valor']:,.2f}")
-    
-    return True  # Devolvemos True para indicar que sí hay datos
+    return mostrar_pagina(lista_ingresos, "LISTA DE INGRESOS", formatear_ingreso, posiciones, pagina) > 0
 
-def mostrar_lista_gastos():
+def mostrar_lista_gastos(posiciones=None, pagina=1):
     """
-    Muestra todos los gastos con números para que el usuario pueda elegir
+    Muestra una página de gastos con números para que el usuario pueda elegir
     """
     if len(lista_gastos) == 0:
         print("📋 No hay gastos registrados.")
         return False
+    return mostrar_pagina(lista_gastos, "LISTA DE GASTOS", formatear_gasto, posiciones, pagina) > 0
+
+def pedir_rango_valor(filtros):
+    """Pide un valor mínimo y uno máximo (opcionales) y los guarda en filtros"""
+    try:
+        texto_min = input("Valor mínimo (Enter = sin mínimo): ").strip()
+        texto_max = input("Valor máximo (Enter = sin máximo): ").strip()
+        filtros["valor_min"] = float(texto_min) if texto_min else None
+        filtros["valor_max"] = float(texto_max) if texto_max else None
+    except ValueError:
+        print("❌ ERROR: Debe escribir solo números")
+
+def elegir_registro(libro, titulo, formato, mensaje):
+    """
+    Muestra la lista por páginas y deja buscar hasta que el usuario elige un registro
+    Devuelve el id del registro elegido, o None si cancela
+    - Un número elige ese registro directamente (no hace falta estar en su página)
+    - S / A: página siguiente / anterior
+    - B: buscar por texto, C: filtrar por categoría, V: filtrar por rango de valor
+    - T: quitar los filtros, X: cancelar
+    """
+    if len(libro) == 0:
+        print(f"📋 No hay registros en {titulo.lower()}.")
+        return None
     
-    print("\n--- LISTA DE GASTOS ---")
-    for i in range(len(lista_gastos)):
-        gasto = lista_gastos[i]
-        print(f"{i+1}. {gasto['nombre']} - ${gasto['valor']:,.2f} ({gasto['categoria'].title()})")
-    
-    return True
+    filtros = {}
+    posiciones = None
+    pagina = 1
+    while True:
+        paginas = mostrar_pagina(libro, titulo, formato, posiciones, pagina)
+        if paginas == 0:
+            print("🔍 Ningún registro coincide con la búsqueda.")
+        opciones = "S=siguiente A=anterior B=buscar V=valor T=todos X=cancelar"
+        if libro.usa_categoria:
+            opciones = opciones.replace("V=valor", "C=categoría V=valor")
+        print(opciones)
+        respuesta = input(mensaje).strip().lower()
+        
+        if respuesta.isdigit():
+            numero = int(respuesta)
+            if libro.existe(numero):
+                return numero
+            print(f"❌ ERROR: No existe el registro número {numero}")
+        elif respuesta == "s":
+            pagina = min(pagina + 1, max(paginas, 1))
+        elif respuesta == "a":
+            pagina = max(pagina - 1, 1)
+        elif respuesta == "b":
+            filtros["texto"] = input("Texto a buscar: ").strip() or None
+        elif respuesta == "c" and libro.usa_categoria:
+            filtros["categoria"] = pedir_categoria("Categoría: ")
+        elif respuesta == "v":
+            pedir_rango_valor(filtros)
+        elif respuesta == "t":
+            filtros = {}
+        elif respuesta == "x":
+            return None
+        else:
+            print("❌ ERROR: Opción no válida")
+            continue
+        
+        if respuesta in ("b", "c", "v", "t"):
+            filtros = {clave: valor for clave, valor in filtros.items() if valor is not None}
+            posiciones = libro.buscar(**filtros) if filtros else None
+            pagina = 1
 
 def modificar_ingresos():
     """
@@ -285,33 +1912,39 @@ def modificar_ingresos():
     """
     print("\n--- MODIFICAR INGRESOS ---")
     
-    # Primero mostramos la lista
-    if not mostrar_lista_ingresos():  # Si no hay ingresos
+    # Mostramos la lista por páginas y pedimos cuál quiere modificar
+    numero = elegir_registro(lista_ingresos, "LISTA DE INGRESOS", formatear_ingreso,
+                             "¿Cuál ingreso desea modificar? (número): ")
+    if numero is None:  # Si no hay ingresos o canceló
         return  # Salimos de la función
     
-    # Pedimos cuál quiere modificar
-    numero = pedir_opcion_menu("¿Cuál ingreso desea modificar? (número): ", len(lista_ingresos))
-    indice = numero - 1  # Convertimos a índice de lista (empiezan en 0)
-    
     # Mostramos el ingreso actual
-    ingreso_actual = lista_ingresos[indice]
-    print(f"\nIngreso actual: {ingreso_actual['descripcion']} - ${ingreso_actual['valor']:,.2f}")
+    ingreso_actual = lista_ingresos.obtener(numero)
+    print(f"\nIngreso actual: {ingreso_actual['fecha']} {ingreso_actual['descripcion']} - ${ingreso_actual['valor']:,.2f}")
     
     # Pedimos la nueva descripción (opcional)
     print("Deje en blanco si no quiere cambiar la descripción")
     nueva_descripcion = input("Nueva descripción: ").strip()
     if nueva_descripcion:  # Si escribió algo
-        lista_ingresos[indice]["descripcion"] = nueva_descripcion
+        cuenta_actual.modificar_ingreso(numero, descripcion=nueva_descripcion)
     
     # Pedimos el nuevo valor (opcional)
     print("Escriba 0 si no quiere cambiar el valor")
     try:
         nuevo_valor = float(input("Nuevo valor: "))
         if nuevo_valor > 0:
-            lista_ingresos[indice]["valor"] = nuevo_valor
+            cuenta_actual.modificar_ingreso(numero, valor=nuevo_valor)
     except ValueError:
         print("Valor no válido, se mantiene el anterior")
     
+    # Pedimos la nueva fecha (opcional)
+    nueva_fecha = input("Nueva fecha (AAAA-MM-DD, deje en blanco para no cambiarla): ").strip()
+    if nueva_fecha:
+        try:
+            cuenta_actual.modificar_ingreso(numero, fecha=nueva_fecha)
+        except ValueError as error:
+            print(f"{error}. Se mantiene la fecha anterior")
+    
     print("✅ Ingreso modificado exitosamente!")
 
 def eliminar_ingresos():
@@ -320,21 +1953,20 @@ def eliminar_ingresos():
     """
     print("\n--- ELIMINAR INGRESOS ---")
     
-    if not mostrar_lista_ingresos():
+    numero = elegir_registro(lista_ingresos, "LISTA DE INGRESOS", formatear_ingreso,
+                             "¿Cuál ingreso desea eliminar? (número): ")
+    if numero is None:
         return
     
-    numero = pedir_opcion_menu("¿Cuál ingreso desea eliminar? (número): ", len(lista_ingresos))
-    indice = numero - 1
-    
     # Guardamos el ingreso que vamos a eliminar para confirmarlo
-    ingreso_eliminado = lista_ingresos[indice]
+    ingreso_eliminado = lista_ingresos.obtener(numero)
     
     # Confirmamos la eliminación
     print(f"¿Está sure de eliminar: {ingreso_eliminado['descripcion']} - ${ingreso_eliminado['valor']:,.2f}?")
     confirmacion = input("Escriba 'SI' para confirmar: ").upper()
     
     if confirmacion == "SI":
-        lista_ingresos.pop(indice)  # .pop() elimina el elemento en esa posición
+        cuenta_actual.eliminar_ingreso(numero)  # Elimina el ingreso con ese número
         print("✅ Ingreso eliminado exitosamente!")
     else:
         print("❌ Eliminación cancelada")
@@ -345,27 +1977,26 @@ def modificar_gastos():
     """
     print("\n--- MODIFICAR GASTOS ---")
     
-    if not mostrar_lista_gastos():
+    numero = elegir_registro(lista_gastos, "LISTA DE GASTOS", formatear_gasto,
+                             "¿Cuál gasto desea modificar? (número): ")
+    if numero is None:
         return
     
-    numero = pedir_opcion_menu("¿Cuál gasto desea modificar? (número): ", len(lista_gastos))
-    indice = numero - 1
-    
-    gasto_actual = lista_gastos[indice]
-    print(f"\nGasto actual: {gasto_actual['nombre']} - ${gasto_actual['valor']:,.2f} ({gasto_actual['categoria'].title()})")
+    gasto_actual = lista_gastos.obtener(numero)
+    print(f"\nGasto actual: {gasto_actual['fecha']} {gasto_actual['nombre']} - ${gasto_actual['valor']:,.2f} ({etiqueta_categoria(gasto_actual['categoria'])})")
     
     # Modificar nombre
     print("Deje en blanco si no quiere cambiar el nombre")
     nuevo_nombre = input("Nuevo nombre: ").strip()
     if nuevo_nombre:
-        lista_gastos[indice]["nombre"] = nuevo_nombre
+        cuenta_actual.modificar_gasto(numero, nombre=nuevo_nombre)
     
     # Modificar valor
     print("Escriba 0 si no quiere cambiar el valor")
     try:
         nuevo_valor = float(input("Nuevo valor: "))
         if nuevo_valor > 0:
-            lista_gastos[indice]["valor"] = nuevo_valor
+            cuenta_actual.modificar_gasto(numero, valor=nuevo_valor)
     except ValueError:
         print("Valor no válido, se mantiene el anterior")
     
@@ -373,11 +2004,16 @@ def modificar_gastos():
     cambiar_categoria = input("¿Desea cambiar la categoría? (si/no): ").lower()
     if cambiar_categoria in ["si", "sí", "s"]:
         print("\nCategorías disponibles:")
-        for j in range(len(categorias_gastos)):
-            print(f"{j+1}. {categorias_gastos[j].title()}")
-        
-        opcion = pedir_opcion_menu("Seleccione nueva categoría: ", len(categorias_gastos))
-        lista_gastos[indice]["categoria"] = categorias_gastos[opcion - 1]
+        categoria = pedir_categoria("Seleccione nueva categoría: ", permitir_crear=True)
+        cuenta_actual.modificar_gasto(numero, categoria=categoria)
+    
+    # Modificar fecha
+    nueva_fecha = input("Nueva fecha (AAAA-MM-DD, deje en blanco para no cambiarla): ").strip()
+    if nueva_fecha:
+        try:
+            cuenta_actual.modificar_gasto(numero, fecha=nueva_fecha)
+        except ValueError as error:
+            print(f"{error}. Se mantiene la fecha anterior")
     
     print("✅ Gasto modificado exitosamente!")
 
@@ -387,22 +2023,57 @@ def eliminar_gastos():
     """
     print("\n--- ELIMINAR GASTOS ---")
     
-    if not mostrar_lista_gastos():
+    numero = elegir_registro(lista_gastos, "LISTA DE GASTOS", formatear_gasto,
+                             "¿Cuál gasto desea eliminar? (número): ")
+    if numero is None:
         return
     
-    numero = pedir_opcion_menu("¿Cuál gasto desea eliminar? (número): ", len(lista_gastos))
-    indice = numero - 1
-    
-    gasto_eliminado = lista_gastos[indice]
+    gasto_eliminado = lista_gastos.obtener(numero)
     print(f"¿Está seguro de eliminar: {gasto_eliminado['nombre']} - ${gasto_eliminado['valor']:,.2f}?")
     confirmacion = input("Escriba 'SI' para confirmar: ").upper()
     
     if confirmacion == "SI":
-        lista_gastos.pop(indice)
+        cuenta_actual.eliminar_gasto(numero)
         print("✅ Gasto eliminado exitosamente!")
     else:
         print("❌ Eliminación cancelada")
 
+def eliminar_varios_gastos():
+    """
+    Elimina de una vez todos los gastos que cumplen un filtro
+    Por ejemplo: todos los de entretenimiento de menos de $5
+    """
+    print("\n--- ELIMINAR VARIOS GASTOS ---")
+    if len(lista_gastos) == 0:
+        print("📋 No hay gastos registrados.")
+        return
+    
+    # Armamos el filtro con las mismas opciones de la búsqueda
+    filtros = {}
+    texto = input("Texto del nombre (Enter = cualquiera): ").strip()
+    if texto:
+        filtros["texto"] = texto
+    if input("¿Filtrar por categoría? (si/no): ").lower() in ["si", "sí", "s"]:
+        filtros["categoria"] = pedir_categoria("Categoría: ")
+    pedir_rango_valor(filtros)
+    filtros = {clave: valor for clave, valor in filtros.items() if valor is not None}
+    if not filtros:
+        print("❌ ERROR: Debe indicar al menos un filtro")
+        return
+    
+    cantidad = len(lista_gastos.buscar(**filtros))
+    if cantidad == 0:
+        print("🔍 Ningún gasto coincide con el filtro.")
+        return
+    print(f"¿Está seguro de eliminar {cantidad:,} gastos?")
+    confirmacion = input("Escriba 'SI' para confirmar: ").upper()
+    
+    if confirmacion == "SI":
+        eliminados = cuenta_actual.eliminar_donde("gastos", **filtros)
+        print(f"✅ {eliminados:,} gastos eliminados exitosamente!")
+    else:
+        print("❌ Eliminación cancelada")
+
 def menu_modificar_eliminar():
     """
     Submenú para modificar o eliminar registros
@@ -415,9 +2086,10 @@ def menu_modificar_eliminar():
         print("2. Eliminar Ingresos")
         print("3. Modificar Gastos")
         print("4. Eliminar Gastos")
-        print("5. Volver al Menú Principal")
+        print("5. Eliminar Varios Gastos (por filtro)")
+        print("6. Volver al Menú Principal")
         
-        opcion = pedir_opcion_menu("Seleccione una opción: ", 5)
+        opcion = pedir_opcion_menu("Seleccione una opción: ", 6)
         
         # Usamos if/elif/else porque match-case lo usaremos solo en el menú principal
         if opcion == 1:
@@ -429,60 +2101,2987 @@ def menu_modificar_eliminar():
         elif opcion == 4:
             eliminar_gastos()
         elif opcion == 5:
+            eliminar_varios_gastos()
+        elif opcion == 6:
             break  # Salimos del bucle while y volvemos al menú principal
 
 # =============================================================================
-# PASO 7: FUNCIÓN PRINCIPAL DEL PROGRAMA
+# PASO 7: IMPORTACIÓN MASIVA DESDE ARCHIVOS CSV / JSONL
 # =============================================================================
-def menu_principal():
+# Los extractos bancarios pueden tener millones de filas. En vez de pedirlas
+# una por una con input(), las leemos del archivo por bloques: cada bloque se
+# valida, se agrega al libro y se descarta, así la memoria no crece con el archivo.
+
+def _filas_csv(lector, encabezado, columnas):
     """
-    Esta es la función principal que controla todo el programa
-    Usa un bucle while True para que el programa siga funcionando hasta que el usuario decida salir
+    Genera (fila_original, texto, valor, categoria, fecha) desde un csv.reader
+    encabezado es la primera fila del archivo, que ya se leyó (las columnas pueden venir en cualquier orden)
     """
-    # Mensaje de bienvenida (como el que ya tenías)
-    print("="*60)
-    print("    CALCULADORA FINANCIERA PERSONAL")
-    print("="*60)
-    print("Señor usuario, el siguiente programa le permitirá ver un")
-    print("Resumen Financiero sobre sus Ingresos y Gastos mensuales\n")
-    
-    # Bucle principal del programa
-    while True:  # Este bucle hace que el programa siga funcionando
-        # Mostramos el menú (como el que ya tenías)
-        print("\n" + "="*50)
-        print("Menu Calculadora Financiera Personal:")
-        print("="*50)
-        print("1. Registrar Ingresos")
-        print("2. Registrar Gastos")
-        print("3. Ver Resumen Financiero")
-        print("4. Modificar o Eliminar Registros")
-        print("5. Salir del programa")
-        print("="*50)
-        
-        # Pedimos la opción al usuario
-        opcion = pedir_opcion_menu("Por favor digite el número de la opción que desea: ", 5)
-        
-        # Usamos match-case como pedían en los requisitos
-        match opcion:
-            case 1:
-                registrar_ingresos()
-            case 2:
-                registrar_gastos()
-            case 3:
-                mostrar_resumen()
-            case 4:
-                menu_modificar_eliminar()
-            case 5:
-                # Mensaje de despedida
-                print("\n" + "="*50)
-                print("  GRACIAS POR USAR LA CALCULADORA FINANCIERA")
-                print("="*50)
-                print("¡Que tenga un excelente día! 💰")
-                break  # Salimos del bucle while y terminamos el programa
+    encabezado = [nombre.strip().lower() for nombre in encabezado]
+    faltantes = [columna for columna in columnas if columna not in encabezado]
+    if faltantes:
+        raise ValueError(f"Al archivo le faltan las columnas: {', '.join(faltantes)}")
+    posiciones = [encabezado.index(columna) for columna in columnas]
+    minimo = max(posiciones) + 1
+    if len(posiciones) == 2:  # Los ingresos no tienen categoría
+        posiciones.append(posiciones[0])
+        sin_categoria = True
+    else:
+        sin_categoria = False
+    # La columna fecha es opcional; si no está, todas las filas son de hoy
+    con_fecha = "fecha" in encabezado
+    posiciones.append(encabezado.index("fecha") if con_fecha else posiciones[0])
+    if con_fecha:
+        minimo = max(minimo, posiciones[-1] + 1)
+    # itemgetter saca las columnas de una vez (más rápido que un bucle)
+    tomar = itemgetter(*posiciones)
+    for fila in lector:
+        if len(fila) < minimo:
+            if fila:  # Las líneas vacías simplemente se saltan
+                yield fila, None, None, None, None
+            continue
+        texto, valor, categoria, fecha = tomar(fila)
+        yield fila, texto, valor, (None if sin_categoria else categoria), (fecha if con_fecha else None)
+
+def _filas_jsonl(archivo, columnas):
+    """Genera (fila_original, texto, valor, categoria, fecha) desde un archivo JSONL (un objeto por línea)"""
+    import json
+    for linea in archivo:
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            objeto = json.loads(linea)
+        except ValueError:
+            yield linea, None, None, None, None
+            continue
+        if not isinstance(objeto, dict):
+            yield linea, None, None, None, None
+            continue
+        datos = [objeto.get(columna) for columna in columnas]
+        texto, valor = datos[0], datos[1]
+        categoria = datos[2] if len(datos) > 2 else None
+        yield linea, (texto if isinstance(texto, str) else None), valor, categoria, objeto.get("fecha")
+
+def importar_archivo(ruta, libro, ruta_rechazos=None, tamano_bloque=50000, almacen=None):
+    """
+    Carga un archivo CSV o JSONL completo dentro de un libro (lista_ingresos o lista_gastos)
+    - Cada fila se valida con las mismas reglas que pedir_numero_positivo
+    - Las filas malas se escriben en el archivo de rechazos junto con el motivo
+      (en un CSV, con el mismo encabezado y el mismo orden de columnas que el archivo)
+    - Si se da el almacen (AlmacenPersistente) que guarda el libro, lo importado queda en disco al terminar
+    - Devuelve un reporte con filas aceptadas, rechazadas y el tiempo que tardó
+    """
+    es_jsonl = ruta.lower().endswith((".jsonl", ".json", ".ndjson"))
+    columnas = libro.campos_obligatorios
+    if ruta_rechazos is None:
+        ruta_rechazos = ruta + ".rechazos"
+
+    inicio = time.perf_counter()
+    aceptadas = 0
+    rechazadas = 0
+
+    with open(ruta, encoding="utf-8", newline="") as archivo, \
+         open(ruta_rechazos, "w", encoding="utf-8", newline="") as rechazos:
+        if es_jsonl:
+            import json
+            filas = _filas_jsonl(archivo, columnas)
+
+            def rechazar(original, motivo):
+                rechazos.write(json.dumps({"fila": original, "motivo": motivo}, ensure_ascii=False) + "\n")
+        else:
+            import csv
+            lector = csv.reader(archivo)
+            encabezado = next(lector, [])
+            filas = _filas_csv(lector, encabezado, columnas)
+            # Las filas rechazadas se copian tal cual: el encabezado es el del archivo, no el del libro
+            escritor = csv.writer(rechazos)
+            escritor.writerow(encabezado + ["motivo"])
+
+            def rechazar(original, motivo):
+                escritor.writerow(list(original) + [motivo])
+
+        # Columnas del bloque actual (se vacían cada vez que el bloque se guarda en el libro)
+        textos = []
+        centavos = array("q")
+        codigos = array("H")
+        fechas = array("i")
+        dias_vistos = {}  # En un extracto las mismas fechas se repiten mucho: las convertimos una vez
+        for original, texto, valor, categoria, fecha in filas:
+            try:
+                if texto is None and valor is None:
+                    raise ValueError("Fila incompleta o mal formada")
+                texto = validar_texto(texto, columnas[0])
+                valor = validar_numero_positivo(valor)
+                dia = dias_vistos.get(fecha) if isinstance(fecha, str) else None
+                if dia is None:
+                    dia = validar_fecha(fecha)
+                    if isinstance(fecha, str):
+                        dias_vistos[fecha] = dia
+                if libro.usa_categoria:
+                    codigos.append(validar_categoria(categoria, libro.categorias))
+            except ValueError as error:
+                rechazadas += 1
+                rechazar(original, str(error))
+                continue
+            textos.append(texto)
+            centavos.append(valor.centavos)
+            fechas.append(dia)
+
+            if len(centavos) >= tamano_bloque:
+                libro.extender(textos, centavos, codigos, fechas)
+                aceptadas += len(centavos)
+                textos = []
+                centavos = array("q")
+                codigos = array("H")
+                fechas = array("i")
+
+        if centavos:  # El último bloque casi nunca está lleno
+            libro.extender(textos, centavos, codigos, fechas)
+            aceptadas += len(centavos)
+
+    # La importación no pasa por el diario: si el libro se guarda en disco, la instantánea
+    # se escribe antes de volver, para que un cierre brusco no pierda las filas importadas
+    if aceptadas and almacen is not None and any(guardado is libro for guardado in almacen.libros.values()):
+        almacen.sincronizar()
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "aceptadas": aceptadas,
+        "rechazadas": rechazadas,
+        "segundos": segundos,
+        "filas_por_segundo": (aceptadas + rechazadas) / segundos if segundos > 0 else 0.0,
+        "archivo_rechazos": ruta_rechazos,
+    }
+
+def importar_registros():
+    """
+    Menú para importar ingresos o gastos desde un archivo exportado por el banco
+    """
+    print("\n" + "="*50)
+    print("        IMPORTAR DESDE ARCHIVO (CSV / JSONL)")
+    print("="*50)
+    print("1. Importar Ingresos (columnas: descripcion, valor y opcionalmente fecha)")
+    print("2. Importar Gastos (columnas: nombre, valor, categoria y opcionalmente fecha)")
+    tipo = pedir_opcion_menu("Seleccione una opción: ", 2)
+    libro = lista_ingresos if tipo == 1 else lista_gastos
+
+    ruta = input("Ruta del archivo: ").strip()
+    try:
+        reporte = importar_archivo(ruta, libro, almacen=almacen)
+    except (OSError, ValueError) as error:
+        print(f"❌ ERROR: No se pudo importar el archivo: {error}")
+        return
+
+    print(f"✅ Filas aceptadas:  {reporte['aceptadas']:,}")
+    print(f"❌ Filas rechazadas: {reporte['rechazadas']:,}")
+    print(f"⏱️  Tiempo: {reporte['segundos']:.2f} s ({reporte['filas_por_segundo']:,.0f} filas/s)")
+    if reporte["rechazadas"]:
+        print(f"   Las filas rechazadas quedaron en: {reporte['archivo_rechazos']}")
+
+# =============================================================================
+# PASO 8: GUARDAR LOS DATOS EN DISCO (DIARIO + INSTANTÁNEA)
+# =============================================================================
+# Para no perder los datos al salir usamos dos archivos:
+# - diario.jsonl: cada cambio (registrar, modificar, eliminar) se agrega al final
+#   como una línea. Para no llamar a fsync en cada línea las agrupamos (group commit).
+# - instantanea.bin: una copia binaria de todas las columnas. Cada cierto número
+#   de cambios se escribe una nueva y el diario se vacía (compactación).
+# Al iniciar se lee la instantánea con mmap (copiando los arreglos de un solo golpe,
+# sin interpretar registro por registro) y luego se repiten los cambios del diario.
+# Ojo: no es una carga "sin copia". Los libros necesitan arreglos que puedan crecer
+# (registrar agrega al final), así que cada columna se copia una vez del mapa a su
+# array; lo que se ahorra es el análisis de texto, no la copia de memoria.
+
+MAGIA_INSTANTANEA = b"CALCFIN1"
+
+def directorio_datos():
+    """Carpeta donde se guardan los datos (se puede cambiar con CALCULADORA_DATOS)"""
+    return os.environ.get("CALCULADORA_DATOS") or os.path.join(os.path.expanduser("~"), ".calculadora_financiera")
+
+
+class AlmacenPersistente:
+    """
+    Guarda los libros de ingresos y gastos en disco
+    Uso: almacen = AlmacenPersistente(carpeta, {"ingresos": lista_ingresos, "gastos": lista_gastos})
+         almacen.abrir()  -> carga lo guardado y empieza a anotar cada cambio
+    """
+
+    def __init__(self, directorio, libros, lote_fsync=64, segundos_fsync=0.2, umbral_compactacion=100000):
+        self.directorio = directorio
+        self.libros = libros
+        self.lote_fsync = lote_fsync                  # Cuántas líneas juntamos antes de un fsync
+        self.segundos_fsync = segundos_fsync          # O cuánto tiempo como máximo
+        self.umbral_compactacion = umbral_compactacion
+        self.ruta_diario = os.path.join(directorio, "diario.jsonl")
+        self.ruta_instantanea = os.path.join(directorio, "instantanea.bin")
+
+        self.secuencia = 0           # Número del último cambio anotado
+        self._diario = None
+        self._pendientes = 0         # Líneas escritas que aún no tienen fsync
+        self._primer_pendiente = 0.0
+        self._lineas_diario = 0      # Líneas del diario desde la última instantánea
+        self._instantanea_pendiente = False
+        # Códigos de las categorías que ya están en la instantánea o en el diario de este almacén
+        # (las iniciales existen siempre y no hace falta anotarlas)
+        self._categorias_anotadas = set(range(len(CATEGORIAS_INICIALES)))
+        # El catálogo de la cuenta (el del libro con categorías): solo se anotan las de esa cuenta
+        self.categorias = next((libro.categorias for libro in libros.values() if libro.usa_categoria), categorias)
+
+    # ---------------------------------------------------------------- apertura
+    def abrir(self):
+        """Carga la instantánea, repite el diario y empieza a anotar los cambios nuevos"""
+        import json
+        os.makedirs(self.directorio, exist_ok=True)
+        self._cargar_instantanea()
+
+        # Repetimos los cambios del diario que la instantánea todavía no tiene
+        if os.path.exists(self.ruta_diario):
+            with open(self.ruta_diario, encoding="utf-8") as diario:
+                for numero, linea in enumerate(diario, start=1):
+                    try:
+                        entrada = json.loads(linea)
+                    except ValueError:
+                        break  # Una línea cortada al final (el programa se cerró a la mitad)
+                    try:
+                        if entrada["n"] <= self.secuencia:
+                            continue
+                        self._aplicar(entrada)
+                    except (KeyError, IndexError, TypeError) as error:
+                        # Por ejemplo un cambio sobre un registro que la instantánea no tiene:
+                        # se avisa como cualquier otro error de carga en vez de cerrar el programa
+                        raise ValueError(f"{self.ruta_diario}, línea {numero}: no se pudo repetir "
+                                         f"el cambio ({type(error).__name__}: {error})") from error
+                    self.secuencia = entrada["n"]
+                    self._lineas_diario += 1
+
+        self._diario = open(self.ruta_diario, "a", encoding="utf-8")
+        for nombre, libro in self.libros.items():
+            libro.observadores.append(lambda operacion, *datos, nombre=nombre: self.anotar(nombre, operacion, *datos))
+        self.categorias.observadores.append(self._anotar_categoria)
+        return self
+
+    def _aplicar(self, entrada):
+        operacion = entrada["op"]
+        if operacion == "categoria":  # Una categoría creada mientras el programa corría
+            self._categorias_anotadas.add(self.categorias.agregar(entrada["nombre"], entrada["padre"]))
+            return
+        libro = self.libros[entrada["libro"]]
+        if operacion == "agregar":
+            # El registro recupera el id que tenía (los diarios de versiones anteriores no lo traen)
+            id_registro = entrada.get("id", entrada["registro"].get("id"))
+            if id_registro is not None:
+                libro.siguiente_id = max(libro.siguiente_id, id_registro)
+            libro.append(entrada["registro"])
+        elif operacion == "modificar":
+            # Los diarios de versiones anteriores usaban la posición ("indice") en vez del id
+            registro = libro.obtener(entrada["id"]) if "id" in entrada else libro[entrada["indice"]]
+            registro[entrada["campo"]] = entrada["valor"]
+        elif operacion == "eliminar":
+            if "id" in entrada:
+                libro.eliminar(entrada["id"])
+            else:
+                libro.pop(entrada["indice"])
+        elif operacion == "eliminar_varios":
+            libro.eliminar_varios(entrada["ids"])
+
+    # ---------------------------------------------------------------- escritura
+    def _anotar_categoria(self, codigo):
+        """
+        Anota en el diario la creación de una categoría (y antes la de sus padres) si este
+        almacén todavía no la tiene. Así al repetir el diario la categoría existe antes
+        que los gastos que la usan, aunque se haya creado desde el menú de categorías
+        """
+        if codigo in self._categorias_anotadas or self._diario is None:
+            return
+        padre = self.categorias.padres[codigo]
+        if padre >= 0:
+            self._anotar_categoria(padre)
+        self._categorias_anotadas.add(codigo)
+        self._escribir({"op": "categoria", "nombre": self.categorias.nombres[codigo],
+                        "padre": self.categorias.nombres[padre] if padre >= 0 else None})
+
+    def anotar(self, nombre_libro, operacion, *datos):
+        """Escribe un cambio al final del diario (lo llaman los observadores de cada libro)"""
+        if operacion == "extender":
+            # Las importaciones masivas son demasiado grandes para el diario:
+            # se guardan escribiendo una instantánea completa en la próxima sincronización
+            self._instantanea_pendiente = True
+            return
+        if operacion == "compactar":
+            return  # Solo cambian las posiciones internas; el diario usa los id
+        if self._instantanea_pendiente:
+            # Un cambio después de una importación que aún no está en disco: si solo se anotara,
+            # el diario hablaría de registros que la instantánea no tiene. Se escribe la
+            # instantánea ahora (ya incluye este cambio) y la línea no hace falta
+            self.compactar()
+            return
+
+        entrada = {"libro": nombre_libro, "op": operacion}
+        if operacion == "agregar":
+            entrada["id"] = datos[0]["id"]
+            entrada["registro"] = datos[0]
+            if "categoria" in datos[0]:
+                self._anotar_categoria(self.categorias.ids[datos[0]["categoria"]])
+        elif operacion == "modificar":
+            entrada["id"], entrada["campo"], entrada["valor"] = datos[:3]
+            if entrada["campo"] == "categoria":
+                self._anotar_categoria(self.categorias.ids[entrada["valor"]])
+        elif operacion == "eliminar":
+            entrada["id"] = datos[0]
+        elif operacion == "eliminar_varios":
+            entrada["ids"] = datos[0].tolist()
+        self._escribir(entrada)
+
+    def _escribir(self, entrada):
+        # Numera la entrada, la escribe al final del diario y hace fsync por grupos
+        import json
+        self.secuencia += 1
+        entrada = {"n": self.secuencia, **entrada}
+        self._diario.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        self._lineas_diario += 1
+
+        if self._pendientes == 0:
+            self._primer_pendiente = time.monotonic()
+        self._pendientes += 1
+        if self._pendientes >= self.lote_fsync or time.monotonic() - self._primer_pendiente >= self.segundos_fsync:
+            self._fsync()
+
+    def _fsync(self):
+        self._diario.flush()
+        os.fsync(self._diario.fileno())
+        self._pendientes = 0
+
+    def sincronizar(self):
+        """Asegura que todo lo anotado esté en disco y compacta el diario si creció mucho"""
+        if self._diario is None:
+            return
+        if self._instantanea_pendiente or self._lineas_diario >= self.umbral_compactacion:
+            self.compactar()
+        elif self._pendientes:
+            self._fsync()
+
+    def cerrar(self):
+        self.sincronizar()
+        if self._anotar_categoria in self.categorias.observadores:
+            self.categorias.observadores.remove(self._anotar_categoria)
+        if self._diario is not None:
+            self._diario.close()
+            self._diario = None
+
+    # ---------------------------------------------------------------- instantánea
+    def compactar(self):
+        """Escribe una instantánea nueva con todos los datos y vacía el diario"""
+        import json
+        secciones = []   # Bloques de bytes en el orden en que se escriben
+        posicion = 0
+        descripcion = {"secuencia": self.secuencia, "orden_bytes": sys.byteorder,
+                       "categorias": self.categorias.a_estado(), "libros": {}}
+
+        def agregar_seccion(datos):
+            nonlocal posicion
+            secciones.append(datos)
+            inicio = posicion
+            posicion += len(datos)
+            return [inicio, len(datos)]
+
+        for nombre, libro in self.libros.items():
+            libro.compactar()  # Las lápidas no se guardan
+            tabla = "\x00".join(libro._tabla_textos).encode("utf-8")
+            descripcion["libros"][nombre] = {
+                "cantidad": len(libro),
+                "cantidad_textos": len(libro._tabla_textos),
+                "siguiente_id": libro.siguiente_id,
+                "agregados": libro.agregados.a_estado(),
+                "por_fecha": libro.por_fecha.a_estado(),
+                "centavos": agregar_seccion(memoryview(libro._centavos).cast("B")),
+                "fechas": agregar_seccion(memoryview(libro._fechas).cast("B")),
+                "textos": agregar_seccion(memoryview(libro._textos).cast("B")),
+                "categorias": agregar_seccion(memoryview(libro._categorias).cast("B")),
+                "ids": agregar_seccion(memoryview(libro._ids).cast("B")),
+                "tabla": agregar_seccion(tabla),
+            }
+
+        cabecera = json.dumps(descripcion).encode("utf-8")
+        temporal = self.ruta_instantanea + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(MAGIA_INSTANTANEA)
+            archivo.write(len(cabecera).to_bytes(8, "little"))
+            archivo.write(cabecera)
+            for datos in secciones:
+                archivo.write(datos)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, self.ruta_instantanea)  # Reemplazo atómico: nunca queda a medias
+
+        # La instantánea ya tiene todo: el diario puede empezar de cero
+        if self._diario is not None:
+            self._diario.close()
+        self._diario = open(self.ruta_diario, "w", encoding="utf-8")
+        self._fsync()
+        self._lineas_diario = 0
+        self._instantanea_pendiente = False
+        self._categorias_anotadas = set(range(len(self.categorias)))
+
+    def _cargar_instantanea(self):
+        import json
+        import mmap
+        if not os.path.exists(self.ruta_instantanea):
+            return
+        with open(self.ruta_instantanea, "rb") as archivo:
+            # El mapa solo evita leer el archivo a un búfer intermedio: cada columna se copia
+            # de él a un array (frombytes) porque el mapa se cierra al terminar y es de solo lectura
+            with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                if mapa[:len(MAGIA_INSTANTANEA)] != MAGIA_INSTANTANEA:
+                    raise ValueError(f"{self.ruta_instantanea} no es una instantánea válida")
+                inicio_cabecera = len(MAGIA_INSTANTANEA) + 8
+                largo = int.from_bytes(mapa[len(MAGIA_INSTANTANEA):inicio_cabecera], "little")
+                descripcion = json.loads(mapa[inicio_cabecera:inicio_cabecera + largo])
+                base = inicio_cabecera + largo
+                vista = memoryview(mapa)
+                traduccion = None
+                if "categorias" in descripcion:
+                    # Las categorías guardadas se crean si faltan; si alguna quedó con otro
+                    # código (se crearon en otro orden) hay que traducir los códigos de la columna
+                    traduccion = self.categorias.cargar_estado(descripcion["categorias"])
+                    self._categorias_anotadas.update(traduccion)
+                    if traduccion == array("i", range(len(traduccion))):
+                        traduccion = None
+                try:
+                    for nombre, datos in descripcion["libros"].items():
+                        libro = self.libros[nombre]
+
+                        def leer(seccion, tipo):
+                            inicio, largo = datos[seccion]
+                            columna = array(tipo)
+                            columna.frombytes(vista[base + inicio:base + inicio + largo])
+                            if descripcion["orden_bytes"] != sys.byteorder:
+                                columna.byteswap()
+                            return columna
+
+                        if "centavos" in datos:
+                            libro._centavos = leer("centavos", "q")
+                        else:
+                            # Instantánea de antes de los centavos: los valores estaban en float
+                            libro._centavos = array("q", map(a_centavos, leer("valores", "d")))
+                        libro._textos = leer("textos", "I")
+                        if "categorias" in descripcion:
+                            libro._categorias = leer("categorias", "H")
+                        else:
+                            # Instantánea de antes del catálogo: un byte por código
+                            libro._categorias = array("H", leer("categorias", "B"))
+                        inicio, largo = datos["tabla"]
+                        tabla = bytes(vista[base + inicio:base + inicio + largo]).decode("utf-8")
+                        libro._tabla_textos = tabla.split("\x00") if datos["cantidad_textos"] else []
+                        libro._id_texto = {texto: numero for numero, texto in enumerate(libro._tabla_textos)}
+                        if "ids" in datos:
+                            libro._ids = leer("ids", "q")
+                            libro.siguiente_id = datos["siguiente_id"]
+                        else:
+                            # Instantánea de antes de los id: numeramos los registros desde 1
+                            libro._ids = array("q", range(1, len(libro._centavos) + 1))
+                            libro.siguiente_id = len(libro._centavos) + 1
+                        libro._vivos = array("B", b"\x01" * len(libro._centavos))
+                        libro._eliminados = 0
+                        if "fechas" in datos:
+                            libro._fechas = leer("fechas", "i")
+                        else:
+                            # Instantánea de antes de que existieran las fechas: usamos el día en que se guardó
+                            dia = date.fromtimestamp(os.path.getmtime(self.ruta_instantanea)).toordinal()
+                            libro._fechas = array("i", [dia]) * len(libro._centavos)
+                        if "centavos" in datos:
+                            libro.agregados.cargar_estado(datos["agregados"])
+                            libro.por_fecha.cargar_estado(datos["por_fecha"])
+                        else:
+                            # Los totales viejos eran float (o no existían): los recalculamos en centavos
+                            libro.recalcular_agregados()
+                        if traduccion is not None and libro.usa_categoria:
+                            libro._categorias = array("H", map(traduccion.__getitem__, libro._categorias))
+                            libro.recalcular_agregados()
+                        libro.version += 1  # Los datos cambiaron sin pasar por _notificar
+                finally:
+                    vista.release()
+        self.secuencia = descripcion["secuencia"]
+
+
+almacen = None  # Se crea en menu_principal() cuando el programa arranca
+
+def abrir_almacen(directorio=None):
+    """Abre el almacén persistente de lista_ingresos y lista_gastos"""
+    global almacen
+    almacen = AlmacenPersistente(directorio or directorio_datos(), cuenta_actual.libros()).abrir()
+    return almacen
+
+# =============================================================================
+# PASO 9: ANÁLISIS VECTORIZADO CON NUMPY (OPCIONAL)
+# =============================================================================
+# Si NumPy está instalado podemos calcular el resumen de muchos usuarios a la vez:
+# todas las columnas se juntan en arreglos grandes y las sumas por usuario y por
+# categoría se hacen en una sola pasada (np.bincount) sin bucles de Python.
+# Si NumPy no está instalado el programa funciona igual con los totales normales.
+
+def cargar_numpy():
+    """Devuelve el módulo numpy, o None si no está instalado"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+# Casillas (cuentas x categorías) hasta las que la tabla de sumas se arma completa
+LIMITE_CASILLAS_LOTE = 1 << 20
+
+def _sumar_por_casilla(np, casillas, pesos, largo):
+    """
+    Suma los centavos de pesos en largo casillas (casillas[i] es la casilla de la fila i)
+    bincount suma en float64, que es exacto con centavos enteros hasta 2**53 (90 billones de pesos).
+    Ojo: la cota se calcula con enteros de Python y no con pesos.sum(), que suma en int64
+    y se desbordaría sin avisar justo en los casos grandes que queremos detectar
+    """
+    cota = len(pesos) * int(np.abs(pesos).max()) if len(pesos) else 0
+    if cota < 2**53:
+        return np.rint(np.bincount(casillas, weights=pesos, minlength=largo)).astype(np.int64)
+    if cota < 2**63:
+        sumas = np.zeros(largo, dtype=np.int64)
+        np.add.at(sumas, casillas, pesos)  # Más lento, pero con enteros exactos
+        return sumas
+    # Ni siquiera int64 alcanza para la cota: sumamos con enteros de Python (que no se desbordan)
+    sumas = [0] * largo
+    for casilla, peso in zip(casillas.tolist(), pesos.tolist()):
+        sumas[casilla] += peso
+    return np.array(sumas, dtype=np.int64)  # OverflowError si un total de verdad no cabe en int64
+
+def analizar_lote(cuentas):
+    """
+    Calcula el resumen de varias cuentas de una sola vez con NumPy
+    cuentas es una lista de parejas (libro_ingresos, libro_gastos)
+    Devuelve una lista de resúmenes con los mismos números que calcular_resumen()
+    """
+    np = cargar_numpy()
+    if np is None:
+        raise RuntimeError("El análisis vectorizado necesita NumPy (pip install numpy)")
+    cantidad_cuentas = len(cuentas)
+    if not cantidad_cuentas:
+        return []
+
+    def columnas(libro, con_categoria):
+        # np.frombuffer ve los arreglos del libro sin copiarlos
+        centavos = np.frombuffer(libro._centavos, dtype=np.int64)
+        codigos = np.frombuffer(libro._categorias, dtype=np.uint16) if con_categoria else None
+        if libro._eliminados:  # Dejamos afuera las lápidas
+            vivos = np.frombuffer(libro._vivos, dtype=np.bool_)
+            centavos = centavos[vivos]
+            codigos = codigos[vivos] if con_categoria else None
+        return centavos, codigos
+
+    def juntar(libros, con_categoria):
+        # concatenate junta las columnas de todas las cuentas en una sola
+        partes = [columnas(libro, con_categoria) for libro in libros]
+        cantidades = np.array([len(centavos) for centavos, _ in partes], dtype=np.int64)
+        dueno = np.repeat(np.arange(cantidad_cuentas), cantidades)  # A qué cuenta pertenece cada fila
+        centavos = np.concatenate([centavos for centavos, _ in partes]) if partes else np.zeros(0, dtype=np.int64)
+        codigos = None
+        if con_categoria:
+            codigos = np.concatenate([codigos for _, codigos in partes])
+        return cantidades, dueno, centavos, codigos
+
+    cantidad_ing, dueno_ing, centavos_ing, _ = juntar([par[0] for par in cuentas], False)
+    cantidad_gas, dueno_gas, centavos_gas, codigos = juntar([par[1] for par in cuentas], True)
+
+    # La tabla de sumas tiene una fila por cuenta y una columna por categoría. Con miles de
+    # categorías y de cuentas sería enorme y casi vacía: en ese caso numeramos de nuevo
+    # solo las categorías que aparecen (presentes[i] es el código de la columna i)
+    # Cada cuenta tiene su catálogo: un código se lee con el de su cuenta, y la tabla
+    # tiene tantas columnas como el catálogo más grande
+    catalogos = [par[1].categorias for par in cuentas]
+    ancho = max(map(len, catalogos), default=0)
+    presentes = np.arange(ancho)
+    if cantidad_cuentas * len(presentes) > LIMITE_CASILLAS_LOTE:
+        presentes = np.flatnonzero(np.bincount(codigos, minlength=len(presentes)))
+        nueva_columna = np.zeros(ancho, dtype=np.intp)
+        nueva_columna[presentes] = np.arange(len(presentes))
+        codigos = nueva_columna[codigos]
+    cantidad_categorias = len(presentes)
+
+    # Una sola pasada por las filas: cada fila cae en la casilla (cuenta, categoría)
+    def sumar(casillas, pesos, largo):
+        return _sumar_por_casilla(np, casillas, pesos, largo)
+
+    casillas = dueno_gas * cantidad_categorias + codigos
+    largo = cantidad_cuentas * cantidad_categorias
+    sumas_categoria = sumar(casillas, centavos_gas, largo).reshape(cantidad_cuentas, cantidad_categorias)
+    filas_categoria = np.bincount(casillas, minlength=largo).reshape(cantidad_cuentas, cantidad_categorias)
+    total_ingresos = sumar(dueno_ing, centavos_ing, cantidad_cuentas)
+    total_gastos = sumar(dueno_gas, centavos_gas, cantidad_cuentas)
+
+    # Porcentajes y niveles de recomendación para todas las cuentas a la vez
+    # (las mismas operaciones que armar_resumen(), así los números salen idénticos)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hay_ingresos = total_ingresos > 0
+        saldo = total_ingresos - total_gastos
+        porcentaje_ahorro = np.where(hay_ingresos, saldo / total_ingresos * 100, np.nan)
+        porcentaje_gasto = np.where(hay_ingresos, total_gastos / total_ingresos * 100, np.nan)
+        porcentaje_categoria = np.where(total_gastos[:, None] > 0,
+                                        sumas_categoria / total_gastos[:, None] * 100, 0.0)
+    niveles = np.select(
+        [~hay_ingresos, porcentaje_gasto > 100, porcentaje_gasto > 80, porcentaje_gasto < 50],
+        ["sin_ingresos", "critico", "alto", "excelente"],
+        default="equilibrado",
+    )
+
+    # Convertimos a diccionarios con la misma forma que armar_resumen()
+    resumenes = []
+    for c in range(cantidad_cuentas):
+        gastos_por_categoria = {}
+        centavos_por_codigo = {}
+        for columna in np.flatnonzero(filas_categoria[c]):
+            codigo = int(presentes[columna])
+            centavos_por_codigo[codigo] = int(sumas_categoria[c, columna])
+            gastos_por_categoria[catalogos[c].nombres[codigo]] = (
+                centavos_por_codigo[codigo] / 100, float(porcentaje_categoria[c, columna]))
+        resumen = {
+            "cantidad_ingresos": int(cantidad_ing[c]),
+            "cantidad_gastos": int(cantidad_gas[c]),
+            "total_ingresos": int(total_ingresos[c]) / 100,
+            "total_gastos": int(total_gastos[c]) / 100,
+            "saldo_disponible": int(saldo[c]) / 100,
+            "porcentaje_ahorro": float(porcentaje_ahorro[c]) if hay_ingresos[c] else None,
+            "porcentaje_gasto": float(porcentaje_gasto[c]) if hay_ingresos[c] else None,
+            "gastos_por_categoria": gastos_por_categoria,
+            "recomendacion": str(niveles[c]),
+        }
+        if catalogos[c].tiene_jerarquia:
+            resumen["gastos_por_rama"] = gastos_por_rama(centavos_por_codigo, int(total_gastos[c]), catalogos[c])
+        resumenes.append(resumen)
+    return resumenes
+
+def calcular_resumen_numpy(libro_ingresos=None, libro_gastos=None):
+    """Igual que calcular_resumen() pero recorriendo las columnas con NumPy"""
+    libro_ingresos = lista_ingresos if libro_ingresos is None else libro_ingresos
+    libro_gastos = lista_gastos if libro_gastos is None else libro_gastos
+    return analizar_lote([(libro_ingresos, libro_gastos)])[0]
+
+def calcular_resumen_recorriendo(libro_ingresos, libro_gastos):
+    """
+    Calcula el resumen recorriendo todos los registros con bucles de Python
+    (como lo hacía el programa original). Sirve de referencia para las pruebas de rendimiento
+    """
+    def vivos(libro, columna):
+        # Sin lápidas recorremos la columna tal cual; con lápidas saltamos los eliminados
+        return compress(columna, libro._vivos) if libro._eliminados else columna
+
+    total_ingresos = sum(vivos(libro_ingresos, libro_ingresos._centavos))
+    partes = {}
+    for centavos, codigo in zip(vivos(libro_gastos, libro_gastos._centavos), vivos(libro_gastos, libro_gastos._categorias)):
+        parte = partes.get(codigo)
+        if parte is None:
+            partes[codigo] = [centavos]
+        else:
+            parte.append(centavos)
+    nombres = libro_gastos.categorias.nombres
+    totales_por_categoria = {nombres[codigo]: sum(partes[codigo]) for codigo in sorted(partes)}
+    total_gastos = sum(vivos(libro_gastos, libro_gastos._centavos))
+    return armar_resumen(len(libro_ingresos), len(libro_gastos), total_ingresos, total_gastos, totales_por_categoria,
+                         libro_gastos.categorias)
+
+def comparar_rendimiento(tamanos=(10**4, 10**5, 10**6, 10**7), cuentas_por_lote=1000):
+    """
+    Mide cuánto tarda el resumen con bucles de Python y con NumPy para libros de varios tamaños
+    (se puede pasar 10**8 si hay memoria suficiente, unos 2 GB)
+    También verifica que ambos caminos den exactamente los mismos números
+    """
+    import random
+    if cargar_numpy() is None:
+        print("❌ NumPy no está instalado, no hay nada que comparar")
+        return []
+    resultados = []
+    for tamano in tamanos:
+        ingresos = LibroColumnar("descripcion")
+        gastos = LibroColumnar("nombre", usa_categoria=True)
+        azar = random.Random(tamano)
+        ingresos.extender(["salario"] * max(1, tamano // 10),
+                          array("q", (round(azar.uniform(100, 5000) * 100) for _ in range(max(1, tamano // 10)))))
+        gastos.extender(["gasto"] * tamano,
+                        array("q", (round(azar.uniform(1, 500) * 100) for _ in range(tamano))),
+                        array("H", (azar.randrange(len(categorias_gastos)) for _ in range(tamano))))
+
+        inicio = time.perf_counter()
+        resumen_python = calcular_resumen_recorriendo(ingresos, gastos)
+        segundos_python = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resumen_numpy = calcular_resumen_numpy(ingresos, gastos)
+        segundos_numpy = time.perf_counter() - inicio
+
+        resultado = {
+            "filas": tamano,
+            "segundos_python": segundos_python,
+            "segundos_numpy": segundos_numpy,
+            "aceleracion": segundos_python / segundos_numpy if segundos_numpy > 0 else float("inf"),
+            "mismos_numeros": resumen_python == resumen_numpy == calcular_resumen(ingresos, gastos),
+        }
+        resultados.append(resultado)
+        print(f"{tamano:>12,} filas | Python {segundos_python:8.3f} s | NumPy {segundos_numpy:8.3f} s | "
+              f"x{resultado['aceleracion']:6.1f} | mismos números: {resultado['mismos_numeros']}")
+
+    # Lote de muchas cuentas pequeñas a la vez (por ejemplo 1000 usuarios)
+    cuentas = []
+    for numero in range(cuentas_por_lote):
+        ingresos = LibroColumnar("descripcion")
+        gastos = LibroColumnar("nombre", usa_categoria=True)
+        ingresos.append({"descripcion": "salario", "valor": 1000 + numero})
+        for j in range(20):
+            gastos.append({"nombre": "gasto", "valor": 10 + j + numero % 7,
+                           "categoria": categorias_gastos[j % len(categorias_gastos)]})
+        cuentas.append((ingresos, gastos))
+    inicio = time.perf_counter()
+    lote = analizar_lote(cuentas)
+    segundos = time.perf_counter() - inicio
+    iguales = all(resumen == calcular_resumen(*cuenta) for resumen, cuenta in zip(lote, cuentas))
+    print(f"Lote de {cuentas_por_lote} cuentas: {segundos:.3f} s | mismos números: {iguales}")
+    return resultados
 
 # =============================================================================
-# PASO 8: EJECUTAR EL PROGRAMA
+# PASO 10: SERVIDOR PARA MUCHOS USUARIOS (ASYNCIO)
 # =============================================================================
+# Un solo proceso atiende a miles de usuarios. Cada usuario tiene su propia
+# CuentaFinanciera. El protocolo es muy simple: el cliente manda una línea con
+# un objeto JSON y recibe una línea con la respuesta, por ejemplo:
+#   {"cuenta": "ana", "op": "registrar_gasto", "nombre": "bus", "valor": 2.5, "categoria": "transporte"}
+#   {"ok": true, "resultado": {"nombre": "bus", "valor": 2.5, "categoria": "transporte", "fecha": "2024-05-01", "id": 1}}
+# Las operaciones de escritura de una misma cuenta se hacen de a una (un candado
+# por cuenta); las lecturas como el resumen no esperan a nadie.
+
+def _id_registro(comando):
+    # Los comandos usan el mismo id que se ve en las listas
+    id_registro = comando.get("id")
+    if isinstance(id_registro, bool) or not isinstance(id_registro, int):
+        raise ValueError("El campo id debe ser un número entero")
+    return id_registro
+
+def _filtros_busqueda(comando):
+    return {"texto": comando.get("texto"), "prefijo": bool(comando.get("prefijo")),
+            "categoria": comando.get("categoria"),
+            "valor_min": comando.get("valor_min"), "valor_max": comando.get("valor_max")}
+
+def _fijar_presupuesto(cuenta, comando):
+    # Sin "limite" (o con null) se quita el presupuesto; devuelve cómo quedaron todos
+    cuenta.presupuestos.fijar(comando.get("categoria"), comando.get("limite"))
+    return cuenta.presupuestos.estado()
+
+# Cada operación recibe la cuenta y el comando (un diccionario) y devuelve el resultado
+OPERACIONES = {
+    "registrar_ingreso": lambda cuenta, comando: cuenta.registrar_ingreso(
+        comando.get("descripcion"), comando.get("valor"), comando.get("fecha")),
+    "registrar_gasto": lambda cuenta, comando: cuenta.registrar_gasto(
+        comando.get("nombre"), comando.get("valor"), comando.get("categoria"), comando.get("fecha")),
+    "modificar_ingreso": lambda cuenta, comando: cuenta.modificar_ingreso(
+        _id_registro(comando), descripcion=comando.get("descripcion"), valor=comando.get("valor"),
+        fecha=comando.get("fecha")),
+    "modificar_gasto": lambda cuenta, comando: cuenta.modificar_gasto(
+        _id_registro(comando), nombre=comando.get("nombre"), valor=comando.get("valor"),
+        categoria=comando.get("categoria"), fecha=comando.get("fecha")),
+    "eliminar_ingreso": lambda cuenta, comando: cuenta.eliminar_ingreso(_id_registro(comando)),
+    "eliminar_gasto": lambda cuenta, comando: cuenta.eliminar_gasto(_id_registro(comando)),
+    "eliminar_donde": lambda cuenta, comando: {
+        "eliminados": cuenta.eliminar_donde(comando.get("libro"), **_filtros_busqueda(comando))},
+    "resumen": lambda cuenta, comando: cuenta.resumen(comando.get("desde"), comando.get("hasta")),
+    "buscar": lambda cuenta, comando: cuenta.buscar(
+        comando.get("libro"), pagina=comando.get("pagina") or 1, tamano=comando.get("tamano") or TAMANO_PAGINA,
+        **_filtros_busqueda(comando)),
+    "fijar_presupuesto": _fijar_presupuesto,
+    "presupuestos": lambda cuenta, comando: cuenta.presupuestos.estado(comando.get("fecha")),
+    "resumen_categoria": lambda cuenta, comando: cuenta.resumen_categoria(
+        comando.get("categoria"), comando.get("desde"), comando.get("hasta")),
+    "agregar_categoria": lambda cuenta, comando: cuenta.agregar_categoria(
+        comando.get("nombre"), comando.get("padre")),
+    "categorias": lambda cuenta, comando: cuenta.lista_categorias(),
+}
+
+# Operaciones que solo leen los totales (no necesitan el candado de la cuenta)
+# buscar sí lo necesita: lee las columnas, que la compactación en segundo plano reemplaza
+OPERACIONES_LECTURA = {"resumen", "presupuestos", "resumen_categoria", "categorias"}
+
+def ejecutar_operacion(cuenta, comando):
+    """
+    Ejecuta un comando (diccionario con "op" y sus datos) sobre una cuenta
+    Si el comando no es válido lanza ValueError con el motivo
+    """
+    operacion = comando.get("op")
+    if not isinstance(operacion, str) or operacion not in OPERACIONES:
+        raise ValueError(f"Operación desconocida: {operacion!r}")
+    return OPERACIONES[operacion](cuenta, comando)
+
+
+class ServidorCalculadora:
+    """
+    Guarda una CuentaFinanciera por usuario y atiende las conexiones de los clientes
+    Si se le da un directorio, cada cuenta se guarda en disco en su propia carpeta
+    """
+
+    def __init__(self, directorio=None, segundos_sincronizacion=0.2):
+        self.directorio = directorio
+        self.segundos_sincronizacion = segundos_sincronizacion
+        self.cuentas = {}     # nombre -> CuentaFinanciera
+        self.almacenes = {}   # nombre -> AlmacenPersistente
+        self.candados = {}    # nombre -> asyncio.Lock
+        self.peticiones_atendidas = 0
+
+    async def obtener_cuenta(self, nombre):
+        """Devuelve (cuenta, candado) del usuario, creándolos la primera vez"""
+        import asyncio
+        import re
+        candado = self.candados.get(nombre)
+        if candado is None:
+            # El nombre se usa como carpeta, así que solo aceptamos letras, números, - y _
+            if not isinstance(nombre, str) or not re.fullmatch(r"[A-Za-z0-9_-]{1,64}", nombre):
+                raise ValueError("El campo cuenta debe tener solo letras, números, - o _")
+            candado = self.candados.setdefault(nombre, asyncio.Lock())
+        cuenta = self.cuentas.get(nombre)
+        if cuenta is None:
+            async with candado:
+                cuenta = self.cuentas.get(nombre)
+                if cuenta is None:
+                    cuenta = CuentaFinanciera()
+                    if self.directorio:
+                        # Las líneas del diario se pasan a disco en sincronizar_periodicamente(),
+                        # no en medio de una petición (para no frenar al resto de usuarios)
+                        almacen = AlmacenPersistente(os.path.join(self.directorio, nombre), cuenta.libros(),
+                                                     lote_fsync=math.inf, segundos_fsync=math.inf)
+                        await asyncio.get_running_loop().run_in_executor(None, almacen.abrir)
+                        self.almacenes[nombre] = almacen
+                    self.cuentas[nombre] = cuenta
+        return cuenta, candado
+
+    async def procesar(self, peticion):
+        """Atiende una petición (diccionario) y devuelve la respuesta (diccionario)"""
+        try:
+            if not isinstance(peticion, dict):
+                raise ValueError("La petición debe ser un objeto JSON")
+            cuenta, candado = await self.obtener_cuenta(peticion.get("cuenta"))
+            operacion = peticion.get("op")
+            if isinstance(operacion, str) and operacion in OPERACIONES_LECTURA:
+                resultado = ejecutar_operacion(cuenta, peticion)
+            else:
+                async with candado:
+                    resultado = ejecutar_operacion(cuenta, peticion)
+        except ValueError as error:
+            return {"ok": False, "error": str(error)}
+        except Exception as error:
+            # Un error que no es del cliente sino del programa: se anota completo en la consola
+            # del servidor y el cliente recibe su respuesta de error sin perder la conexión
+            import traceback
+            operacion = peticion.get("op") if isinstance(peticion, dict) else None
+            print(f"❌ Error inesperado en la operación {operacion!r}:", file=sys.stderr)
+            traceback.print_exc()
+            return {"ok": False, "error": f"Error interno: {type(error).__name__}: {error}"}
+        finally:
+            self.peticiones_atendidas += 1
+        return {"ok": True, "resultado": resultado}
+
+    async def atender(self, lector, escritor):
+        """Atiende a un cliente conectado hasta que cierre la conexión"""
+        import json
+        try:
+            while True:
+                linea = await lector.readline()
+                if not linea:
+                    break
+                try:
+                    peticion = json.loads(linea)
+                except ValueError:
+                    respuesta = {"ok": False, "error": "La línea no es JSON válido"}
+                else:
+                    respuesta = await self.procesar(peticion)
+                escritor.write(json.dumps(respuesta, ensure_ascii=False).encode("utf-8") + b"\n")
+                await escritor.drain()
+        except ConnectionError:
+            pass
+        finally:
+            escritor.close()
+
+    @staticmethod
+    def _mantener(cuenta, almacen):
+        cuenta.compactar_si_conviene()
+        if almacen is not None:
+            almacen.sincronizar()
+
+    async def sincronizar_periodicamente(self):
+        """
+        Cada poco tiempo saca las lápidas de los libros y pasa a disco los diarios
+        (y compacta) sin bloquear al servidor
+        """
+        import asyncio
+        bucle = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.segundos_sincronizacion)
+            for nombre, cuenta in list(self.cuentas.items()):
+                almacen = self.almacenes.get(nombre)
+                if almacen is None and not any(libro._eliminados for libro in cuenta.libros().values()):
+                    continue
+                # Con el candado tomado nadie modifica esta cuenta mientras se trabaja,
+                # pero las demás cuentas siguen funcionando
+                async with self.candados[nombre]:
+                    await bucle.run_in_executor(None, self._mantener, cuenta, almacen)
+
+    def cerrar(self):
+        for almacen in self.almacenes.values():
+            almacen.cerrar()
+
+    async def servir(self, host="127.0.0.1", puerto=8765, al_iniciar=None):
+        import asyncio
+        servidor = await asyncio.start_server(self.atender, host, puerto)
+        tarea_fondo = asyncio.create_task(self.sincronizar_periodicamente())
+        if al_iniciar is not None:
+            al_iniciar(servidor.sockets[0].getsockname())
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            tarea_fondo.cancel()
+            self.cerrar()
+
+def iniciar_servidor(host="127.0.0.1", puerto=8765, directorio=None):
+    """Arranca el servidor y lo deja funcionando hasta que se presione Ctrl+C"""
+    import asyncio
+    servidor = ServidorCalculadora(directorio)
+    try:
+        asyncio.run(servidor.servir(host, puerto, al_iniciar=lambda direccion:
+                                    print(f"🖥️  Servidor escuchando en {direccion[0]}:{direccion[1]}")))
+    except KeyboardInterrupt:
+        print("\n👋 Servidor detenido")
+
+def _percentil(datos_ordenados, porcentaje):
+    if not datos_ordenados:
+        return 0.0
+    posicion = min(len(datos_ordenados) - 1, int(len(datos_ordenados) * porcentaje / 100))
+    return datos_ordenados[posicion]
+
+async def _cliente_de_carga(host, puerto, peticiones, cuentas, latencias, errores, semilla):
+    import asyncio
+    import json
+    import random
+    azar = random.Random(semilla)
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        for _ in range(peticiones):
+            cuenta = f"usuario{azar.randrange(cuentas)}"
+            sorteo = azar.random()
+            if sorteo < 0.6:
+                peticion = {"cuenta": cuenta, "op": "registrar_gasto", "nombre": "gasto de prueba",
+                            "valor": round(azar.uniform(1, 500), 2), "categoria": azar.choice(CATEGORIAS_INICIALES)}
+            elif sorteo < 0.7:
+                peticion = {"cuenta": cuenta, "op": "registrar_ingreso", "descripcion": "salario",
+                            "valor": round(azar.uniform(500, 5000), 2)}
+            else:
+                peticion = {"cuenta": cuenta, "op": "resumen"}
+            inicio = time.perf_counter()
+            escritor.write(json.dumps(peticion).encode("utf-8") + b"\n")
+            await escritor.drain()
+            respuesta = json.loads(await lector.readline())
+            latencias.append(time.perf_counter() - inicio)
+            if not respuesta.get("ok"):
+                errores.append(respuesta.get("error"))
+    finally:
+        escritor.close()
+
+async def _carga(host, puerto, clientes, peticiones, cuentas, local):
+    import asyncio
+    servidor_local = None
+    if local:  # Arrancamos un servidor en este mismo proceso en un puerto libre
+        listo = asyncio.get_running_loop().create_future()
+        servidor_local = asyncio.create_task(ServidorCalculadora().servir(
+            host, 0, al_iniciar=lambda direccion: listo.set_result(direccion[1])))
+        puerto = await listo
+
+    latencias = []
+    errores = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_cliente_de_carga(host, puerto, peticiones, cuentas, latencias, errores, semilla)
+                           for semilla in range(clientes)))
+    segundos = time.perf_counter() - inicio
+    if servidor_local is not None:
+        servidor_local.cancel()
+
+    latencias.sort()
+    return {
+        "peticiones": len(latencias),
+        "errores": len(errores),
+        "segundos": segundos,
+        "peticiones_por_segundo": len(latencias) / segundos if segundos > 0 else 0.0,
+        "p50_ms": _percentil(latencias, 50) * 1000,
+        "p99_ms": _percentil(latencias, 99) * 1000,
+    }
+
+def generar_carga(host="127.0.0.1", puerto=8765, clientes=50, peticiones=200, cuentas=1000, local=False):
+    """
+    Generador de carga: abre varios clientes a la vez contra el servidor y mide la latencia
+    Con local=True levanta su propio servidor en memoria para la prueba
+    """
+    import asyncio
+    reporte = asyncio.run(_carga(host, puerto, clientes, peticiones, cuentas, local))
+    print(f"📨 Peticiones: {reporte['peticiones']:,} ({reporte['errores']} con error) en {reporte['segundos']:.2f} s")
+    print(f"⚡ {reporte['peticiones_por_segundo']:,.0f} peticiones/s | p50 {reporte['p50_ms']:.2f} ms | p99 {reporte['p99_ms']:.2f} ms")
+    return reporte
+
+# =============================================================================
+# PASO 11: INSTRUMENTACIÓN (MEDIR DÓNDE SE VA EL TIEMPO)
+# =============================================================================
+# Para saber qué operaciones son lentas podemos encender la instrumentación.
+# Viene apagada: así el programa no paga nada. Al encenderla se "envuelven" las
+# funciones de la lista FUNCIONES_MEDIDAS (y los métodos de METODOS_MEDIDOS)
+# con una versión que mide cuánto tardan; al apagarla se dejan las originales.
+# Se enciende con --metricas CARPETA o con la variable CALCULADORA_METRICAS.
+# Al terminar se escriben en la carpeta:
+# - metricas.prom: histogramas y contadores en el formato de texto de Prometheus
+# - perfil.folded: pilas "plegadas" (una por línea) para dibujar un flamegraph
+#   con flamegraph.pl o speedscope (solo si se pidió el perfil)
+
+# Funciones del programa que se miden (se buscan por nombre en este archivo)
+FUNCIONES_MEDIDAS = (
+    "registrar_ingresos", "registrar_gastos", "mostrar_resumen", "calcular_resumen",
+    "modificar_ingresos", "modificar_gastos", "eliminar_ingresos", "eliminar_gastos",
+    "eliminar_varios_gastos", "pedir_numero_positivo", "pedir_opcion_menu", "pedir_fecha",
+    "importar_archivo", "analizar_lote", "ejecutar_operacion",
+)
+
+# Métodos que se miden: clase -> nombres de sus métodos
+METODOS_MEDIDOS = {
+    "CuentaFinanciera": ("registrar_ingreso", "registrar_gasto", "modificar_ingreso", "modificar_gasto",
+                         "eliminar_ingreso", "eliminar_gasto", "eliminar_donde", "buscar", "resumen",
+                         "resumen_categoria"),
+    "LibroColumnar": ("extender", "buscar", "eliminar_varios", "eliminar_donde", "compactar"),
+    "AlmacenPersistente": ("abrir", "sincronizar", "compactar"),
+}
+
+# Cuántos registros recorre cada operación de lectura, sacado de lo que devuelve
+REGISTROS_LEIDOS = {
+    "calcular_resumen": lambda resumen: resumen["cantidad_ingresos"] + resumen["cantidad_gastos"],
+    "LibroColumnar.buscar": len,
+}
+
+# Cuántos registros toca cada aviso de un libro (ver LibroColumnar._notificar)
+REGISTROS_POR_AVISO = {
+    "agregar": lambda datos: 1,
+    "modificar": lambda datos: 1,
+    "eliminar": lambda datos: 1,
+    "eliminar_varios": lambda datos: len(datos[0]),
+    "extender": lambda datos: datos[0],
+    "compactar": lambda datos: 0,
+}
+
+
+class Histograma:
+    """Cuenta cuántas mediciones caen en cada rango de segundos (como un histograma de Prometheus)"""
+    LIMITES = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+    __slots__ = ("cuentas", "suma", "cantidad")
+
+    def __init__(self):
+        self.cuentas = [0] * (len(self.LIMITES) + 1)  # La última casilla es "más de 60 s"
+        self.suma = 0.0
+        self.cantidad = 0
+
+    def observar(self, segundos):
+        self.cuentas[bisect_left(self.LIMITES, segundos)] += 1
+        self.suma += segundos
+        self.cantidad += 1
+
+
+class Instrumentacion:
+    """
+    Mide las operaciones del programa mientras está activa:
+    - latencias: operación -> Histograma con sus tiempos
+    - errores: operación -> cuántas veces terminó con una excepción
+    - registros_procesados: (libro, aviso) -> registros agregados, modificados o eliminados
+    - registros_leidos: operación -> registros que recorrió (resumen, búsquedas)
+    - memoria_neta: operación -> bytes que quedaron ocupados después (con tracemalloc)
+    - muestras: pila de llamadas -> veces que se vio en el muestreo (para el flamegraph)
+    Los contadores no usan candado: si dos hilos miden a la vez se puede perder
+    alguna cuenta, lo que para estas métricas no importa
+    """
+
+    def __init__(self, memoria=False, perfil=False, intervalo_perfil=0.005):
+        self.memoria = memoria
+        self.perfil = perfil
+        self.intervalo_perfil = intervalo_perfil
+        self.latencias = {}
+        self.errores = {}
+        self.registros_procesados = {}
+        self.registros_leidos = {}
+        self.memoria_neta = {}
+        self.muestras = {}
+        self._originales = []  # (dónde, nombre, original) para poder desactivar
+        self._detener = None
+        self._hilo_perfil = None
+        self.memoria_pico = 0
+        self._codigo_medida = None
+        self.activa = False
+
+    # ---------------------------------------------------------------- medir
+    def medir(self, nombre, funcion):
+        """Devuelve una versión de la función que anota su tiempo bajo ese nombre"""
+        import functools
+        import tracemalloc
+        histograma = self.latencias.setdefault(nombre, Histograma())
+        contar_leidos = REGISTROS_LEIDOS.get(nombre)
+        reloj = time.perf_counter
+        con_memoria = self.memoria
+
+        @functools.wraps(funcion)
+        def medida(*argumentos, **opciones):
+            if con_memoria:
+                memoria_antes = tracemalloc.get_traced_memory()[0]
+            inicio = reloj()
+            try:
+                resultado = funcion(*argumentos, **opciones)
+            except BaseException:
+                self.errores[nombre] = self.errores.get(nombre, 0) + 1
+                raise
+            finally:
+                histograma.observar(reloj() - inicio)
+                if con_memoria:
+                    self.memoria_neta[nombre] = (self.memoria_neta.get(nombre, 0)
+                                                 + tracemalloc.get_traced_memory()[0] - memoria_antes)
+            if contar_leidos is not None:
+                self.registros_leidos[nombre] = self.registros_leidos.get(nombre, 0) + contar_leidos(resultado)
+            return resultado
+
+        self._codigo_medida = medida.__code__  # Para no mostrar la envoltura en el perfil
+        return medida
+
+    def _reemplazar(self, donde, nombre, nuevo):
+        if isinstance(donde, dict):
+            self._originales.append((donde, nombre, donde[nombre]))
+            donde[nombre] = nuevo
+        else:
+            self._originales.append((donde, nombre, donde.__dict__[nombre]))
+            setattr(donde, nombre, nuevo)
+
+    def _notificar_contando(self):
+        # Envuelve LibroColumnar._notificar para contar los registros de cada cambio
+        original = LibroColumnar._notificar
+        procesados = self.registros_procesados
+
+        def notificar(libro, operacion, *datos):
+            clave = ("gastos" if libro.usa_categoria else "ingresos", operacion)
+            procesados[clave] = procesados.get(clave, 0) + REGISTROS_POR_AVISO[operacion](datos)
+            original(libro, operacion, *datos)
+
+        return notificar
+
+    # ---------------------------------------------------------------- encender / apagar
+    def activar(self):
+        """Envuelve las funciones y métodos medidos y arranca tracemalloc y el muestreo si se pidieron"""
+        import tracemalloc
+        if self.activa:
+            return self
+        modulo = globals()
+        for nombre in FUNCIONES_MEDIDAS:
+            self._reemplazar(modulo, nombre, self.medir(nombre, modulo[nombre]))
+        for nombre_clase, metodos in METODOS_MEDIDOS.items():
+            clase = modulo[nombre_clase]
+            for metodo in metodos:
+                self._reemplazar(clase, metodo, self.medir(f"{nombre_clase}.{metodo}", clase.__dict__[metodo]))
+        self._reemplazar(LibroColumnar, "_notificar", self._notificar_contando())
+        if self.memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.perfil:
+            self._iniciar_muestreo()
+        self.activa = True
+        return self
+
+    def desactivar(self):
+        """Deja otra vez las funciones originales (las métricas tomadas se conservan)"""
+        import tracemalloc
+        if not self.activa:
+            return
+        for donde, nombre, original in reversed(self._originales):
+            if isinstance(donde, dict):
+                donde[nombre] = original
+            else:
+                setattr(donde, nombre, original)
+        self._originales = []
+        if self._hilo_perfil is not None:
+            self._detener.set()
+            self._hilo_perfil.join()
+            self._hilo_perfil = None
+        if self.memoria and tracemalloc.is_tracing():
+            self.memoria_pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.activa = False
+
+    # ---------------------------------------------------------------- perfil por muestreo
+    def _iniciar_muestreo(self):
+        import threading
+        self._detener = threading.Event()
+        self._hilo_perfil = threading.Thread(target=self._muestrear, name="perfil", daemon=True)
+        self._hilo_perfil.start()
+
+    def _muestrear(self):
+        # Cada pocos milisegundos anotamos qué estaba ejecutando cada hilo
+        import threading
+        propio = threading.get_ident()
+        while not self._detener.wait(self.intervalo_perfil):
+            nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                pila = []
+                while marco is not None:
+                    codigo = marco.f_code
+                    marco = marco.f_back
+                    if codigo is self._codigo_medida:
+                        continue
+                    pila.append(f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})")
+                pila.append(nombres.get(ident, "hilo"))
+                clave = ";".join(reversed(pila))
+                self.muestras[clave] = self.muestras.get(clave, 0) + 1
+
+    # ---------------------------------------------------------------- reportes
+    def texto_prometheus(self):
+        """Todas las métricas en el formato de texto de Prometheus"""
+        lineas = ["# HELP calculadora_operacion_segundos Tiempo de cada operación",
+                  "# TYPE calculadora_operacion_segundos histogram"]
+        for nombre, histograma in sorted(self.latencias.items()):
+            if not histograma.cantidad:
+                continue
+            acumulado = 0
+            for limite, cuenta in zip(Histograma.LIMITES + (math.inf,), histograma.cuentas):
+                acumulado += cuenta
+                le = "+Inf" if limite == math.inf else repr(limite)
+                lineas.append(f'calculadora_operacion_segundos_bucket{{operacion="{nombre}",le="{le}"}} {acumulado}')
+            lineas.append(f'calculadora_operacion_segundos_sum{{operacion="{nombre}"}} {histograma.suma!r}')
+            lineas.append(f'calculadora_operacion_segundos_count{{operacion="{nombre}"}} {histograma.cantidad}')
+
+        lineas += ["# HELP calculadora_operacion_errores_total Operaciones que terminaron con una excepción",
+                   "# TYPE calculadora_operacion_errores_total counter"]
+        lineas += [f'calculadora_operacion_errores_total{{operacion="{nombre}"}} {cantidad}'
+                   for nombre, cantidad in sorted(self.errores.items())]
+
+        lineas += ["# HELP calculadora_registros_procesados_total Registros agregados, modificados o eliminados",
+                   "# TYPE calculadora_registros_procesados_total counter"]
+        lineas += [f'calculadora_registros_procesados_total{{libro="{libro}",operacion="{operacion}"}} {cantidad}'
+                   for (libro, operacion), cantidad in sorted(self.registros_procesados.items())]
+
+        lineas += ["# HELP calculadora_registros_leidos_total Registros que recorrió cada lectura",
+                   "# TYPE calculadora_registros_leidos_total counter"]
+        lineas += [f'calculadora_registros_leidos_total{{operacion="{nombre}"}} {cantidad}'
+                   for nombre, cantidad in sorted(self.registros_leidos.items())]
+
+        if self.memoria:
+            import tracemalloc
+            lineas += ["# HELP calculadora_memoria_neta_bytes Bytes que cada operación dejó ocupados (tracemalloc)",
+                       "# TYPE calculadora_memoria_neta_bytes gauge"]
+            lineas += [f'calculadora_memoria_neta_bytes{{operacion="{nombre}"}} {cantidad}'
+                       for nombre, cantidad in sorted(self.memoria_neta.items())]
+            pico = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else self.memoria_pico
+            lineas += ["# HELP calculadora_memoria_pico_bytes Máximo de memoria medida por tracemalloc",
+                       "# TYPE calculadora_memoria_pico_bytes gauge",
+                       f"calculadora_memoria_pico_bytes {pico}"]
+        return "\n".join(lineas) + "\n"
+
+    def pilas_plegadas(self):
+        """Las muestras del perfil en formato "plegado": "a;b;c cantidad" por línea"""
+        return "".join(f"{pila} {cantidad}\n" for pila, cantidad in sorted(self.muestras.items()))
+
+    def guardar(self, carpeta):
+        """Escribe metricas.prom (y perfil.folded si hay perfil) en la carpeta; devuelve las rutas"""
+        os.makedirs(carpeta, exist_ok=True)
+        rutas = [os.path.join(carpeta, "metricas.prom")]
+        with open(rutas[0], "w", encoding="utf-8") as archivo:
+            archivo.write(self.texto_prometheus())
+        if self.perfil:
+            rutas.append(os.path.join(carpeta, "perfil.folded"))
+            with open(rutas[1], "w", encoding="utf-8") as archivo:
+                archivo.write(self.pilas_plegadas())
+        return rutas
+
+
+instrumentacion = None  # La instrumentación activa (None = apagada, que es lo normal)
+
+def activar_instrumentacion(memoria=False, perfil=False):
+    """Enciende la instrumentación y la devuelve (si ya estaba encendida devuelve la misma)"""
+    global instrumentacion
+    if instrumentacion is None:
+        instrumentacion = Instrumentacion(memoria=memoria, perfil=perfil).activar()
+    return instrumentacion
+
+def desactivar_instrumentacion():
+    """Apaga la instrumentación y devuelve la que estaba activa (con sus métricas)"""
+    global instrumentacion
+    activa, instrumentacion = instrumentacion, None
+    if activa is not None:
+        activa.desactivar()
+    return activa
+
+# =============================================================================
+# PASO 12: PRUEBAS DE RENDIMIENTO (BENCHMARK)
+# =============================================================================
+# Para saber si un cambio hace el programa más rápido o más lento medimos
+# siempre lo mismo: se arman libros de prueba de 10^3 a 10^7 registros (siempre
+# con los mismos datos, gracias a una semilla fija) y se toma el tiempo de las
+# operaciones principales. Las funciones de los menús se usan tal cual: las
+# respuestas se le "escriben" a input() desde una lista y lo que se imprime se
+# descarta. El resultado se guarda en JSON y se compara con una medición base.
+
+TAMANOS_BENCHMARK = (10**3, 10**4, 10**5, 10**6, 10**7)
+
+
+class SesionSimulada:
+    """
+    Usa los menús sin teclado ni pantalla:
+        with SesionSimulada(cuenta, ["1", "SI"]):
+            eliminar_gastos()
+    Mientras dura, input() devuelve las respuestas de la lista en orden, print() no
+    muestra nada y los menús trabajan sobre la cuenta dada (sin guardar en disco)
+    """
+
+    def __init__(self, cuenta, respuestas=()):
+        self.cuenta = cuenta
+        self.respuestas = iter(respuestas)
+
+    def _responder(self, mensaje=""):
+        try:
+            return next(self.respuestas)
+        except StopIteration:
+            raise RuntimeError(f"Faltó una respuesta para: {mensaje!r}") from None
+
+    def __enter__(self):
+        import builtins
+        global cuenta_actual, lista_ingresos, lista_gastos, almacen
+        self._antes = (builtins.input, sys.stdout, cuenta_actual, almacen)
+        builtins.input = self._responder
+        sys.stdout = open(os.devnull, "w", encoding="utf-8")
+        cuenta_actual, almacen = self.cuenta, None
+        lista_ingresos, lista_gastos = self.cuenta.ingresos, self.cuenta.gastos
+        return self
+
+    def __exit__(self, *error):
+        import builtins
+        global cuenta_actual, lista_ingresos, lista_gastos, almacen
+        sys.stdout.close()
+        builtins.input, sys.stdout, cuenta_actual, almacen = self._antes
+        lista_ingresos, lista_gastos = cuenta_actual.ingresos, cuenta_actual.gastos
+        return False
+
+
+def datos_sinteticos(tamano, semilla=2024):
+    """
+    Columnas de prueba: tamano gastos (repartidos en las seis categorías y en el último
+    año) y tamano // 10 ingresos. Con la misma semilla salen siempre los mismos datos
+    Devuelve {"ingresos": (textos, centavos, None, fechas), "gastos": (textos, centavos, codigos, fechas)}
+    """
+    import random
+    azar = random.Random(semilla)
+    hoy = date.today().toordinal()
+    nombres = ["supermercado", "bus", "cine", "farmacia", "universidad", "luz", "taxi", "restaurante"]
+    cantidad_ingresos = max(1, tamano // 10)
+    return {
+        "ingresos": (["salario"] * cantidad_ingresos,
+                     array("q", (round(azar.uniform(500, 5000) * 100) for _ in range(cantidad_ingresos))),
+                     None,
+                     array("i", (hoy - azar.randrange(365) for _ in range(cantidad_ingresos)))),
+        "gastos": ([azar.choice(nombres) for _ in range(tamano)],
+                   array("q", (round(azar.uniform(1, 500) * 100) for _ in range(tamano))),
+                   array("H", (azar.randrange(len(CATEGORIAS_INICIALES)) for _ in range(tamano))),
+                   array("i", (hoy - azar.randrange(365) for _ in range(tamano)))),
+    }
+
+def cuenta_sintetica(tamano=None, semilla=2024, datos=None):
+    """Arma una cuenta de prueba con los datos de datos_sinteticos()"""
+    if datos is None:
+        datos = datos_sinteticos(tamano, semilla)
+    cuenta = CuentaFinanciera()
+    for nombre, libro in cuenta.libros().items():
+        libro.extender(*datos[nombre])
+    return cuenta
+
+
+def _medir(funcion, repeticiones):
+    # Devuelve los tiempos (en segundos) de cada repetición
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def medir_tamano(tamano, repeticiones=20, semilla=2024):
+    """
+    Mide las operaciones principales sobre una cuenta de tamano gastos
+    Devuelve una lista de resultados {"tamano", "operacion", "repeticiones", "mediana_s", "minimo_s"}
+    """
+    import random
+    import statistics
+    azar = random.Random(semilla)
+    resultados = []
+
+    def anotar(operacion, tiempos, registros=1):
+        resultados.append({
+            "tamano": tamano,
+            "operacion": operacion,
+            "repeticiones": len(tiempos),
+            "mediana_s": statistics.median(tiempos) / registros,
+            "minimo_s": min(tiempos) / registros,
+        })
+
+    # Registro masivo: cargar el libro completo por bloques (los datos se arman antes, sin medir)
+    datos = datos_sinteticos(tamano, semilla)
+    inicio = time.perf_counter()
+    cuenta = cuenta_sintetica(datos=datos)
+    anotar("registro_masivo", [time.perf_counter() - inicio])
+    del datos
+
+    # Registro desde el menú, de a 10 gastos por vez (tiempo por gasto)
+    def registrar_diez():
+        respuestas = ["10"]
+        for _ in range(10):
+            respuestas += ["gasto de prueba", f"{azar.uniform(1, 500):.2f}",
+                           str(azar.randrange(len(CATEGORIAS_INICIALES)) + 1), ""]
+        with SesionSimulada(cuenta, respuestas):
+            registrar_gastos()
+    anotar("registrar_menu", _medir(registrar_diez, repeticiones), registros=10)
+
+    # Registro con presupuesto en todas las categorías: cada gasto revisa sus umbrales (tiempo por gasto)
+    presupuestos = cuenta.presupuestos
+    destino = presupuestos.agregar_destino([].append)
+    for categoria in CATEGORIAS_INICIALES:
+        presupuestos.fijar(categoria, azar.uniform(1000, 100000))
+
+    def registrar_cien():
+        for _ in range(100):
+            cuenta.registrar_gasto("gasto de prueba", f"{azar.uniform(1, 500):.2f}",
+                                   azar.randrange(len(CATEGORIAS_INICIALES)) + 1)
+    anotar("registrar_presupuesto", _medir(registrar_cien, repeticiones), registros=100)
+    presupuestos.quitar_destino(destino)
+    for categoria in CATEGORIAS_INICIALES:
+        presupuestos.quitar(categoria)
+
+    # Resumen completo, tal como lo muestra el menú
+    def resumen():
+        with SesionSimulada(cuenta):
+            mostrar_resumen()
+    anotar("resumen", _medir(resumen, repeticiones))
+
+    # Gastos por categoría de los últimos 30 días
+    desde, hasta = periodo_ultimos_dias(30)
+    anotar("desglose_categorias", _medir(
+        lambda: calcular_resumen(cuenta.ingresos, cuenta.gastos, desde, hasta)["gastos_por_categoria"],
+        repeticiones))
+
+    # El mismo resumen del periodo pedido una y otra vez sin cambios entremedio (sale de la caché)
+    anotar("resumen_repetido", _medir(lambda: cuenta.resumen(desde, hasta), repeticiones))
+
+    # Modificar y eliminar un registro elegido al azar, usando los menús
+    def elegir_id():
+        while True:
+            id_registro = azar.randrange(1, cuenta.gastos.siguiente_id)
+            if cuenta.gastos.existe(id_registro):
+                return str(id_registro)
+
+    def modificar():
+        with SesionSimulada(cuenta, [elegir_id(), "", f"{azar.uniform(1, 500):.2f}", "no", ""]):
+            modificar_gastos()
+    anotar("modificar", _medir(modificar, repeticiones))
+
+    def eliminar():
+        with SesionSimulada(cuenta, [elegir_id(), "SI"]):
+            eliminar_gastos()
+    anotar("eliminar", _medir(eliminar, repeticiones))
+
+    # Resumen sumando todas las filas en varios procesos (con las lápidas que dejó eliminar)
+    with ResumenParalelo() as paralelo:
+        anotar("resumen_paralelo", _medir(lambda: paralelo.resumen(cuenta.ingresos, cuenta.gastos), repeticiones))
+
+    # Listado completo en texto hacia un archivo (tiempo por registro)
+    def listar_gastos():
+        with open(os.devnull, "w", encoding="utf-8") as nulo, SalidaBuffer(nulo) as salida:
+            escribir_listado(cuenta.gastos, salida)
+    anotar("listado_texto", _medir(listar_gastos, 1), registros=len(cuenta.gastos))
+
+    # La primera búsqueda arma el índice; después se elimina por filtro y se compacta
+    anotar("indice_busqueda", _medir(
+        lambda: cuenta.gastos.buscar(categoria="entretenimiento", valor_max=5.0), 1))
+    anotar("eliminar_lote", _medir(
+        lambda: cuenta.eliminar_donde("gastos", categoria="entretenimiento", valor_max=5.0), 1))
+    anotar("compactar", _medir(cuenta.gastos.compactar, 1))
+    return resultados
+
+
+def comparar_con_base(resultados, base, tolerancia=0.25):
+    """
+    Compara cada operación con la misma operación y tamaño de la medición base
+    Una operación es "regresion" si su mediana creció más que la tolerancia (0.25 = 25 %)
+    """
+    anteriores = {(dato["tamano"], dato["operacion"]): dato for dato in base["resultados"]}
+    comparacion = []
+    for dato in resultados:
+        anterior = anteriores.get((dato["tamano"], dato["operacion"]))
+        if anterior is None or anterior["mediana_s"] <= 0:
+            continue
+        cambio = dato["mediana_s"] / anterior["mediana_s"]
+        if cambio > 1 + tolerancia:
+            estado = "regresion"
+        elif cambio < 1 / (1 + tolerancia):
+            estado = "mejora"
+        else:
+            estado = "igual"
+        comparacion.append({"tamano": dato["tamano"], "operacion": dato["operacion"],
+                            "base_s": anterior["mediana_s"], "actual_s": dato["mediana_s"],
+                            "cambio": cambio, "estado": estado})
+    return comparacion
+
+
+def ejecutar_benchmark(tamanos=TAMANOS_BENCHMARK, repeticiones=20, salida="benchmark.json",
+                       ruta_base=None, tolerancia=0.25, semilla=2024):
+    """
+    Mide todos los tamaños, guarda el reporte en JSON y, si hay medición base, la compara
+    Si ruta_base no existe todavía, esta medición se guarda como base
+    Devuelve el reporte (con la lista "regresiones" vacía si todo anduvo bien)
+    """
+    import json
+    import platform
+    reporte = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "semilla": semilla,
+        "resultados": [],
+    }
+    for tamano in tamanos:
+        reporte["resultados"] += medir_tamano(tamano, repeticiones, semilla)
+        for dato in reporte["resultados"]:
+            if dato["tamano"] == tamano:
+                print(f"{tamano:>12,} | {dato['operacion']:<20} | mediana {dato['mediana_s'] * 1000:10.3f} ms")
+
+    if ruta_base and os.path.exists(ruta_base):
+        with open(ruta_base, encoding="utf-8") as archivo:
+            reporte["comparacion"] = comparar_con_base(reporte["resultados"], json.load(archivo), tolerancia)
+        reporte["regresiones"] = [dato for dato in reporte["comparacion"] if dato["estado"] == "regresion"]
+        for dato in reporte["comparacion"]:
+            if dato["estado"] != "igual":
+                print(f"{'⚠️ ' if dato['estado'] == 'regresion' else '🚀'} {dato['operacion']} con "
+                      f"{dato['tamano']:,}: x{dato['cambio']:.2f} ({dato['estado']})")
+    else:
+        reporte["regresiones"] = []
+        if ruta_base:
+            with open(ruta_base, "w", encoding="utf-8") as archivo:
+                json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+            print(f"📌 No había medición base: se guardó esta en {ruta_base}")
+
+    with open(salida, "w", encoding="utf-8") as archivo:
+        json.dump(reporte, archivo, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados guardados en {salida} ({len(reporte['regresiones'])} regresiones)")
+    return reporte
+
+# =============================================================================
+# PASO 13: RESUMEN EN PARALELO (VARIOS PROCESOS)
+# =============================================================================
+# Con cientos de millones de registros, sumar todas las filas en un solo hilo de
+# Python se queda corto. Aquí el libro se reparte entre varios procesos:
+# 1. Las columnas (centavos, categorías, vivos y fechas) se copian UNA vez a
+#    bloques de memoria compartida (multiprocessing.shared_memory).
+# 2. Cada proceso recibe solo los nombres de los bloques y qué filas le tocan
+#    (no se copian ni se envían registros), y suma esas filas por categoría.
+# 3. Las sumas parciales se juntan y se arma el mismo resumen de siempre.
+# Los montos ya están en centavos (números enteros), así el orden en que se
+# juntan las partes no cambia el resultado: sale idéntico a calcular_resumen().
+
+PORCIONES_POR_PROCESO = 4  # Más porciones que procesos para que ninguno quede esperando
+
+
+def _abrir_bloque(nombre):
+    """Abre (sin crearlo) un bloque de memoria compartida que armó el proceso principal"""
+    from multiprocessing import shared_memory
+    try:
+        # Desde Python 3.13: el proceso que solo lee no anota el bloque como suyo
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=nombre)
+
+
+def _sumar_porcion(tarea):
+    """
+    Lo que hace cada proceso: suma las filas inicio..fin de un libro por categoría
+    Lee las columnas directamente de la memoria compartida y devuelve tres listas del
+    mismo largo, solo con las categorías que aparecen en la porción (con miles de
+    categorías casi todas quedan en cero): (códigos, centavos, cantidad de registros)
+    """
+    nombres, inicio, fin, cantidad_codigos, dia_desde, dia_hasta = tarea
+    bloques = {columna: _abrir_bloque(nombre) for columna, nombre in nombres.items()}
+    try:
+        np = cargar_numpy()
+        if np is not None:
+            return _sumar_porcion_numpy(np, bloques, inicio, fin, cantidad_codigos, dia_desde, dia_hasta)
+        return _sumar_porcion_python(bloques, inicio, fin, cantidad_codigos, dia_desde, dia_hasta)
+    finally:
+        for bloque in bloques.values():
+            bloque.close()
+
+
+def _sumar_porcion_numpy(np, bloques, inicio, fin, cantidad_codigos, dia_desde, dia_hasta):
+    """_sumar_porcion() con NumPy: las columnas se miran sin copiarlas"""
+    cantidad = fin - inicio
+
+    def columna(nombre, tipo, tamano):
+        return np.frombuffer(bloques[nombre].buf, dtype=tipo, count=cantidad, offset=inicio * tamano)
+
+    # Ojo: nunca modificar estas vistas, escribirían sobre la memoria compartida
+    filtro = columna("vivos", np.bool_, 1)
+    if "fechas" in bloques:
+        fechas = columna("fechas", np.int32, 4)
+        filtro = filtro & (fechas >= dia_desde) & (fechas <= dia_hasta)
+        del fechas
+    centavos = columna("centavos", np.int64, 8)[filtro]
+    if "categorias" in bloques:
+        # Una sola pasada con bincount para todas las categorías (no una pasada por categoría)
+        codigos = columna("categorias", np.uint16, 2)[filtro]
+        cantidades = np.bincount(codigos, minlength=cantidad_codigos)
+        sumas = _sumar_por_casilla(np, codigos, centavos, cantidad_codigos)
+        presentes = np.flatnonzero(cantidades)
+        resultado = presentes.tolist(), sumas[presentes].tolist(), cantidades[presentes].tolist()
+        del codigos
+    else:
+        unica = np.zeros(len(centavos), dtype=np.intp)  # Todas las filas en la misma casilla
+        resultado = [0], _sumar_por_casilla(np, unica, centavos, 1).tolist(), [len(centavos)]
+    # Soltamos las vistas antes de cerrar los bloques (si no, close() falla)
+    del filtro, centavos
+    return resultado
+
+
+def _sumar_porcion_python(bloques, inicio, fin, cantidad_codigos, dia_desde, dia_hasta):
+    """_sumar_porcion() sin NumPy, con un bucle de Python sobre las mismas columnas"""
+    vistas = [bloques["centavos"].buf.cast("q")]
+    try:
+        montos = vistas[0][inicio:fin]
+        vivos = bloques["vivos"].buf[inicio:fin]
+        vistas += [montos, vivos]
+        if "categorias" in bloques:
+            vistas.append(bloques["categorias"].buf.cast("H"))
+            codigos = vistas[-1][inicio:fin]
+            vistas.append(codigos)
+        else:
+            codigos = bytes(fin - inicio)  # Los ingresos no tienen categoría: todos en la casilla 0
+        if "fechas" in bloques:
+            vistas.append(bloques["fechas"].buf.cast("i"))
+            fechas = vistas[-1][inicio:fin]
+            vistas.append(fechas)
+        else:
+            fechas = None
+
+        sumas = [0] * cantidad_codigos
+        cantidades = [0] * cantidad_codigos
+        if fechas is None:
+            for centavos, codigo, vivo in zip(montos, codigos, vivos):
+                if vivo:
+                    sumas[codigo] += centavos
+                    cantidades[codigo] += 1
+        else:
+            for centavos, codigo, vivo, fecha in zip(montos, codigos, vivos, fechas):
+                if vivo and dia_desde <= fecha <= dia_hasta:
+                    sumas[codigo] += centavos
+                    cantidades[codigo] += 1
+        presentes = [codigo for codigo in range(cantidad_codigos) if cantidades[codigo]]
+        return presentes, [sumas[codigo] for codigo in presentes], [cantidades[codigo] for codigo in presentes]
+    finally:
+        for vista in reversed(vistas):
+            vista.release()
+
+
+class ResumenParalelo:
+    """
+    Un grupo de procesos listo para calcular resúmenes en paralelo:
+        with ResumenParalelo(procesos=8) as paralelo:
+            resumen = paralelo.resumen(cuenta.ingresos, cuenta.gastos)
+    Conviene reusarlo para varios resúmenes: arrancar los procesos cuesta más que sumar
+    un libro chico. Sin procesos usa todos los núcleos de la máquina
+    """
+
+    def __init__(self, procesos=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self._grupo = None
+
+    def __enter__(self):
+        from concurrent.futures import ProcessPoolExecutor
+        self._grupo = ProcessPoolExecutor(max_workers=self.procesos)
+        return self
+
+    def __exit__(self, *error):
+        self._grupo.shutdown()
+        self._grupo = None
+
+    @staticmethod
+    def _compartir(columna):
+        """Copia una columna (un array) a un bloque nuevo de memoria compartida"""
+        from multiprocessing import shared_memory
+        datos = memoryview(columna).cast("B")
+        bloque = shared_memory.SharedMemory(create=True, size=max(len(datos), 1))  # Tamaño 0 no se permite
+        bloque.buf[:len(datos)] = datos
+        return bloque
+
+    def sumar_libro(self, libro, cantidad_codigos, dia_desde=None, dia_hasta=None):
+        """
+        Suma un libro repartiéndolo entre los procesos
+        Devuelve (centavos por categoría, cantidad de registros por categoría)
+        Con dia_desde/dia_hasta (números de día) solo cuenta las filas de ese periodo
+        """
+        columnas = {"centavos": libro._centavos, "vivos": libro._vivos}
+        if cantidad_codigos > 1:
+            columnas["categorias"] = libro._categorias
+        if dia_desde is not None:
+            columnas["fechas"] = libro._fechas
+
+        bloques = {}
+        try:
+            for nombre, columna in columnas.items():
+                bloques[nombre] = self._compartir(columna)
+            nombres = {nombre: bloque.name for nombre, bloque in bloques.items()}
+
+            # Cortamos las filas en porciones seguidas del mismo tamaño (más o menos)
+            filas = len(libro._centavos)
+            cantidad_porciones = max(1, min(filas, self.procesos * PORCIONES_POR_PROCESO))
+            cortes = [filas * parte // cantidad_porciones for parte in range(cantidad_porciones + 1)]
+            tareas = [(nombres, inicio, fin, cantidad_codigos, dia_desde, dia_hasta)
+                      for inicio, fin in zip(cortes, cortes[1:])]
+
+            sumas = [0] * cantidad_codigos
+            cantidades = [0] * cantidad_codigos
+            for codigos, sumas_porcion, cantidades_porcion in self._grupo.map(_sumar_porcion, tareas):
+                for codigo, suma, cantidad in zip(codigos, sumas_porcion, cantidades_porcion):
+                    sumas[codigo] += suma
+                    cantidades[codigo] += cantidad
+            return sumas, cantidades
+        finally:
+            for bloque in bloques.values():
+                bloque.close()
+                bloque.unlink()  # El bloque se borra del sistema aunque algo falle
+
+    def resumen(self, libro_ingresos=None, libro_gastos=None, desde=None, hasta=None):
+        """Igual que calcular_resumen() pero sumando las filas en varios procesos"""
+        libro_ingresos = lista_ingresos if libro_ingresos is None else libro_ingresos
+        libro_gastos = lista_gastos if libro_gastos is None else libro_gastos
+        dia_desde = dia_hasta = None
+        if desde is not None or hasta is not None:
+            # Sin desde o sin hasta, el periodo queda abierto por ese lado (como en calcular_resumen)
+            dia_desde = 1 if desde is None else validar_fecha(desde)
+            dia_hasta = date.max.toordinal() if hasta is None else validar_fecha(hasta)
+
+        centavos_ingresos, cantidad_ingresos = self.sumar_libro(libro_ingresos, 1, dia_desde, dia_hasta)
+        catalogo = libro_gastos.categorias
+        centavos_gastos, cantidades_gastos = self.sumar_libro(
+            libro_gastos, len(catalogo), dia_desde, dia_hasta)
+        totales_por_categoria = {catalogo.nombres[codigo]: centavos_gastos[codigo]
+                                 for codigo in compress(range(len(cantidades_gastos)), cantidades_gastos)}
+        return armar_resumen(cantidad_ingresos[0], sum(cantidades_gastos),
+                             centavos_ingresos[0], sum(centavos_gastos), totales_por_categoria, catalogo)
+
+
+def calcular_resumen_paralelo(libro_ingresos=None, libro_gastos=None, desde=None, hasta=None, procesos=None):
+    """
+    Calcula el resumen repartiendo los registros entre varios procesos
+    Da los mismos números que calcular_resumen(); para varios resúmenes seguidos
+    conviene usar ResumenParalelo directamente y no arrancar los procesos cada vez
+    """
+    with ResumenParalelo(procesos) as paralelo:
+        return paralelo.resumen(libro_ingresos, libro_gastos, desde, hasta)
+
+# =============================================================================
+# PASO 14: MODO SIN PANTALLA (COMANDOS POR LOTES)
+# =============================================================================
+# Los menús esperan a que alguien escriba en el teclado. Para automatizar miles
+# de operaciones no hace falta abrir el programa una vez por tarea: se le pasa
+# un archivo (o la entrada estándar) con un comando JSON por línea, los mismos
+# del servidor, y se ejecutan todos de una sola pasada:
+#   {"op": "registrar_gasto", "nombre": "bus", "valor": "2.50", "categoria": 4}
+#   {"op": "eliminar_gasto", "id": 7}
+#   {"op": "resumen", "desde": "2024-01-01"}
+#   {"op": "fijar_presupuesto", "categoria": "transporte", "limite": "300000"}
+#   {"op": "agregar_categoria", "nombre": "electricidad", "padre": "servicios"}
+# Se validan igual que en los menús (validar_numero_positivo, validar_opcion, ...)
+# pero un dato malo no vuelve a preguntar: queda anotado como error de ese comando.
+# Al final se entrega un solo resultado JSON con lo que pasó en cada comando.
+
+def leer_comandos(archivo):
+    """
+    Lee las líneas de comandos de un archivo abierto (o de sys.stdin)
+    Las líneas vacías y las que empiezan con # se saltan pero cuentan para el número de línea
+    Devuelve parejas (número de línea, texto JSON) sin cargar todo el archivo en memoria
+    """
+    for numero, linea in enumerate(archivo, start=1):
+        linea = linea.strip()
+        if linea and not linea.startswith("#"):
+            yield numero, linea
+
+
+def ejecutar_lote(comandos, cuenta=None, almacen=None, detener_en_error=False, solo_errores=False):
+    """
+    Ejecuta muchos comandos seguidos sobre una cuenta, sin pedir nada por teclado
+    comandos puede traer diccionarios, textos JSON o parejas (número de línea, comando)
+    como las que devuelve leer_comandos()
+    Devuelve un diccionario con cuántos comandos salieron bien, el detalle de cada uno
+    (o solo de los que fallaron, con solo_errores), las alertas de presupuesto que
+    saltaron y el resumen final de la cuenta
+    """
+    cuenta = cuenta_actual if cuenta is None else cuenta
+    resultados = []
+    alertas = []
+    correctos = errores = 0
+    destino = cuenta.presupuestos.agregar_destino(alertas.append)
+    try:
+        correctos, errores = _ejecutar_comandos(cuenta, comandos, resultados, detener_en_error, solo_errores)
+    finally:
+        cuenta.presupuestos.quitar_destino(destino)
+
+    # Igual que el menú después de cada opción: lápidas fuera y cambios a disco
+    cuenta.compactar_si_conviene()
+    if almacen is not None:
+        almacen.sincronizar()
+    return {"ok": errores == 0, "comandos": correctos + errores, "correctos": correctos,
+            "errores": errores, "resultados": resultados, "alertas": alertas, "resumen": cuenta.resumen()}
+
+
+def _ejecutar_comandos(cuenta, comandos, resultados, detener_en_error, solo_errores):
+    # El bucle de ejecutar_lote(): anota cada comando en resultados y devuelve (correctos, errores)
+    import json
+    correctos = errores = 0
+    for numero, comando in enumerate(comandos, start=1):
+        if isinstance(comando, tuple):
+            numero, comando = comando
+        try:
+            if isinstance(comando, (str, bytes)):
+                try:
+                    comando = json.loads(comando)
+                except ValueError:
+                    raise ValueError("La línea no es JSON válido") from None
+            if not isinstance(comando, dict):
+                raise ValueError("El comando debe ser un objeto JSON")
+            resultado = ejecutar_operacion(cuenta, comando)
+        except ValueError as error:
+            errores += 1
+            operacion = comando.get("op") if isinstance(comando, dict) else None
+            resultados.append({"linea": numero, "op": operacion, "ok": False, "error": str(error)})
+            if detener_en_error:
+                break
+        else:
+            correctos += 1
+            if not solo_errores:
+                resultados.append({"linea": numero, "op": comando["op"], "ok": True, "resultado": resultado})
+    return correctos, errores
+
+
+def ejecutar_lote_archivo(ruta, directorio=None, en_memoria=False, detener_en_error=False, solo_errores=False):
+    """
+    Ejecuta el archivo de comandos ruta ("-" es la entrada estándar) sobre la cuenta guardada
+    Con en_memoria no se lee ni se escribe nada en disco (la cuenta empieza vacía)
+    Los presupuestos guardados también se cargan, y se guardan si el lote los cambia
+    """
+    almacen_lote = None if en_memoria else abrir_almacen(directorio)
+    try:
+        if almacen_lote is not None:
+            cargar_presupuestos(cuenta_actual.presupuestos, almacen_lote.directorio)
+        if ruta == "-":
+            return ejecutar_lote(leer_comandos(sys.stdin), cuenta_actual, almacen_lote,
+                                 detener_en_error, solo_errores)
+        with open(ruta, encoding="utf-8") as archivo:
+            return ejecutar_lote(leer_comandos(archivo), cuenta_actual, almacen_lote,
+                                 detener_en_error, solo_errores)
+    finally:
+        if almacen_lote is not None:
+            if cuenta_actual.presupuestos.a_estado()["limites"] or os.path.exists(
+                    ruta_presupuestos(almacen_lote.directorio)):
+                guardar_presupuestos(cuenta_actual.presupuestos, almacen_lote.directorio)
+            almacen_lote.cerrar()
+
+# =============================================================================
+# PASO 15: REPORTES RÁPIDOS (TEXTO, CSV Y JSON)
+# =============================================================================
+# Un print() por línea está bien para una pantalla, pero para escribir un millón
+# de registros en un archivo o una tubería cada print() es una llamada al
+# sistema. Aquí las líneas se juntan en memoria (SalidaBuffer) y se escriben en
+# bloques grandes. Los registros se leen directo de las columnas con un
+# generador (filas_libro), así el listado nunca está completo en memoria, y los
+# textos que se repiten (fechas, nombres de categoría) se arman una sola vez.
+
+TAMANO_BLOQUE_SALIDA = 1 << 20   # Caracteres que se juntan antes de escribir a un archivo o tubería
+TAMANO_BLOQUE_PANTALLA = 1 << 12  # En la terminal se escribe más seguido para que se vea avanzar
+FORMATOS_LISTADO = ("texto", "csv", "json")
+
+_etiquetas_categoria = {}  # "comida" -> "Comida"
+
+def etiqueta_categoria(categoria):
+    """El nombre de la categoría como se muestra en pantalla; .title() se calcula una sola vez"""
+    etiqueta = _etiquetas_categoria.get(categoria)
+    if etiqueta is None:
+        etiqueta = _etiquetas_categoria[categoria] = categoria.title()
+    return etiqueta
+
+def es_terminal(destino):
+    """True si destino es una terminal (una persona mirando), False si es un archivo o tubería"""
+    try:
+        return destino.isatty()
+    except (AttributeError, ValueError):  # Sin isatty, o un archivo ya cerrado
+        return False
+
+
+class SalidaBuffer:
+    """
+    Junta el texto en memoria y lo escribe en bloques grandes:
+        with SalidaBuffer() as salida:
+            salida.escribir_lineas(lineas)
+    Sin destino escribe en sys.stdout. Tiene write(), así que csv.writer puede escribir en ella
+    """
+
+    def __init__(self, destino=None, tamano=None):
+        self.destino = sys.stdout if destino is None else destino
+        if tamano is None:
+            tamano = TAMANO_BLOQUE_PANTALLA if es_terminal(self.destino) else TAMANO_BLOQUE_SALIDA
+        self.tamano = tamano
+        self._partes = []
+        self._largo = 0
+
+    def write(self, texto):
+        self._partes.append(texto)
+        self._largo += len(texto)
+        if self._largo >= self.tamano:
+            self.flush()
+        return len(texto)
+
+    def escribir_todo(self, textos, separador=""):
+        """Escribe los textos (una lista o un generador) uno detrás de otro, con separador al final de cada uno"""
+        textos = iter(textos)
+        while True:
+            # De a 1.000 textos: un solo join y una sola llamada a write por grupo
+            grupo = list(islice(textos, 1000))
+            if not grupo:
+                break
+            grupo.append("")
+            self.write(separador.join(grupo))
+
+    def escribir_lineas(self, lineas):
+        """Escribe cada texto de lineas seguido de un salto de línea"""
+        self.escribir_todo(lineas, "\n")
+
+    def flush(self):
+        if self._partes:
+            self.destino.write("".join(self._partes))
+            self._partes.clear()
+            self._largo = 0
+        self.destino.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *error):
+        self.flush()
+        return False
+
+
+class _Memo(dict):
+    """
+    Diccionario que arma cada valor la primera vez que se pide (funcion(clave)) y lo recuerda
+    Así lo que se repite mucho (una fecha, un monto, un nombre) se convierte una sola vez
+    Recuerda como mucho limite claves, para no llenar la memoria con montos que no se repiten
+    """
+
+    def __init__(self, funcion, limite=100_000):
+        super().__init__()
+        self.funcion = funcion
+        self.limite = limite
+
+    def __missing__(self, clave):
+        valor = self.funcion(clave)
+        if len(self) < self.limite:
+            self[clave] = valor
+        return valor
+
+
+def columnas_libro(libro, posiciones=None, valor_a_texto=None, convertir_texto=None, etiquetas=False):
+    """
+    Las columnas de los registros vivos, como iteradores que se leen de a poco:
+    [nombre, valor, categoria, fecha, id] para gastos y [descripcion, valor, fecha, id] para ingresos
+    Las conversiones pasan dentro de map() y compress() (en C), sin un bucle de Python
+    - posiciones: resultado de una búsqueda; None significa todos los registros
+    - valor_a_texto: función que convierte cada monto en centavos (por ejemplo formatear_centavos);
+      sin ella los montos vienen como float, igual que registro["valor"]
+    - convertir_texto: función que se aplica a los nombres y categorías (por ejemplo, comillas de CSV)
+    - etiquetas: las categorías como se muestran en pantalla ("Transporte")
+    Las fechas siempre vienen como texto AAAA-MM-DD
+    """
+    columnas = [libro._textos, libro._centavos, libro._fechas, libro._ids]
+    if libro.usa_categoria:
+        columnas.insert(2, libro._categorias)
+    if posiciones is not None:
+        columnas = [map(columna.__getitem__, posiciones) for columna in columnas]
+    elif libro._eliminados:
+        columnas = [compress(columna, libro._vivos) for columna in columnas]  # Saltamos las lápidas
+
+    tabla = libro._tabla_textos
+    nombres = [etiqueta_categoria(categoria) if etiquetas else categoria
+               for categoria in (libro.categorias.nombres if libro.usa_categoria else ())]
+    if convertir_texto is not None:
+        # Cada texto distinto se convierte una sola vez, no una vez por registro
+        tabla = _Memo(lambda numero: convertir_texto(libro._tabla_textos[numero]), limite=len(tabla))
+        nombres = [convertir_texto(nombre) for nombre in nombres]
+    columnas[0] = map(tabla.__getitem__, columnas[0])
+    if valor_a_texto is not None:
+        columnas[1] = map(_Memo(valor_a_texto).__getitem__, columnas[1])
+    else:
+        columnas[1] = map((100).__rtruediv__, columnas[1])  # centavos / 100
+    columnas[-2] = map(_Memo(lambda dia: date.fromordinal(dia).isoformat()).__getitem__, columnas[-2])
+    if libro.usa_categoria:
+        columnas[2] = map(nombres.__getitem__, columnas[2])
+    return columnas
+
+def filas_libro(libro, posiciones=None):
+    """Los registros como tuplas con los campos del libro y el id al final (un generador)"""
+    return zip(*columnas_libro(libro, posiciones))
+
+def lineas_listado(libro, posiciones=None):
+    """Las líneas del listado en texto, con el mismo formato que formatear_ingreso/formatear_gasto"""
+    columnas = columnas_libro(libro, posiciones, valor_a_texto=formatear_centavos, etiquetas=True)
+    if libro.usa_categoria:
+        for nombre, valor, categoria, fecha, id_registro in zip(*columnas):
+            yield f"{id_registro}. {fecha} {nombre} - ${valor} ({categoria})"
+    else:
+        for descripcion, valor, fecha, id_registro in zip(*columnas):
+            yield f"{id_registro}. {fecha} {descripcion} - ${valor}"
+
+def _centavos_csv(centavos):
+    """Un monto como lo escribe el CSV: 1234.50, sin separador de miles"""
+    return formatear_centavos(centavos, miles="")
+
+def _centavos_json(centavos):
+    """Un monto como lo escribe json: el float de siempre (repr de 1234.5 es "1234.5")"""
+    return repr(centavos / 100)
+
+def _campo_csv(texto):
+    """Un texto como campo de CSV (entre comillas solo si hace falta), igual que lo escribe csv.writer"""
+    if any(caracter in texto for caracter in ',"\r\n'):
+        return '"' + texto.replace('"', '""') + '"'
+    return texto
+
+def escribir_listado(libro, salida, formato="texto", posiciones=None):
+    """
+    Escribe los registros del libro en salida (un SalidaBuffer) en el formato pedido:
+    - texto: una línea por registro, como en los menús
+    - csv: con encabezado y montos con 2 decimales; las columnas son las que acepta la importación
+    - json: una lista de objetos con los mismos campos que a_diccionario()
+    """
+    if formato == "texto":
+        salida.escribir_lineas(lineas_listado(libro, posiciones))
+    elif formato == "csv":
+        columnas = columnas_libro(libro, posiciones, valor_a_texto=_centavos_csv, convertir_texto=_campo_csv)
+        columnas[-1] = map(str, columnas[-1])
+        salida.escribir_lineas([",".join(libro.campos + ("id",))])
+        salida.escribir_lineas(map(",".join, zip(*columnas)))
+    elif formato == "json":
+        import json
+        columnas = columnas_libro(libro, posiciones, valor_a_texto=_centavos_json,
+                                  convertir_texto=json.JSONEncoder(ensure_ascii=False).encode)
+        # Un objeto por registro armado con una plantilla: {"nombre": {0}, "valor": {1}, ...}
+        campos = [f'"{clave}": "{{{numero}}}"' if clave == "fecha" else f'"{clave}": {{{numero}}}'
+                  for numero, clave in enumerate(libro.campos + ("id",))]
+        objetos = map(("{{" + ", ".join(campos) + "}}").format, *columnas)
+        primero = next(objetos, None)
+        if primero is None:
+            salida.write("[]\n")
+        else:
+            salida.write("[\n" + primero)
+            salida.escribir_todo(map(",\n".__add__, objetos))
+            salida.write("\n]\n")
+    else:
+        raise ValueError(f"Formato desconocido: {formato!r} (use {', '.join(FORMATOS_LISTADO)})")
+
+def escribir_resumen(resumen, salida, formato="texto", desde=None, hasta=None, catalogo=None):
+    """
+    Escribe un resumen (el diccionario de calcular_resumen) en el formato pedido
+    En csv solo va la tabla de gastos por categoría; en json va el resumen completo
+    catalogo es el de la cuenta del resumen (ver lineas_resumen)
+    """
+    if formato == "texto":
+        salida.escribir_lineas(lineas_resumen(resumen, desde, hasta, catalogo))
+    elif formato == "csv":
+        import csv
+        escritor = csv.writer(salida, lineterminator="\n")
+        escritor.writerow(("categoria", "total", "porcentaje"))
+        escritor.writerows((categoria, f"{total:.2f}", f"{porcentaje:.1f}")
+                           for categoria, (total, porcentaje) in resumen["gastos_por_categoria"].items())
+    elif formato == "json":
+        import json
+        json.dump(resumen, salida, ensure_ascii=False)
+        salida.write("\n")
+    else:
+        raise ValueError(f"Formato desconocido: {formato!r} (use {', '.join(FORMATOS_LISTADO)})")
+
+def listar(que, formato="texto", destino=None, desde=None, hasta=None):
+    """
+    Escribe "ingresos", "gastos" o "resumen" de cuenta_actual en destino (por defecto la pantalla)
+    Si destino no es una terminal se escribe de a bloques grandes, a medida que se leen los registros
+    """
+    with SalidaBuffer(destino) as salida:
+        if que == "resumen":
+            escribir_resumen(cuenta_actual.resumen(desde, hasta), salida, formato, desde, hasta,
+                             cuenta_actual.categorias)
+        else:
+            escribir_listado(cuenta_actual._libro(que), salida, formato)
+
+# =============================================================================
+# PASO 16: PRESUPUESTOS POR CATEGORÍA Y ALERTAS
+# =============================================================================
+# Cada categoría de gasto puede tener un presupuesto mensual. En vez de revisar
+# todo el libro cuando alguien pide el resumen, cada gasto nuevo se revisa en el
+# momento en que entra: el libro ya lleva lo gastado por mes y por categoría
+# (IndiceFechas), así que saber si un gasto cruzó el 80% o el 100% del
+# presupuesto cuesta O(1), aunque lleguen millones de gastos por lote.
+# Las alertas se entregan a "destinos" intercambiables:
+# - una función cualquiera:            presupuestos.agregar_destino(print)
+# - un archivo de registro (JSON):     presupuestos.agregar_destino("alertas.jsonl")
+# - una cola del mismo programa:       presupuestos.agregar_destino(queue.Queue())
+
+UMBRALES_PRESUPUESTO = (80, 100)  # Porcentajes del presupuesto que disparan una alerta
+ARCHIVO_PRESUPUESTOS = "presupuestos.json"
+
+
+class AlertasArchivo:
+    """
+    Destino de alertas que las escribe en un archivo, una línea JSON por alerta
+    El archivo se abre para agregar al final y cada línea se escribe enseguida,
+    así otro programa puede irlo leyendo mientras llegan los gastos
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._archivo = open(ruta, "a", encoding="utf-8", buffering=1)  # Con buffering=1 se escribe cada línea
+
+    def __call__(self, alerta):
+        import json
+        self._archivo.write(json.dumps(alerta, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._archivo.close()
+
+
+def destino_alertas(destino):
+    """
+    Convierte lo que se quiera usar como destino en una función que recibe la alerta:
+    una cola (cualquier objeto con put_nowait), una ruta de archivo o una función
+    """
+    if hasattr(destino, "put_nowait"):
+        return destino.put_nowait
+    if isinstance(destino, (str, os.PathLike)):
+        return AlertasArchivo(destino)
+    if callable(destino):
+        return destino
+    raise TypeError(f"No se pueden enviar alertas a {destino!r}")
+
+
+def texto_mes(numero_mes):
+    """Un número de mes (ver numero_de_mes) como texto AAAA-MM"""
+    return f"{numero_mes // 12:04d}-{numero_mes % 12 + 1:02d}"
+
+def texto_alerta(alerta):
+    """El aviso que se muestra en pantalla cuando llega una alerta"""
+    icono = "🚨" if alerta["umbral"] >= 100 else "⚠️ "
+    return (f"{icono} Presupuesto de {etiqueta_categoria(alerta['categoria'])} ({alerta['mes']}): "
+            f"gastó ${alerta['gastado']:,.2f} de ${alerta['limite']:,.2f} ({alerta['porcentaje']:.1f}%)")
+
+
+class Presupuestos:
+    """
+    Presupuestos mensuales de las categorías de un libro de gastos, con alertas
+        presupuestos = Presupuestos(cuenta.gastos)
+        presupuestos.fijar("transporte", 300000)
+        presupuestos.agregar_destino(print)
+    Cada vez que un gasto (registrado, modificado o importado por lote) hace que lo
+    gastado en su mes pase un umbral (80% y 100%), se envía una alerta a cada destino:
+    un diccionario con categoria, mes, umbral, limite, gastado, porcentaje e id
+    La alerta sale una sola vez, en el gasto que cruza el umbral. Si después se
+    eliminan gastos y se vuelve a bajar, el siguiente cruce avisa otra vez
+    """
+
+    def __init__(self, libro_gastos, umbrales=UMBRALES_PRESUPUESTO):
+        self.libro = libro_gastos
+        self.umbrales = tuple(sorted(umbrales))
+        self.limites = {}  # Código -> centavos por mes (solo las categorías con presupuesto)
+        # Por cada categoría con presupuesto, los cortes ya calculados: (umbral, centavos del umbral)
+        self._cortes = {}
+        self.destinos = []
+        self.fallos = 0  # Alertas que un destino no pudo recibir (por ejemplo, una cola llena)
+        libro_gastos.observadores.append(self._al_cambiar)
+
+    # ---------------------------------------------------------------- configuración
+    def fijar(self, categoria, limite):
+        """Fija el presupuesto mensual de una categoría (limite None lo quita)"""
+        codigo = validar_categoria(categoria, self.libro.categorias)
+        if limite is None:
+            self.limites.pop(codigo, None)
+            self._cortes.pop(codigo, None)
+            return
+        centavos = validar_numero_positivo(limite).centavos
+        self.limites[codigo] = centavos
+        # El corte es el primer centavo que llega al umbral (hacia arriba: 80% de $0.05 es $0.04)
+        self._cortes[codigo] = tuple((umbral, -(-centavos * umbral // 100)) for umbral in self.umbrales)
+
+    def quitar(self, categoria):
+        self.fijar(categoria, None)
+
+    def agregar_destino(self, destino):
+        """Agrega un destino de alertas (ver destino_alertas) y devuelve la función que quedó"""
+        destino = destino_alertas(destino)
+        self.destinos.append(destino)
+        return destino
+
+    def quitar_destino(self, destino):
+        self.destinos.remove(destino)
+
+    def cerrar(self):
+        """Deja de vigilar el libro y cierra los destinos que se pueden cerrar (archivos)"""
+        if self._al_cambiar in self.libro.observadores:
+            self.libro.observadores.remove(self._al_cambiar)
+        for destino in self.destinos:
+            if hasattr(destino, "close"):
+                destino.close()
+        self.destinos = []
+
+    def a_estado(self):
+        """Los presupuestos como datos simples para guardarlos en disco"""
+        return {"umbrales": list(self.umbrales),
+                "limites": {self.libro.categorias.nombres[codigo]: centavos for codigo, centavos in sorted(self.limites.items())}}
+
+    def cargar_estado(self, estado):
+        """Recupera los presupuestos guardados con a_estado() (los límites están en centavos)"""
+        self.umbrales = tuple(sorted(estado.get("umbrales", UMBRALES_PRESUPUESTO)))
+        self.limites.clear()
+        self._cortes.clear()
+        for categoria, centavos in estado.get("limites", {}).items():
+            self.fijar(categoria, Dinero(centavos))
+
+    # ---------------------------------------------------------------- consultas
+    def _gastado(self, codigo, mes):
+        cubeta = self.libro.por_fecha.por_mes.get(mes)
+        return cubeta.por_categoria.get(codigo, 0) if cubeta is not None else 0
+
+    def gastado(self, categoria, fecha=None):
+        """Centavos gastados en una categoría en el mes de esa fecha (por defecto, este mes)"""
+        return self._gastado(validar_categoria(categoria, self.libro.categorias), numero_de_mes(validar_fecha(fecha)))
+
+    def estado(self, fecha=None):
+        """Cómo va cada presupuesto en el mes de esa fecha: una lista de diccionarios"""
+        mes = numero_de_mes(validar_fecha(fecha))
+        estados = []
+        for codigo, limite in sorted(self.limites.items()):
+            gastado = self._gastado(codigo, mes)
+            estados.append({"categoria": self.libro.categorias.nombres[codigo], "mes": texto_mes(mes), "limite": limite / 100,
+                            "gastado": gastado / 100, "restante": (limite - gastado) / 100,
+                            "porcentaje": gastado / limite * 100})
+        return estados
+
+    # ---------------------------------------------------------------- vigilancia
+    def _al_cambiar(self, operacion, *datos):
+        if not self._cortes:
+            return
+        libro = self.libro
+        if operacion == "agregar":
+            posicion = len(libro._centavos) - 1
+            self._revisar(libro._categorias[posicion], libro._fechas[posicion], libro._centavos[posicion],
+                          libro._ids[posicion])
+        elif operacion == "modificar":
+            id_registro, campo, valor, anterior = datos
+            posicion = libro._posicion_de_id(id_registro)
+            centavos = libro._centavos[posicion]
+            # Lo que el cambio le sumó a la cubeta (mes, categoría) donde quedó el gasto
+            if campo == "valor":
+                agregado = centavos - a_centavos(anterior)
+            elif campo == "categoria":
+                agregado = centavos if valor != anterior else 0
+            elif campo == "fecha":
+                agregado = centavos if numero_de_mes(validar_fecha(valor)) != numero_de_mes(validar_fecha(anterior)) else 0
+            else:
+                return
+            if agregado > 0:
+                self._revisar(libro._categorias[posicion], libro._fechas[posicion], agregado, id_registro)
+        elif operacion == "extender":
+            self._revisar_bloque(len(libro._centavos) - datos[0])
+        # Eliminar y compactar solo pueden bajar lo gastado: no hay nada que avisar
+
+    def _revisar(self, codigo, dia, agregado, id_registro):
+        # Lo gastado ya incluye el gasto nuevo: antes = después - lo que se agregó
+        cortes = self._cortes.get(codigo)
+        if not cortes:
+            return
+        mes = numero_de_mes(dia)
+        despues = self.libro.por_fecha.por_mes[mes].por_categoria[codigo]
+        antes = despues - agregado
+        for umbral, corte in cortes:
+            if antes < corte <= despues:
+                self._alertar(codigo, mes, umbral, despues, id_registro)
+
+    def _revisar_bloque(self, inicio):
+        """Revisa los gastos que entraron de golpe con extender(), en orden, O(1) cada uno"""
+        libro = self.libro
+        fin = len(libro._centavos)
+        centavos, fechas, codigos = libro._centavos, libro._fechas, libro._categorias
+        # 1. Cuánto trajo el bloque a cada (día, categoría), solo en las categorías con presupuesto
+        #    (compress elige esas filas en C; la clave día * MAXIMO_CATEGORIAS + código es
+        #    un entero, más barato que una tupla)
+        filas = list(compress(range(inicio, fin), map(self._cortes.__contains__, codigos[inicio:fin])))
+        por_dia = {}
+        claves = map(int.__add__, map(MAXIMO_CATEGORIAS.__mul__, map(fechas.__getitem__, filas)),
+                     map(codigos.__getitem__, filas))
+        for clave, monto in zip(claves, map(centavos.__getitem__, filas)):
+            por_dia[clave] = por_dia.get(clave, 0) + monto
+        bloque = {}  # (mes, código) -> centavos que trajo el bloque
+        for clave, suma in por_dia.items():
+            dia, codigo = divmod(clave, MAXIMO_CATEGORIAS)
+            clave = (numero_de_mes(dia), codigo)
+            bloque[clave] = bloque.get(clave, 0) + suma
+
+        # 2. Solo las cubetas que cruzan algún umbral con el bloque necesitan ver sus filas una por una
+        cruzan = {}
+        for (mes, codigo), suma in bloque.items():
+            despues = libro.por_fecha.por_mes[mes].por_categoria[codigo]
+            antes = despues - suma
+            if any(antes < corte <= despues for _, corte in self._cortes[codigo]):
+                cruzan[mes, codigo] = antes
+        if not cruzan:
+            return
+        meses = {}  # día -> número de mes (en un lote las fechas se repiten mucho)
+        for posicion in filas:
+            dia = fechas[posicion]
+            mes = meses.get(dia)
+            if mes is None:
+                mes = meses[dia] = numero_de_mes(dia)
+            clave = (mes, codigos[posicion])
+            antes = cruzan.get(clave)
+            if antes is None:
+                continue
+            despues = cruzan[clave] = antes + centavos[posicion]
+            for umbral, corte in self._cortes[clave[1]]:
+                if antes < corte <= despues:
+                    self._alertar(clave[1], mes, umbral, despues, libro._ids[posicion])
+
+    def _alertar(self, codigo, mes, umbral, gastado, id_registro):
+        limite = self.limites[codigo]
+        alerta = {"categoria": self.libro.categorias.nombres[codigo], "mes": texto_mes(mes),
+                  "umbral": umbral, "limite": limite / 100, "gastado": gastado / 100,
+                  "porcentaje": gastado / limite * 100, "id": id_registro}
+        for destino in self.destinos:
+            # El gasto ya quedó guardado: si un destino falla (disco lleno, cola llena)
+            # no debe parecer que el registro falló, así que solo lo contamos
+            try:
+                destino(alerta)
+            except Exception:
+                self.fallos += 1
+
+
+def ruta_presupuestos(directorio=None):
+    return os.path.join(directorio or directorio_datos(), ARCHIVO_PRESUPUESTOS)
+
+def cargar_presupuestos(presupuestos, directorio=None):
+    """Carga los presupuestos guardados en la carpeta de datos (si hay)"""
+    import json
+    ruta = ruta_presupuestos(directorio)
+    if os.path.exists(ruta):
+        with open(ruta, encoding="utf-8") as archivo:
+            presupuestos.cargar_estado(json.load(archivo))
+    return presupuestos
+
+def guardar_presupuestos(presupuestos, directorio=None):
+    """Guarda los presupuestos en la carpeta de datos (reemplazo atómico, como la instantánea)"""
+    import json
+    ruta = ruta_presupuestos(directorio)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as archivo:
+        json.dump(presupuestos.a_estado(), archivo, ensure_ascii=False)
+    os.replace(ruta + ".tmp", ruta)
+
+def menu_presupuestos():
+    """Muestra cómo van los presupuestos de este mes y permite fijarlos o quitarlos"""
+    presupuestos = cuenta_actual.presupuestos
+    print("\n" + "="*50)
+    print("        PRESUPUESTOS MENSUALES POR CATEGORÍA")
+    print("="*50)
+    estados = {estado["categoria"]: estado for estado in presupuestos.estado()}
+    # Con muchas categorías solo se muestran las que tienen presupuesto
+    catalogo = cuenta_actual.categorias
+    todas = len(catalogo) <= MAXIMO_CATEGORIAS_EN_MENU
+    for codigo in catalogo.en_orden() if todas else sorted(presupuestos.limites):
+        categoria = catalogo.nombres[codigo]
+        sangria = "   " * catalogo.profundidades[codigo]
+        if categoria in estados:
+            estado = estados[categoria]
+            print(f"{sangria}{codigo+1}. {etiqueta_categoria(categoria):<15}: ${estado['gastado']:>10,.2f} de "
+                  f"${estado['limite']:,.2f} ({estado['porcentaje']:.1f}%)")
+        else:
+            print(f"{sangria}{codigo+1}. {etiqueta_categoria(categoria):<15}: sin presupuesto")
+    print("="*50)
+    print("1. Fijar el presupuesto de una categoría")
+    print("2. Quitar el presupuesto de una categoría")
+    print("3. Volver al menú principal")
+    opcion = pedir_opcion_menu("Seleccione una opción: ", 3)
+    if opcion == 3:
+        return
+    categoria = pedir_categoria("Número de la categoría: ", mostrar=False)
+    if opcion == 1:
+        limite = pedir_numero_positivo("Presupuesto mensual $: ")
+        presupuestos.fijar(categoria, limite)
+        print(f"✅ Presupuesto de {etiqueta_categoria(categoria)}: ${limite:,.2f} por mes")
+    else:
+        presupuestos.quitar(categoria)
+        print(f"✅ Se quitó el presupuesto de {etiqueta_categoria(categoria)}")
+    if almacen is not None:
+        guardar_presupuestos(presupuestos, almacen.directorio)
+
+# =============================================================================
+# PASO 17: RESÚMENES EN CACHÉ
+# =============================================================================
+# Un tablero que pide el mismo resumen cada pocos segundos no necesita que se
+# vuelva a calcular (ni a armar el texto) si nadie registró, modificó ni eliminó
+# nada entretanto. Cada libro lleva un número de versión que sube solo con esos
+# cambios; un resumen guardado con la versión de sus libros sigue valiendo
+# mientras las versiones no cambien, así que leerlo otra vez cuesta O(1).
+# - El resumen completo, el de cada categoría y el de cada periodo se guardan por separado
+#   (el de una categoría solo depende de los gastos: registrar un ingreso no lo invalida)
+# - No hace falta borrar nada al cambiar un libro: las claves viejas dejan de pedirse
+#   y la caché, que tiene un límite de entradas, las saca por antigüedad de uso (LRU)
+
+LIMITE_CACHE_RESUMENES = 1024  # Entradas como máximo (entre todos los periodos y todas las cuentas)
+
+
+class CacheResumenes:
+    """
+    Caché con límite de entradas: cuando se llena, sale la que lleva más tiempo sin usarse
+        cache.obtener(clave, calcular)  # calcular() solo se llama si la clave no está
+    Un OrderedDict recuerda el orden de uso: cada lectura mueve su clave al final
+    y la que sobra se saca del principio, las dos cosas en O(1)
+    """
+
+    def __init__(self, limite=LIMITE_CACHE_RESUMENES):
+        self.limite = limite
+        self._entradas = OrderedDict()
+        self.aciertos = 0  # Lecturas que salieron de la caché
+        self.calculos = 0  # Lecturas que tuvieron que calcular
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def obtener(self, clave, calcular):
+        entradas = self._entradas
+        valor = entradas.get(clave, entradas)  # La propia caché marca "no está" (None puede ser un valor)
+        if valor is not entradas:
+            self.aciertos += 1
+            entradas.move_to_end(clave)
+            return valor
+        self.calculos += 1
+        valor = entradas[clave] = calcular()
+        if len(entradas) > self.limite:
+            entradas.popitem(last=False)  # La que lleva más tiempo sin usarse
+        return valor
+
+    def limpiar(self):
+        self._entradas.clear()
+
+
+cache_resumenes = CacheResumenes()
+
+
+def _version(libro):
+    # El catálogo de categorías del libro solo crece, así que su largo sirve de versión (una
+    # categoría nueva puede convertir a otra en rama y cambiar gastos_por_rama)
+    return libro.numero_libro, libro.version, len(libro.categorias) if libro.usa_categoria else 0
+
+def _periodo(desde, hasta):
+    # "2024-01-01", date(2024, 1, 1) y 738886 son el mismo día: la clave usa el número de día
+    return (None if desde is None else validar_fecha(desde)), (None if hasta is None else validar_fecha(hasta))
+
+def resumen_en_cache(libro_ingresos=None, libro_gastos=None, desde=None, hasta=None):
+    """Igual que calcular_resumen(), pero si los libros no cambiaron devuelve el resumen ya calculado"""
+    libro_ingresos = lista_ingresos if libro_ingresos is None else libro_ingresos
+    libro_gastos = lista_gastos if libro_gastos is None else libro_gastos
+    clave = ("resumen", *_version(libro_ingresos), *_version(libro_gastos), *_periodo(desde, hasta))
+    return cache_resumenes.obtener(clave, lambda: calcular_resumen(libro_ingresos, libro_gastos, desde, hasta))
+
+def resumen_categoria_en_cache(libro_gastos, categoria, desde=None, hasta=None):
+    """Igual que calcular_resumen_categoria(), desde la caché (solo depende del libro de gastos)"""
+    codigo = validar_categoria(categoria, libro_gastos.categorias)
+    clave = ("categoria", codigo, *_version(libro_gastos), *_periodo(desde, hasta))
+    return cache_resumenes.obtener(clave, lambda: calcular_resumen_categoria(libro_gastos, categoria, desde, hasta))
+
+def lineas_resumen_en_cache(libro_ingresos, libro_gastos, desde=None, hasta=None):
+    """Las líneas de texto del resumen ya armadas (una tupla), como las muestra mostrar_resumen()"""
+    # desde y hasta van tal cual en la clave porque el texto los muestra como se escribieron
+    clave = ("texto", *_version(libro_ingresos), *_version(libro_gastos), desde, hasta)
+    return cache_resumenes.obtener(clave, lambda: tuple(lineas_resumen(
+        resumen_en_cache(libro_ingresos, libro_gastos, desde, hasta), desde, hasta, libro_gastos.categorias)))
+
+# =============================================================================
+# PASO 18: ARRANQUE RÁPIDO Y MODO RESIDENTE
+# =============================================================================
+# Un script que llama al programa miles de veces al día para una sola consulta
+# paga cada vez por abrir Python, importar este archivo y cargar los libros.
+# - Importar el archivo solo carga módulos livianos: lo pesado (numpy, asyncio,
+#   json, mmap, argparse...) se importa dentro de la función que lo usa.
+#   El subcomando "arranque" mide cuánto tarda la importación con -X importtime
+#   y falla si pasa de PRESUPUESTO_IMPORTACION_MS o si se cuela un módulo pesado;
+#   las pruebas (test_calculadora.py) hacen la misma revisión en cada corrida
+# - "python archivo.py" vuelve a compilar el archivo entero en cada llamada; con
+#   "python -m" (desde la carpeta del archivo) Python usa el .pyc ya compilado
+# - El modo residente carga los libros una sola vez y se queda esperando
+#   comandos por un socket Unix (un archivo en el disco, solo para este equipo).
+#   Los comandos son los mismos del modo por lotes y del servidor, uno por línea:
+#       python -m "Calculadora_Financiera_V (1)" residente &
+#       python -m "Calculadora_Financiera_V (1)" consultar '{"op": "resumen"}'
+#   El cliente no importa argparse ni json ni lee los libros: solo manda la
+#   línea y escribe la respuesta, así que cuesta poco más que abrir Python
+
+PRESUPUESTO_IMPORTACION_MS = 20  # Lo que puede tardar importar el archivo (con el .pyc ya hecho)
+
+# Módulos que importar el archivo no debe cargar (cada uno cuesta varios milisegundos)
+MODULOS_PESADOS = ("numpy", "asyncio", "json", "csv", "mmap", "decimal", "argparse", "socket",
+                   "multiprocessing", "concurrent", "threading", "tracemalloc", "random",
+                   "statistics", "platform", "re")
+
+ARCHIVO_SOCKET = "residente.sock"
+
+
+def medir_importacion(repeticiones=5):
+    """
+    Importa este archivo en un Python nuevo con -X importtime y devuelve lo que tardó
+    La primera vez deja el .pyc en __pycache__ (como en el uso normal) y de las
+    demás se queda con la más rápida, porque las otras solo suman ruido del equipo
+    Devuelve un diccionario con los milisegundos, los módulos más lentos y los pesados que se cargaron
+    """
+    import subprocess
+    carpeta, archivo = os.path.split(os.path.abspath(__file__))
+    nombre = os.path.splitext(archivo)[0]
+    codigo = f"import sys; sys.path.insert(0, {carpeta!r}); __import__({nombre!r})"
+    entorno = dict(os.environ)
+    entorno.pop("PYTHONDONTWRITEBYTECODE", None)  # Sin el .pyc se mediría la compilación
+    mejor = None
+    for _ in range(repeticiones + 1):
+        proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo], env=entorno,
+                                 capture_output=True, text=True, check=True)
+        medida = _leer_importtime(proceso.stderr, nombre)
+        if mejor is None or medida["milisegundos"] < mejor["milisegundos"]:
+            mejor = medida
+    return mejor
+
+
+def _leer_importtime(texto, nombre):
+    # Cada línea es "import time: propio | acumulado | módulo", con el módulo sangrado dos
+    # espacios por nivel según quién lo importó. Los hijos salen antes que el padre, así que
+    # los módulos que cargó este archivo son los que aparecen después de la última línea
+    # sin sangría y antes de la suya
+    hijos = []  # (nivel, módulo, microsegundos acumulados)
+    for linea in texto.splitlines():
+        if not linea.startswith("import time:") or "[us]" in linea:
+            continue
+        propio, acumulado, modulo = linea[len("import time:"):].split("|", 2)
+        nivel = (len(modulo) - len(modulo.lstrip()) - 1) // 2
+        modulo = modulo.strip()
+        if nivel > 0:
+            hijos.append((nivel, modulo, int(acumulado)))
+        elif modulo != nombre:
+            hijos.clear()
+        else:
+            directos = sorted(((microsegundos, hijo) for nivel, hijo, microsegundos in hijos if nivel == 1),
+                              reverse=True)
+            return {"milisegundos": int(acumulado) / 1000, "propio_ms": int(propio) / 1000,
+                    "mas_lentos": [(hijo, microsegundos / 1000) for microsegundos, hijo in directos[:5]],
+                    "pesados": sorted({hijo.partition(".")[0] for _, hijo, _ in hijos} & set(MODULOS_PESADOS))}
+    raise ValueError(f"-X importtime no mostró la importación de {nombre}")
+
+
+def revisar_arranque(presupuesto_ms=PRESUPUESTO_IMPORTACION_MS, repeticiones=5):
+    """Mide la importación, la muestra en pantalla y devuelve True si cumple el presupuesto"""
+    medida = medir_importacion(repeticiones)
+    print(f"⏱️  Importar el archivo: {medida['milisegundos']:.1f} ms "
+          f"(presupuesto {presupuesto_ms:g} ms; el propio archivo {medida['propio_ms']:.1f} ms)")
+    for modulo, milisegundos in medida["mas_lentos"]:
+        print(f"   {modulo:<20} {milisegundos:6.1f} ms")
+    if medida["pesados"]:
+        print(f"❌ Se cargan al importar: {', '.join(medida['pesados'])} (deberían importarse al usarse)")
+    if medida["milisegundos"] > presupuesto_ms:
+        print("❌ La importación pasa del presupuesto")
+    return medida["milisegundos"] <= presupuesto_ms and not medida["pesados"]
+
+
+def ruta_socket(directorio=None):
+    """Socket del modo residente (se puede cambiar con CALCULADORA_SOCKET)"""
+    return os.environ.get("CALCULADORA_SOCKET") or os.path.join(directorio or directorio_datos(), ARCHIVO_SOCKET)
+
+
+class ServidorResidente(ServidorCalculadora):
+    """
+    El servidor del PASO 10 con una sola cuenta (la del menú y del modo por lotes),
+    cargada una vez, que atiende por un socket Unix en vez de por la red
+    El campo "cuenta" de los comandos no hace falta (si viene, no se usa)
+    """
+
+    def __init__(self, cuenta, almacen_residente=None, segundos_sincronizacion=0.2):
+        super().__init__(segundos_sincronizacion=segundos_sincronizacion)
+        self.cuenta = cuenta
+        self.almacen = almacen_residente
+        self.cuentas[""] = cuenta
+        if almacen_residente is not None:
+            self.almacenes[""] = almacen_residente
+
+    async def obtener_cuenta(self, nombre):
+        return self.cuenta, self.candados[""]
+
+    async def procesar(self, peticion):
+        respuesta = await super().procesar(peticion)
+        if respuesta["ok"] and self.almacen is not None and peticion.get("op") == "fijar_presupuesto":
+            guardar_presupuestos(self.cuenta.presupuestos, self.almacen.directorio)
+        return respuesta
+
+    async def servir(self, ruta, al_iniciar=None):
+        import asyncio
+        if os.path.exists(ruta):
+            if residente_activo(ruta):
+                raise OSError(f"Ya hay un residente atendiendo en {ruta}")
+            os.remove(ruta)  # Quedó de un residente que ya no corre
+        self.candados[""] = asyncio.Lock()
+        servidor = await asyncio.start_unix_server(self.atender, ruta)
+        os.chmod(ruta, 0o600)  # Solo el dueño de los datos puede mandar comandos
+        tarea_fondo = asyncio.create_task(self.sincronizar_periodicamente())
+        if al_iniciar is not None:
+            al_iniciar(ruta)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            tarea_fondo.cancel()
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+
+def residente_activo(ruta):
+    """True si hay un residente atendiendo en el socket ruta"""
+    import socket
+    with socket.socket(socket.AF_UNIX) as prueba:
+        try:
+            prueba.connect(ruta)
+        except OSError:
+            return False
+    return True
+
+
+def iniciar_residente(directorio=None, ruta=None):
+    """
+    Carga los libros guardados y atiende comandos por el socket hasta Ctrl+C (o SIGTERM)
+    Devuelve False si no pudo empezar (por ejemplo, porque ya hay otro residente)
+    """
+    import asyncio
+    import signal
+    ruta = ruta or ruta_socket(directorio)
+    # Se revisa antes de abrir el almacén: dos procesos no deben escribir el mismo diario
+    if residente_activo(ruta):
+        print(f"❌ Ya hay un residente atendiendo en {ruta}", file=sys.stderr)
+        return False
+    try:
+        almacen_residente = abrir_almacen(directorio)
+    except (OSError, ValueError) as error:
+        print(f"❌ No se pudieron cargar los datos guardados: {error}", file=sys.stderr)
+        return False
+    try:
+        cargar_presupuestos(cuenta_actual.presupuestos, almacen_residente.directorio)
+        # Con SIGTERM (kill) se sale igual que con Ctrl+C: el diario queda en disco
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        servidor = ServidorResidente(cuenta_actual, almacen_residente)
+        asyncio.run(servidor.servir(ruta, al_iniciar=lambda ruta: print(
+            f"🖥️  Residente con {len(lista_ingresos):,} ingresos y {len(lista_gastos):,} gastos en {ruta}",
+            flush=True)))
+    except KeyboardInterrupt:
+        print("\n👋 Residente detenido")
+    except OSError as error:  # Por ejemplo, si otro residente ganó el socket entretanto
+        print(f"❌ No se pudo atender en {ruta}: {error}", file=sys.stderr)
+        return False
+    finally:
+        almacen_residente.cerrar()
+    return True
+
+
+def consultar_residente(comandos, ruta=None, salida=None):
+    """
+    Manda los comandos (textos JSON, uno por línea) al residente y escribe cada respuesta
+    Las respuestas se pasan tal como llegan, sin leer el JSON. Devuelve True si todas
+    salieron bien; si no hay residente en ruta lanza OSError
+    """
+    import socket
+    salida = sys.stdout.buffer if salida is None else salida
+    todo_bien = True
+    with socket.socket(socket.AF_UNIX) as conexion:
+        conexion.connect(ruta or ruta_socket())
+        lector = conexion.makefile("rb")
+        for comando in comandos:
+            conexion.sendall(comando.strip().encode("utf-8") + b"\n")
+            respuesta = lector.readline()
+            if not respuesta:
+                raise OSError("El residente cerró la conexión")
+            # json.dumps escribe siempre {"ok": true, ...} al empezar: no hace falta importar json
+            todo_bien = todo_bien and respuesta.startswith(b'{"ok": true')
+            salida.write(respuesta)
+    salida.flush()
+    return todo_bien
+
+
+def ejecutar_consulta(comandos, ruta=None):
+    """
+    El subcomando consultar: sin comandos los lee de la entrada estándar (uno por línea)
+    Devuelve el código de salida: 0 si todo salió bien, 1 si algún comando falló
+    y 2 si no se pudo hablar con el residente
+    """
+    if not comandos:
+        comandos = [linea for _, linea in leer_comandos(sys.stdin)]
+    try:
+        return 0 if consultar_residente(comandos, ruta) else 1
+    except OSError as error:
+        print(f"❌ No se pudo hablar con el residente: {error}", file=sys.stderr)
+        return 2
+
+
+def _consulta_rapida(argumentos):
+    # Reconoce "consultar [--socket RUTA] [COMANDO ...]" sin pasar por argparse (que tarda
+    # más en importarse que lo que dura la consulta) y devuelve (comandos, ruta).
+    # Con cualquier otra forma devuelve None y main() usa argparse como siempre
+    if argumentos[:1] != ["consultar"]:
+        return None
+    ruta = None
+    comandos = argumentos[1:]
+    if comandos[:1] == ["--socket"] and len(comandos) > 1:
+        ruta, comandos = comandos[1], comandos[2:]
+    if any(comando.startswith("-") for comando in comandos):
+        return None
+    return comandos, ruta
+
+# =============================================================================
+# PASO 19: FUNCIÓN PRINCIPAL DEL PROGRAMA
+# =============================================================================
+def menu_principal():
+    """
+    Esta es la función principal que controla todo el programa
+    Usa un bucle while True para que el programa siga funcionando hasta que el usuario decida salir
+    """
+    # Mensaje de bienvenida (como el que ya tenías)
+    print("="*60)
+    print("    CALCULADORA FINANCIERA PERSONAL")
+    print("="*60)
+    print("Señor usuario, el siguiente programa le permitirá ver un")
+    print("Resumen Financiero sobre sus Ingresos y Gastos mensuales\n")
+    
+    # Cargamos los datos guardados en sesiones anteriores
+    try:
+        abrir_almacen()
+        if len(lista_ingresos) or len(lista_gastos):
+            print(f"📂 Se cargaron {len(lista_ingresos):,} ingresos y {len(lista_gastos):,} gastos guardados")
+    except (OSError, ValueError) as error:
+        print(f"⚠️  No se pudieron cargar los datos guardados: {error}")
+        print("   Los cambios de esta sesión no se guardarán en disco.")
+    
+    # Los presupuestos avisan en pantalla apenas un gasto cruza el 80% o el 100%
+    # (se activan después de cargar los datos, para no avisar de gastos viejos)
+    try:
+        cargar_presupuestos(cuenta_actual.presupuestos, almacen.directorio if almacen else None)
+    except (OSError, ValueError) as error:
+        print(f"⚠️  No se pudieron cargar los presupuestos: {error}")
+    cuenta_actual.presupuestos.agregar_destino(lambda alerta: print(texto_alerta(alerta)))
+    
+    try:
+        _bucle_menu_principal()
+    finally:
+        if almacen is not None:  # Pase lo que pase, dejamos todo guardado en disco
+            almacen.cerrar()
+
+def _bucle_menu_principal():
+    """
+    Muestra el menú principal una y otra vez hasta que el usuario elige salir
+    """
+    # Bucle principal del programa
+    while True:  # Este bucle hace que el programa siga funcionando
+        # Mostramos el menú (como el que ya tenías)
+        print("\n" + "="*50)
+        print("Menu Calculadora Financiera Personal:")
+        print("="*50)
+        print("1. Registrar Ingresos")
+        print("2. Registrar Gastos")
+        print("3. Ver Resumen Financiero")
+        print("4. Modificar o Eliminar Registros")
+        print("5. Importar desde Archivo (CSV / JSONL)")
+        print("6. Presupuestos por Categoría")
+        print("7. Salir del programa")
+        print("="*50)
+        
+        # Pedimos la opción al usuario
+        opcion = pedir_opcion_menu("Por favor digite el número de la opción que desea: ", 7)
+        
+        # Usamos match-case como pedían en los requisitos
+        match opcion:
+            case 1:
+                registrar_ingresos()
+            case 2:
+                registrar_gastos()
+            case 3:
+                desde, hasta = elegir_periodo()
+                mostrar_resumen(desde, hasta)
+            case 4:
+                menu_modificar_eliminar()
+            case 5:
+                importar_registros()
+            case 6:
+                menu_presupuestos()
+            case 7:
+                # Mensaje de despedida
+                print("\n" + "="*50)
+                print("  GRACIAS POR USAR LA CALCULADORA FINANCIERA")
+                print("="*50)
+                print("¡Que tenga un excelente día! 💰")
+                break  # Salimos del bucle while y terminamos el programa
+        
+        # Después de cada opción sacamos las lápidas si ya son muchas
+        # y dejamos los cambios guardados en disco
+        cuenta_actual.compactar_si_conviene()
+        if almacen is not None:
+            almacen.sincronizar()
+
+# =============================================================================
+# PASO 20: EJECUTAR EL PROGRAMA
+# =============================================================================
+def main(argumentos=None):
+    """
+    Sin argumentos abre el menú de siempre. También acepta subcomandos:
+    - servidor: atiende a muchos usuarios por red
+    - carga: mide la latencia del servidor con muchos clientes a la vez
+    - benchmark: mide las operaciones principales con libros de 10^3 a 10^7 registros
+    - lote: ejecuta un archivo de comandos JSON (uno por línea) sin menús y sin preguntar nada
+    - listar: escribe los ingresos, los gastos o el resumen en texto, CSV o JSON
+    - residente: carga los libros una vez y atiende comandos por un socket Unix
+    - consultar: manda comandos al residente y escribe sus respuestas
+    - arranque: mide cuánto tarda importar el archivo y lo compara con el presupuesto
+    Con --metricas CARPETA (o la variable CALCULADORA_METRICAS) se miden las operaciones
+    y al terminar se escriben las métricas en esa carpeta
+    """
+    consulta = _consulta_rapida(sys.argv[1:] if argumentos is None else argumentos)
+    if consulta is not None:
+        sys.exit(ejecutar_consulta(*consulta))  # Lo más corto posible: ver PASO 18
+
+    import argparse
+    analizador = argparse.ArgumentParser(description="Calculadora Financiera Personal")
+    analizador.add_argument("--metricas", default=os.environ.get("CALCULADORA_METRICAS"),
+                            help="Carpeta donde escribir metricas.prom al terminar (enciende la instrumentación)")
+    analizador.add_argument("--memoria", action="store_true",
+                            default="memoria" in os.environ.get("CALCULADORA_METRICAS_EXTRA", ""),
+                            help="Medir también la memoria con tracemalloc (más lento)")
+    analizador.add_argument("--perfil", action="store_true",
+                            default="perfil" in os.environ.get("CALCULADORA_METRICAS_EXTRA", ""),
+                            help="Tomar muestras de las pilas y escribir perfil.folded (para un flamegraph)")
+    subcomandos = analizador.add_subparsers(dest="comando")
+
+    servidor = subcomandos.add_parser("servidor", help="Atender muchas cuentas por red (JSON por líneas)")
+    servidor.add_argument("--host", default="127.0.0.1")
+    servidor.add_argument("--puerto", type=int, default=8765)
+    servidor.add_argument("--datos", help="Carpeta donde guardar las cuentas (sin ella, todo queda en memoria)")
+
+    carga = subcomandos.add_parser("carga", help="Generar carga contra el servidor y medir latencias")
+    carga.add_argument("--host", default="127.0.0.1")
+    carga.add_argument("--puerto", type=int, default=8765)
+    carga.add_argument("--clientes", type=int, default=50)
+    carga.add_argument("--peticiones", type=int, default=200, help="Peticiones por cliente")
+    carga.add_argument("--cuentas", type=int, default=1000, help="Cuántas cuentas distintas usar")
+    carga.add_argument("--local", action="store_true", help="Levantar un servidor en memoria para la prueba")
+
+    benchmark = subcomandos.add_parser("benchmark", help="Medir el rendimiento y compararlo con una medición base")
+    benchmark.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS_BENCHMARK))
+    benchmark.add_argument("--repeticiones", type=int, default=20)
+    benchmark.add_argument("--salida", default="benchmark.json", help="Archivo JSON con los resultados")
+    benchmark.add_argument("--base", help="Medición base para comparar (si no existe se crea con esta)")
+    benchmark.add_argument("--tolerancia", type=float, default=0.25, help="Cuánto puede empeorar sin ser regresión")
+
+    lote = subcomandos.add_parser("lote", help="Ejecutar comandos JSON (uno por línea) sin menús")
+    lote.add_argument("archivo", nargs="?", default="-", help="Archivo de comandos (sin él, o con -, se lee la entrada estándar)")
+    lote.add_argument("--datos", help="Carpeta de los datos guardados (por defecto la misma del menú)")
+    lote.add_argument("--en-memoria", action="store_true", help="No leer ni guardar nada en disco")
+    lote.add_argument("--detener", action="store_true", help="Parar en el primer comando con error")
+    lote.add_argument("--solo-errores", action="store_true", help="En el resultado, detallar solo los comandos con error")
+    lote.add_argument("--salida", help="Archivo donde escribir el resultado JSON (sin él, se escribe en pantalla)")
+
+    listado = subcomandos.add_parser("listar", help="Escribir ingresos, gastos o el resumen en texto, CSV o JSON")
+    listado.add_argument("que", choices=("ingresos", "gastos", "resumen"))
+    listado.add_argument("--formato", choices=FORMATOS_LISTADO, default="texto")
+    listado.add_argument("--datos", help="Carpeta de los datos guardados (por defecto la misma del menú)")
+    listado.add_argument("--desde", help="Solo para el resumen: primer día del periodo (AAAA-MM-DD)")
+    listado.add_argument("--hasta", help="Solo para el resumen: último día del periodo (AAAA-MM-DD)")
+    listado.add_argument("--salida", help="Archivo donde escribir (sin él, se escribe en pantalla)")
+
+    residente = subcomandos.add_parser("residente", help="Cargar los libros una vez y atender comandos por un socket Unix")
+    residente.add_argument("--datos", help="Carpeta de los datos guardados (por defecto la misma del menú)")
+    residente.add_argument("--socket", help=f"Ruta del socket (por defecto {ARCHIVO_SOCKET} en la carpeta de datos)")
+
+    consultar = subcomandos.add_parser("consultar", help="Mandar comandos JSON al residente")
+    consultar.add_argument("comandos", nargs="*", help="Comandos JSON (sin ellos se leen de la entrada estándar)")
+    consultar.add_argument("--datos", help="Carpeta de datos del residente (para encontrar su socket)")
+    consultar.add_argument("--socket", help="Ruta del socket del residente")
+
+    arranque = subcomandos.add_parser("arranque", help="Medir el tiempo de importación con -X importtime")
+    arranque.add_argument("--presupuesto", type=float, default=PRESUPUESTO_IMPORTACION_MS, help="Milisegundos permitidos")
+    arranque.add_argument("--repeticiones", type=int, default=5)
+
+    opciones = analizador.parse_args(argumentos)
+    if opciones.metricas:
+        activar_instrumentacion(memoria=opciones.memoria, perfil=opciones.perfil)
+    try:
+        if opciones.comando == "servidor":
+            iniciar_servidor(opciones.host, opciones.puerto, opciones.datos)
+        elif opciones.comando == "carga":
+            generar_carga(opciones.host, opciones.puerto, opciones.clientes, opciones.peticiones,
+                          opciones.cuentas, opciones.local)
+        elif opciones.comando == "benchmark":
+            reporte = ejecutar_benchmark(opciones.tamanos, opciones.repeticiones, opciones.salida,
+                                         opciones.base, opciones.tolerancia)
+            if reporte["regresiones"]:
+                sys.exit(1)  # Así un script (o la integración continua) nota la regresión
+        elif opciones.comando == "lote":
+            import json
+            reporte = ejecutar_lote_archivo(opciones.archivo, opciones.datos, opciones.en_memoria,
+                                            opciones.detener, opciones.solo_errores)
+            if opciones.salida:
+                with open(opciones.salida, "w", encoding="utf-8") as archivo:
+                    json.dump(reporte, archivo, ensure_ascii=False)
+            else:
+                json.dump(reporte, sys.stdout, ensure_ascii=False)
+                sys.stdout.write("\n")
+            if not reporte["ok"]:
+                sys.exit(1)  # Como en benchmark: un script nota que algún comando falló
+        elif opciones.comando == "listar":
+            abrir_almacen(opciones.datos)
+            try:
+                if opciones.salida:
+                    with open(opciones.salida, "w", encoding="utf-8", newline="") as archivo:
+                        listar(opciones.que, opciones.formato, archivo, opciones.desde, opciones.hasta)
+                else:
+                    listar(opciones.que, opciones.formato, None, opciones.desde, opciones.hasta)
+            finally:
+                almacen.cerrar()
+        elif opciones.comando == "residente":
+            if not iniciar_residente(opciones.datos, opciones.socket):
+                sys.exit(1)
+        elif opciones.comando == "consultar":
+            codigo = ejecutar_consulta(opciones.comandos, opciones.socket or ruta_socket(opciones.datos))
+            if codigo:
+                sys.exit(codigo)
+        elif opciones.comando == "arranque":
+            if not revisar_arranque(opciones.presupuesto, opciones.repeticiones):
+                sys.exit(1)  # Como en benchmark: la integración continua nota que el arranque empeoró
+        else:
+            menu_principal()  # Llamamos a la función principal
+    finally:
+        medida = desactivar_instrumentacion()
+        if medida is not None:
+            for ruta in medida.guardar(opciones.metricas):
+                print(f"📊 Métricas guardadas en {ruta}")
+
 # Esta línea hace que el programa empiece a funcionar
 if __name__ == "__main__":
-    menu_principal()  # Llamamos a la función principal
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,961 @@
+# PRUEBAS DE LA CALCULADORA FINANCIERA
+# Se corren con: python -m unittest (o python -m pytest)
+
+import asyncio
+import importlib.util
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from array import array
+from datetime import date, timedelta
+
+# El nombre del archivo tiene espacios y paréntesis, así que no se puede importar con "import"
+_RUTA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Calculadora_Financiera_V (1).py")
+_especificacion = importlib.util.spec_from_file_location("calculadora", _RUTA)
+calculadora = importlib.util.module_from_spec(_especificacion)
+sys.modules["calculadora"] = calculadora
+_especificacion.loader.exec_module(calculadora)
+
+
+class PruebaLibroComoLista(unittest.TestCase):
+    """LibroColumnar se usa igual que la lista de diccionarios de antes"""
+
+    def setUp(self):
+        self.libro = calculadora.LibroColumnar("nombre", True, calculadora.RegistroCategorias(["comida", "bus"]))
+        self.lista = []
+        for nombre, valor, categoria in (("pan", 2.5, "comida"), ("metro", 1.2, "bus"), ("leche", 3, "comida")):
+            self.libro.append({"nombre": nombre, "valor": valor, "categoria": categoria, "fecha": "2024-01-05"})
+            self.lista.append({"nombre": nombre, "valor": float(valor), "categoria": categoria, "fecha": "2024-01-05"})
+
+    def comparar(self):
+        self.assertEqual(len(self.libro), len(self.lista))
+        self.assertEqual([{campo: registro[campo] for campo in registro.keys()} for registro in self.libro],
+                         self.lista)
+        self.assertEqual(float(self.libro.total()), round(sum(registro["valor"] for registro in self.lista), 2))
+
+    def test_append_len_e_iteracion(self):
+        self.comparar()
+        self.assertEqual([registro.id for registro in self.libro], [1, 2, 3])
+
+    def test_indices_como_una_lista(self):
+        for indice in (0, 2, -1, -3):
+            with self.subTest(indice=indice):
+                self.assertEqual(self.libro[indice]["nombre"], self.lista[indice]["nombre"])
+        for indice in (3, -4):
+            with self.subTest(indice=indice), self.assertRaises(IndexError):
+                self.libro[indice]
+
+    def test_modificar_un_campo(self):
+        self.libro[1]["valor"] = 10
+        self.lista[1]["valor"] = 10.0
+        self.libro[0]["categoria"] = "bus"
+        self.lista[0]["categoria"] = "bus"
+        self.comparar()
+        self.assertEqual(self.libro.agregados.total_por_categoria(self.libro.categorias.nombres),
+                         {"comida": 300, "bus": 1250})  # En centavos
+
+    def test_pop(self):
+        eliminado = self.libro.pop(0)
+        self.assertEqual(eliminado["id"], 1)
+        self.assertEqual(eliminado["nombre"], self.lista.pop(0)["nombre"])
+        self.assertEqual(self.libro.pop()["nombre"], self.lista.pop()["nombre"])
+        self.comparar()
+        self.assertEqual(self.libro[0].id, 2)  # Los id no se corren al eliminar
+        self.libro.pop()
+        with self.assertRaises(IndexError):
+            self.libro.pop()
+
+    def test_campo_desconocido(self):
+        with self.assertRaises(KeyError):
+            self.libro[0]["descripcion"]
+
+
+class PruebaPeriodos(unittest.TestCase):
+    """Los resúmenes por periodo dan lo mismo que recorrer los registros de esas fechas"""
+
+    def setUp(self):
+        azar = random.Random(7)
+        self.cuenta = calculadora.CuentaFinanciera()
+        inicio = date(2023, 11, 20).toordinal()
+        self.dias = [date.fromordinal(inicio + azar.randrange(120)) for _ in range(400)]
+        for numero, dia in enumerate(self.dias):
+            valor = f"{azar.randrange(1, 100000) / 100:.2f}"
+            if numero % 4 == 0:
+                self.cuenta.registrar_ingreso("salario", valor, dia.isoformat())
+            else:
+                self.cuenta.registrar_gasto("gasto", valor, azar.randrange(1, 7), dia)
+        # Cambios después de cargar: las cubetas de cada día y de cada mes deben seguirlos
+        for id_registro in range(1, 60, 3):
+            if self.cuenta.gastos.existe(id_registro):
+                self.cuenta.eliminar_gasto(id_registro)
+        for id_registro in range(2, 80, 5):
+            if self.cuenta.gastos.existe(id_registro):
+                self.cuenta.modificar_gasto(id_registro, fecha=self.dias[-id_registro].isoformat(), valor="12.34")
+        self.azar = azar
+
+    def a_mano(self, desde, hasta):
+        # El resumen recorriendo los registros, como lo haría alguien con la lista de antes
+        def dentro(registro):
+            dia = date.fromisoformat(registro["fecha"])
+            return (desde is None or dia >= desde) and (hasta is None or dia <= hasta)
+
+        ingresos = [registro for registro in self.cuenta.ingresos if dentro(registro)]
+        gastos = [registro for registro in self.cuenta.gastos if dentro(registro)]
+        por_categoria = {}
+        for registro in gastos:
+            centavos = calculadora.a_centavos(registro["valor"])
+            por_categoria[registro["categoria"]] = por_categoria.get(registro["categoria"], 0) + centavos
+        return (len(ingresos), len(gastos), sum(calculadora.a_centavos(r["valor"]) for r in ingresos),
+                sum(calculadora.a_centavos(r["valor"]) for r in gastos), por_categoria)
+
+    def por_indice(self, desde, hasta):
+        resumen = calculadora.calcular_resumen(self.cuenta.ingresos, self.cuenta.gastos, desde, hasta)
+        return (resumen["cantidad_ingresos"], resumen["cantidad_gastos"],
+                calculadora.a_centavos(resumen["total_ingresos"]), calculadora.a_centavos(resumen["total_gastos"]),
+                {nombre: calculadora.a_centavos(monto)
+                 for nombre, (monto, _) in resumen["gastos_por_categoria"].items() if monto})
+
+    def test_rangos_al_azar(self):
+        periodos = [(None, None), (None, date(2024, 1, 1)), (date(2024, 2, 29), None),
+                    calculadora.periodo_mes(2024, 2), calculadora.periodo_mes(2023, 12),
+                    calculadora.periodo_trimestre(2024, 1)]
+        for _ in range(40):
+            desde, hasta = sorted(self.azar.sample(self.dias, 2))
+            periodos.append((desde, hasta))
+        for desde, hasta in periodos:
+            with self.subTest(desde=desde, hasta=hasta):
+                self.assertEqual(self.por_indice(desde, hasta), self.a_mano(desde, hasta))
+
+    def test_periodo_vacio_y_de_un_dia(self):
+        self.assertEqual(self.por_indice(date(2020, 1, 1), date(2020, 12, 31))[:4], (0, 0, 0, 0))
+        dia = self.dias[10]
+        self.assertEqual(self.por_indice(dia, dia), self.a_mano(dia, dia))
+
+    def test_categoria_en_un_periodo(self):
+        desde, hasta = calculadora.periodo_mes(2024, 1)
+        resumen = calculadora.calcular_resumen_categoria(self.cuenta.gastos, "transporte", desde, hasta)
+        cantidad = total = 0
+        for registro in self.cuenta.gastos:
+            if registro["categoria"] == "transporte" and desde <= date.fromisoformat(registro["fecha"]) <= hasta:
+                cantidad += 1
+                total += calculadora.a_centavos(registro["valor"])
+        self.assertEqual((resumen["cantidad"], calculadora.a_centavos(resumen["total"])), (cantidad, total))
+
+    def test_periodos_del_calendario(self):
+        self.assertEqual(calculadora.periodo_mes(2024, 2), (date(2024, 2, 1), date(2024, 2, 29)))
+        self.assertEqual(calculadora.periodo_mes(2023, 12), (date(2023, 12, 1), date(2023, 12, 31)))
+        self.assertEqual(calculadora.periodo_trimestre(2024, 4), (date(2024, 10, 1), date(2024, 12, 31)))
+
+    def test_fechas_invalidas(self):
+        for fecha in ("2024-02-30", "15/03/2024", 3.5, True):
+            with self.subTest(fecha=fecha), self.assertRaises(ValueError):
+                calculadora.validar_fecha(fecha)
+        self.assertEqual(calculadora.validar_fecha(" 2024-03-15 "), date(2024, 3, 15).toordinal())
+
+
+class PruebaBusqueda(unittest.TestCase):
+    """buscar() con el índice da los mismos registros que revisarlos uno por uno"""
+
+    NOMBRES = ("Taxi aeropuerto", "taxi", "Supermercado", "super cine", "Cine", "agua", "Luz y agua", "xi")
+
+    def setUp(self):
+        self.azar = random.Random(11)
+        self.cuenta = calculadora.CuentaFinanciera()
+        self.gastos = self.cuenta.gastos
+        for _ in range(150):
+            self.registrar()
+
+    def registrar(self):
+        self.cuenta.registrar_gasto(self.azar.choice(self.NOMBRES), self.azar.randrange(1, 5000) / 100,
+                                    self.azar.randrange(1, 7))
+
+    def a_mano(self, texto=None, prefijo=False, categoria=None, valor_min=None, valor_max=None):
+        busqueda = (texto or "").strip().lower()
+        ids = []
+        for registro in self.gastos:
+            nombre = registro["nombre"].lower()
+            if busqueda and not (nombre.startswith(busqueda) if prefijo else busqueda in nombre):
+                continue
+            if categoria is not None and registro["categoria"] != categoria:
+                continue
+            centavos = calculadora.a_centavos(registro["valor"])
+            if valor_min is not None and centavos < calculadora.a_centavos(valor_min):
+                continue
+            if valor_max is not None and centavos > calculadora.a_centavos(valor_max):
+                continue
+            ids.append(registro.id)
+        return ids
+
+    def comparar_consultas(self):
+        consultas = [{}, {"texto": "TAXI"}, {"texto": "xi"}, {"texto": "xi", "prefijo": True},
+                     {"texto": "su", "prefijo": True}, {"texto": " agua "}, {"texto": "nada"},
+                     {"categoria": "salud"}, {"valor_min": "10", "valor_max": "20.5"},
+                     {"texto": "cine", "categoria": "entretenimiento", "valor_max": 30}]
+        for _ in range(30):
+            consultas.append({"texto": self.azar.choice(self.NOMBRES)[self.azar.randrange(3):][:4],
+                              "categoria": self.azar.choice([None, "alimentacion", "transporte"]),
+                              "valor_min": self.azar.choice([None, 5, "12.34"])})
+        for filtros in consultas:
+            with self.subTest(filtros=filtros):
+                ids = [self.gastos.en_posicion(p).id for p in self.gastos.buscar(**filtros)]
+                self.assertEqual(ids, self.a_mano(**filtros))
+
+    def test_libro_recien_cargado(self):
+        self.comparar_consultas()
+
+    def test_el_indice_sigue_los_cambios(self):
+        self.comparar_consultas()  # Construye el índice; lo que sigue lo debe mantener al día
+        for _ in range(200):
+            accion = self.azar.randrange(5)
+            ids = [registro.id for registro in self.gastos]
+            id_registro = self.azar.choice(ids)
+            if accion == 0:
+                self.registrar()
+            elif accion == 1:
+                self.cuenta.modificar_gasto(id_registro, nombre=self.azar.choice(self.NOMBRES + ("Taxímetro",)))
+            elif accion == 2:
+                self.cuenta.modificar_gasto(id_registro, categoria=self.azar.randrange(1, 7),
+                                            valor=self.azar.randrange(1, 5000) / 100)
+            elif accion == 3:
+                self.cuenta.eliminar_gasto(id_registro)
+            elif self.azar.random() < 0.2:
+                self.gastos.compactar()
+        self.gastos.extender(["TAXI nocturno"] * 5, array("q", [999]) * 5, array("H", [1]) * 5)
+        self.comparar_consultas()
+
+    def test_paginas(self):
+        esperado = self.a_mano(texto="a")
+        vistos = []
+        pagina = 1
+        while True:
+            respuesta = self.cuenta.buscar("gastos", pagina=pagina, tamano=7, texto="a")
+            self.assertEqual(respuesta["total"], len(esperado))
+            self.assertEqual(respuesta["paginas"], -(-len(esperado) // 7))
+            vistos.extend(registro["id"] for registro in respuesta["registros"])
+            if pagina == respuesta["paginas"]:
+                break
+            pagina += 1
+        self.assertEqual(vistos, esperado)
+        # Una página de más devuelve la última
+        self.assertEqual(self.cuenta.buscar("gastos", pagina=999, tamano=7, texto="a")["pagina"], pagina)
+
+
+# Los procesos del resumen paralelo encuentran este módulo (que no se puede importar por su nombre)
+# solo si nacen como copia de este proceso
+_SOLO_CON_FORK = unittest.skipIf(__import__("multiprocessing").get_start_method() != "fork",
+                                 "los procesos hijos no pueden importar el archivo de la calculadora")
+
+
+@_SOLO_CON_FORK
+class PruebaResumenParalelo(unittest.TestCase):
+    """El resumen repartido entre procesos da lo mismo que calcular_resumen()"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cuenta = calculadora.cuenta_sintetica(5000, semilla=3)
+        for numero in range(20):
+            cls.cuenta.agregar_categoria(f"extra{numero}", "servicios" if numero % 2 else None)
+        cls.cuenta.gastos.extender(["extra"] * 300, array("q", range(1, 301)),
+                                   array("H", [len(calculadora.CATEGORIAS_INICIALES) + n % 20 for n in range(300)]))
+        cls.cuenta.gastos.eliminar_varios(range(1, 5000, 7))  # Lápidas que los procesos deben saltar
+        cls.cuenta.ingresos.eliminar_varios(range(1, 500, 3))
+
+    def comparar(self, procesos):
+        hoy = date.today()
+        for desde, hasta in ((None, None), (hoy - timedelta(days=100), hoy - timedelta(days=30)),
+                             (None, hoy - timedelta(days=200)), (hoy + timedelta(days=1), None)):
+            with self.subTest(procesos=procesos, desde=desde, hasta=hasta):
+                esperado = calculadora.calcular_resumen(self.cuenta.ingresos, self.cuenta.gastos, desde, hasta)
+                obtenido = calculadora.calcular_resumen_paralelo(self.cuenta.ingresos, self.cuenta.gastos,
+                                                                 desde, hasta, procesos=procesos)
+                self.assertEqual(obtenido, esperado)
+
+    def test_con_numpy(self):
+        if calculadora.cargar_numpy() is None:
+            self.skipTest("necesita NumPy")
+        self.comparar(3)
+
+    def test_sin_numpy(self):
+        # Los procesos nacen después del cambio, así que también suman sin NumPy
+        with mock.patch.object(calculadora, "cargar_numpy", lambda: None):
+            self.comparar(2)
+
+    def test_libros_vacios(self):
+        cuenta = calculadora.CuentaFinanciera()
+        self.assertEqual(calculadora.calcular_resumen_paralelo(cuenta.ingresos, cuenta.gastos, procesos=2),
+                         calculadora.calcular_resumen(cuenta.ingresos, cuenta.gastos))
+
+
+class PruebaInformes(unittest.TestCase):
+    """Los informes de texto, CSV y JSON"""
+
+    def setUp(self):
+        self.cuenta = calculadora.CuentaFinanciera()
+        self.cuenta.agregar_categoria("hogar")
+        self.cuenta.agregar_categoria("recibos", "hogar")
+        self.cuenta.agregar_categoria("luz", "recibos")
+        self.cuenta.registrar_ingreso("salario", "1000", "2024-03-01")
+        self.cuenta.registrar_gasto("recibo", "40.5", "luz", "2024-03-02")
+        self.cuenta.registrar_gasto("bus", "9.5", "transporte", "2024-03-03")
+
+    def escribir(self, funcion, *argumentos, **opciones):
+        destino = io.StringIO()
+        with calculadora.SalidaBuffer(destino, tamano=64) as salida:  # Bloques chicos: se escribe varias veces
+            funcion(*argumentos, salida, **opciones)
+        return destino.getvalue()
+
+    def test_ramas_con_el_catalogo_de_la_cuenta(self):
+        # La cuenta del menú no tiene estas categorías: las rutas deben salir del catálogo de esta cuenta
+        self.assertNotIn("luz", calculadora.cuenta_actual.categorias)
+        lineas = calculadora.lineas_resumen_en_cache(self.cuenta.ingresos, self.cuenta.gastos)
+        self.assertIn("🌳 Hogar > Recibos: $   40.50 (81.0%)", lineas)
+        texto = self.escribir(calculadora.escribir_resumen, self.cuenta.resumen(), catalogo=self.cuenta.categorias)
+        self.assertIn("🌳 Hogar > Recibos: $   40.50 (81.0%)\n", texto)
+
+    def agregar_registros_raros(self):
+        self.cuenta.registrar_gasto('pan "integral", grande', "1234567.8", "alimentacion", "2024-03-04")
+        self.cuenta.registrar_gasto("café\ncon leche", "0.05", "alimentacion", "2024-03-05")
+        self.cuenta.eliminar_gasto(2)  # Una lápida que los informes deben saltar
+
+    def test_listado_de_texto(self):
+        self.agregar_registros_raros()
+        esperado = "".join(calculadora.formatear_gasto(registro.id, registro) + "\n"
+                           for registro in self.cuenta.gastos)
+        self.assertEqual(self.escribir(calculadora.escribir_listado, self.cuenta.gastos), esperado)
+
+    def test_listado_csv(self):
+        import csv
+        self.agregar_registros_raros()
+        filas = list(csv.reader(io.StringIO(self.escribir(calculadora.escribir_listado, self.cuenta.gastos,
+                                                          formato="csv"))))
+        self.assertEqual(filas[0], ["nombre", "valor", "categoria", "fecha", "id"])
+        esperado = [[registro["nombre"], f"{calculadora.a_centavos(registro['valor']) / 100:.2f}",
+                     registro["categoria"], registro["fecha"], str(registro.id)] for registro in self.cuenta.gastos]
+        self.assertEqual(filas[1:], esperado)
+
+    def test_listado_json(self):
+        import json
+        self.agregar_registros_raros()
+        texto = self.escribir(calculadora.escribir_listado, self.cuenta.gastos, formato="json")
+        self.assertEqual(json.loads(texto), [registro.a_diccionario() for registro in self.cuenta.gastos])
+        posiciones = self.cuenta.gastos.buscar(texto="pan")
+        texto = self.escribir(calculadora.escribir_listado, self.cuenta.gastos, formato="json", posiciones=posiciones)
+        self.assertEqual([registro["nombre"] for registro in json.loads(texto)], ['pan "integral", grande'])
+        vacio = calculadora.LibroColumnar("descripcion")
+        self.assertEqual(json.loads(self.escribir(calculadora.escribir_listado, vacio, formato="json")), [])
+
+    def test_resumen_csv_y_json(self):
+        import csv
+        import json
+        resumen = self.cuenta.resumen()
+        filas = list(csv.reader(io.StringIO(self.escribir(calculadora.escribir_resumen, resumen, formato="csv"))))
+        self.assertEqual(filas[0], ["categoria", "total", "porcentaje"])
+        self.assertIn(["luz", "40.50", "81.0"], filas)
+        datos = json.loads(self.escribir(calculadora.escribir_resumen, resumen, formato="json"))
+        self.assertEqual(datos["total_gastos"], 50.0)
+        self.assertEqual(datos["gastos_por_categoria"]["transporte"], [9.5, 19.0])
+
+    def test_formato_desconocido(self):
+        for funcion, datos in ((calculadora.escribir_listado, self.cuenta.gastos),
+                               (calculadora.escribir_resumen, self.cuenta.resumen())):
+            with self.subTest(funcion=funcion.__name__), self.assertRaises(ValueError):
+                self.escribir(funcion, datos, formato="xml")
+
+    def test_salida_por_bloques(self):
+        destino = io.StringIO()
+        salida = calculadora.SalidaBuffer(destino, tamano=100)
+        salida.escribir_lineas(["abc", "defgh"])
+        self.assertEqual(destino.getvalue(), "")  # Todavía no llegó a 100 caracteres
+        salida.escribir_lineas(f"linea {numero}" for numero in range(2500))
+        self.assertTrue(destino.getvalue().startswith("abc\ndefgh\nlinea 0\n"))
+        salida.flush()
+        self.assertEqual(destino.getvalue().count("\n"), 2502)
+
+class PruebaPresupuestos(unittest.TestCase):
+    """Las alertas de presupuesto salen una vez, en el gasto que cruza cada umbral"""
+
+    def setUp(self):
+        self.cuenta = calculadora.CuentaFinanciera()
+        self.alertas = []
+        self.cuenta.presupuestos.agregar_destino(self.alertas.append)
+        self.cuenta.presupuestos.fijar("transporte", "100")
+
+    def cruces(self):
+        return [(alerta["categoria"], alerta["mes"], alerta["umbral"], alerta["id"]) for alerta in self.alertas]
+
+    def gasto(self, valor, fecha="2024-05-10", categoria="transporte"):
+        return self.cuenta.registrar_gasto("bus", valor, categoria, fecha)["id"]
+
+    def test_cada_umbral_una_vez(self):
+        self.gasto("79.99")
+        self.assertEqual(self.alertas, [])
+        id_80 = self.gasto("0.01")
+        self.gasto("10")
+        id_100 = self.gasto("15")
+        self.gasto("50")
+        self.assertEqual(self.cruces(), [("transporte", "2024-05", 80, id_80), ("transporte", "2024-05", 100, id_100)])
+        self.assertEqual(self.alertas[1]["gastado"], 105.0)
+        self.assertEqual(self.alertas[1]["porcentaje"], 105.0)
+
+    def test_otro_mes_y_otra_categoria_no_suman(self):
+        self.gasto("70", "2024-05-31")
+        self.gasto("70", "2024-06-01")
+        self.gasto("70", "2024-05-20", "salud")
+        self.assertEqual(self.alertas, [])
+
+    def test_un_gasto_cruza_los_dos_umbrales(self):
+        id_registro = self.gasto("150")
+        self.assertEqual([alerta["umbral"] for alerta in self.alertas], [80, 100])
+        self.assertEqual({alerta["id"] for alerta in self.alertas}, {id_registro})
+
+    def test_volver_a_cruzar_despues_de_eliminar(self):
+        primero = self.gasto("85")
+        self.cuenta.eliminar_gasto(primero)
+        segundo = self.gasto("85")
+        self.assertEqual([alerta["id"] for alerta in self.alertas], [primero, segundo])
+
+    def test_modificar_valor_categoria_y_fecha(self):
+        id_registro = self.gasto("10")
+        self.cuenta.modificar_gasto(id_registro, valor="90")      # Sube dentro del mismo mes
+        otro = self.gasto("90", categoria="salud")
+        self.cuenta.modificar_gasto(otro, categoria="transporte")  # Entra a la categoría con presupuesto
+        mudado = self.gasto("90", "2024-06-03")
+        self.cuenta.modificar_gasto(mudado, fecha="2024-04-03")    # Llega a otro mes
+        self.cuenta.modificar_gasto(id_registro, valor="5")       # Bajar no avisa
+        self.assertEqual(self.cruces(), [("transporte", "2024-05", 80, id_registro),
+                                         ("transporte", "2024-05", 100, otro),
+                                         ("transporte", "2024-06", 80, mudado),
+                                         ("transporte", "2024-04", 80, mudado)])
+
+    def test_lote_avisa_igual_que_uno_por_uno(self):
+        azar = random.Random(5)
+        self.cuenta.presupuestos.fijar("salud", "40")
+        inicio = date(2024, 1, 25).toordinal()
+        filas = [(azar.randrange(100, 3000), azar.choice([2, 4, 5]), inicio + azar.randrange(40)) for _ in range(300)]
+        for centavos, codigo, dia in filas:
+            self.cuenta.registrar_gasto("x", calculadora.Dinero(centavos), codigo, dia)
+        uno_por_uno = self.cruces()
+
+        otra = calculadora.CuentaFinanciera()
+        otra.presupuestos.fijar("transporte", "100")
+        otra.presupuestos.fijar("salud", "40")
+        self.alertas = []
+        otra.presupuestos.agregar_destino(self.alertas.append)
+        otra.gastos.extender(["x"] * len(filas), array("q", [fila[0] for fila in filas]),
+                             array("H", [fila[1] - 1 for fila in filas]), array("i", [fila[2] for fila in filas]))
+        self.assertTrue(uno_por_uno)
+        self.assertEqual(self.cruces(), uno_por_uno)
+
+    def test_destinos(self):
+        import queue
+        cola = queue.Queue()
+        self.cuenta.presupuestos.agregar_destino(cola)
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, "alertas.jsonl")
+            self.cuenta.presupuestos.agregar_destino(ruta)
+
+            def falla(alerta):
+                raise OSError("disco lleno")
+
+            self.cuenta.presupuestos.agregar_destino(falla)
+            self.gasto("80")
+            self.cuenta.presupuestos.cerrar()
+            with open(ruta, encoding="utf-8") as archivo:
+                self.assertEqual(len(archivo.readlines()), 1)
+        self.assertEqual(cola.get_nowait()["umbral"], 80)
+        self.assertEqual(len(self.alertas), 1)
+        self.assertEqual(self.cuenta.presupuestos.fallos, 1)
+        with self.assertRaises(TypeError):
+            self.cuenta.presupuestos.agregar_destino(42)
+
+    def test_estado_y_guardado(self):
+        self.gasto("30", date.today())
+        estado = self.cuenta.presupuestos.estado()
+        self.assertEqual(estado[0]["gastado"], 30.0)
+        self.assertEqual(estado[0]["restante"], 70.0)
+        otra = calculadora.CuentaFinanciera()
+        otra.presupuestos.cargar_estado(self.cuenta.presupuestos.a_estado())
+        self.assertEqual(otra.presupuestos.limites, self.cuenta.presupuestos.limites)
+        self.cuenta.presupuestos.quitar("transporte")
+        self.gasto("500")
+        self.assertEqual(self.alertas, [])
+
+
+class PruebaCacheResumenes(unittest.TestCase):
+    """Un resumen guardado se reusa mientras los libros no cambien, y ni un cambio más"""
+
+    def setUp(self):
+        self.cache = calculadora.CacheResumenes()
+        cambio = mock.patch.object(calculadora, "cache_resumenes", self.cache)
+        cambio.start()
+        self.addCleanup(cambio.stop)
+        self.cuenta = calculadora.CuentaFinanciera()
+        self.cuenta.registrar_ingreso("salario", "1000")
+        self.cuenta.registrar_gasto("bus", "10", "transporte")
+        self.cuenta.registrar_gasto("cine", "20", "entretenimiento")
+
+    def resumen(self):
+        return self.cuenta.resumen()
+
+    def assertVigente(self):
+        # Lo que da la caché es lo mismo que calcular de nuevo
+        self.assertEqual(self.resumen(), calculadora.calcular_resumen(self.cuenta.ingresos, self.cuenta.gastos))
+
+    def test_segunda_lectura_sale_de_la_cache(self):
+        primero = self.resumen()
+        self.assertIs(self.resumen(), primero)
+        self.assertEqual((self.cache.calculos, self.cache.aciertos), (1, 1))
+
+    def test_cada_cambio_invalida(self):
+        cambios = [
+            lambda: self.cuenta.registrar_gasto("pan", "3", "alimentacion"),
+            lambda: self.cuenta.registrar_ingreso("bono", "5"),
+            lambda: self.cuenta.modificar_gasto(1, valor="11"),
+            lambda: self.cuenta.modificar_gasto(1, categoria="salud"),
+            lambda: self.cuenta.gastos[0].__setitem__("valor", 12),
+            lambda: self.cuenta.eliminar_gasto(2),
+            lambda: self.cuenta.eliminar_donde("gastos", texto="pan"),
+            lambda: self.cuenta.gastos.extender(["luz"], array("q", [700]), array("H", [5])),
+            lambda: self.cuenta.agregar_categoria("taxi", "transporte"),  # transporte pasa a ser una rama
+        ]
+        for numero, cambio in enumerate(cambios):
+            with self.subTest(cambio=numero):
+                antes = self.resumen()
+                cambio()
+                self.assertIsNot(self.resumen(), antes)
+                self.assertVigente()
+        self.assertIn("gastos_por_rama", self.resumen())
+
+    def test_compactar_no_invalida(self):
+        self.cuenta.eliminar_gasto(1)
+        antes = self.resumen()
+        self.cuenta.gastos.compactar()
+        self.assertIs(self.resumen(), antes)
+
+    def test_categoria_solo_depende_de_los_gastos(self):
+        antes = self.cuenta.resumen_categoria("transporte")
+        self.cuenta.registrar_ingreso("bono", "5")
+        self.assertIs(self.cuenta.resumen_categoria("transporte"), antes)
+        self.cuenta.registrar_gasto("taxi", "5", "transporte")
+        self.assertEqual(self.cuenta.resumen_categoria("transporte")["total"], 15.0)
+
+    def test_periodos(self):
+        hoy = date.today()
+        primero = self.cuenta.resumen(hoy.isoformat(), hoy)
+        self.assertIs(self.cuenta.resumen(hoy, hoy.toordinal()), primero)  # El mismo día escrito de otra forma
+        self.assertIsNot(self.cuenta.resumen(hoy - timedelta(days=1), hoy), primero)
+
+    def test_cuentas_distintas(self):
+        otra = calculadora.CuentaFinanciera()
+        self.assertEqual(otra.resumen()["cantidad_gastos"], 0)
+        self.assertEqual(self.resumen()["cantidad_gastos"], 2)
+
+    def test_limite_de_entradas(self):
+        cache = calculadora.CacheResumenes(limite=2)
+        cache.obtener("a", lambda: 1)
+        cache.obtener("b", lambda: 2)
+        cache.obtener("a", lambda: 0)  # "a" pasa a ser la más reciente
+        cache.obtener("c", lambda: 3)  # Sale "b"
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.obtener("a", lambda: "calculado"), 1)
+        self.assertEqual(cache.obtener("b", lambda: "calculado"), "calculado")
+
+
+class PruebaArbolCategorias(unittest.TestCase):
+    """El árbol de categorías y los totales por rama"""
+
+    def setUp(self):
+        azar = random.Random(9)
+        self.catalogo = calculadora.RegistroCategorias(["raiz"])
+        for numero in range(1, 200):
+            padre = azar.choice([None] + self.catalogo.nombres)
+            self.catalogo.agregar(f"c{numero}", padre)
+        self.totales = {codigo: azar.randrange(1, 10000) for codigo in azar.sample(range(200), 120)}
+
+    def ancestros(self, codigo):
+        # La categoría y todas las que la contienen, subiendo por los padres
+        while codigo >= 0:
+            yield codigo
+            codigo = self.catalogo.padres[codigo]
+
+    def test_acumular_como_sumar_cada_rama(self):
+        esperado = {}
+        for codigo, total in self.totales.items():
+            for ancestro in self.ancestros(codigo):
+                esperado[ancestro] = esperado.get(ancestro, 0) + total
+        self.assertEqual(self.catalogo.acumular(self.totales), esperado)
+
+    def test_en_orden_y_rutas(self):
+        orden = list(self.catalogo.en_orden())
+        self.assertEqual(sorted(orden), list(range(len(self.catalogo))))
+        # Cada categoría sale después de su padre, seguida de todos sus descendientes
+        vistos = set()
+        for codigo in orden:
+            padre = self.catalogo.padres[codigo]
+            self.assertTrue(padre < 0 or padre in vistos)
+            vistos.add(codigo)
+        for codigo in orden:
+            ruta = self.catalogo.ruta(codigo).split(" > ")
+            self.assertEqual(ruta, [self.catalogo.nombres[c] for c in reversed(list(self.ancestros(codigo)))])
+            self.assertEqual(len(ruta) - 1, self.catalogo.profundidades[codigo])
+        for posicion, codigo in enumerate(orden):
+            descendientes = {c for c in range(len(self.catalogo)) if c != codigo and codigo in self.ancestros(c)}
+            self.assertEqual(set(orden[posicion + 1:posicion + 1 + len(descendientes)]), descendientes)
+
+    def test_nombres_repetidos_y_no_validos(self):
+        padre = self.catalogo.nombres[self.catalogo.padres[150]] if self.catalogo.padres[150] >= 0 else None
+        self.assertEqual(self.catalogo.agregar(" C150 ", padre), 150)  # Otra vez en el mismo lugar
+        otro_padre = "raiz" if padre != "raiz" else "c1"
+        for nombre, padre in (("c150", otro_padre), ("", None), ("42", None), ("a > b", None), ("x", "nada")):
+            with self.subTest(nombre=nombre, padre=padre), self.assertRaises(ValueError):
+                self.catalogo.agregar(nombre, padre)
+
+    def test_cargar_en_otro_orden(self):
+        # Los mismos nombres con otros códigos: una categoría principal creada antes que "raiz"
+        ultima_principal = max(c for c in range(len(self.catalogo)) if self.catalogo.padres[c] < 0)
+        otro = calculadora.RegistroCategorias([self.catalogo.nombres[ultima_principal], "raiz"])
+        traduccion = otro.cargar_estado(self.catalogo.a_estado())
+        for codigo in range(len(self.catalogo)):
+            self.assertEqual(otro.nombres[traduccion[codigo]], self.catalogo.nombres[codigo])
+            self.assertEqual(otro.ruta(traduccion[codigo]), self.catalogo.ruta(codigo))
+
+    def test_resumen_por_rama(self):
+        cuenta = calculadora.CuentaFinanciera()
+        cuenta.agregar_categoria("energia", "servicios")
+        cuenta.agregar_categoria("electricidad", "energia")
+        cuenta.agregar_categoria("gas", "energia")
+        cuenta.registrar_ingreso("salario", "1000")
+        for nombre, valor, categoria in (("agua", "10", "servicios"), ("luz", "25.5", "electricidad"),
+                                         ("gas", "4.5", "gas"), ("bus", "60", "transporte")):
+            cuenta.registrar_gasto(nombre, valor, categoria)
+        resumen = cuenta.resumen()
+        self.assertEqual(resumen["gastos_por_rama"], {"servicios": (40.0, 40.0), "energia": (30.0, 30.0)})
+        self.assertEqual(resumen["gastos_por_categoria"]["servicios"], (10.0, 10.0))
+        categoria = cuenta.resumen_categoria("energia")
+        self.assertEqual((categoria["total"], categoria["total_rama"], categoria["cantidad_rama"]), (0.0, 30.0, 2))
+        self.assertNotIn("total_rama", cuenta.resumen_categoria("gas"))
+        self.assertEqual([fila["ruta"] for fila in cuenta.lista_categorias()][5:],
+                         ["servicios", "servicios > energia", "servicios > energia > electricidad",
+                          "servicios > energia > gas"])
+
+
+class PruebaDatosMalosEnElServidor(unittest.TestCase):
+    """Un comando JSON con un campo del tipo equivocado recibe un error, no cierra la conexión"""
+
+    def setUp(self):
+        self.servidor = calculadora.ServidorCalculadora()
+
+    def procesar(self, peticion):
+        return asyncio.run(self.servidor.procesar({"cuenta": "ana", **peticion}))
+
+    def test_descripcion_que_no_es_texto(self):
+        respuesta = self.procesar({"op": "registrar_ingreso", "descripcion": 5, "valor": "10"})
+        self.assertFalse(respuesta["ok"])
+        self.assertIn("descripcion", respuesta["error"])
+
+    def test_categoria_con_decimales(self):
+        respuesta = self.procesar({"op": "registrar_gasto", "nombre": "bus", "valor": "2", "categoria": 1.5})
+        self.assertFalse(respuesta["ok"])
+
+    def test_categoria_booleana(self):
+        respuesta = self.procesar({"op": "registrar_gasto", "nombre": "bus", "valor": "2", "categoria": True})
+        self.assertFalse(respuesta["ok"])
+
+    def test_pagina_y_tamano_deben_ser_enteros(self):
+        self.procesar({"op": "registrar_gasto", "nombre": "bus", "valor": "2", "categoria": 2})
+        for campos in ({"pagina": "2"}, {"pagina": 1.5}, {"tamano": "10"}, {"tamano": -1}):
+            with self.subTest(campos=campos):
+                respuesta = self.procesar({"op": "buscar", "libro": "gastos", **campos})
+                self.assertFalse(respuesta["ok"])
+        respuesta = self.procesar({"op": "buscar", "libro": "gastos", "pagina": 1, "tamano": 5})
+        self.assertTrue(respuesta["ok"])
+        self.assertEqual(respuesta["resultado"]["total"], 1)
+
+    def test_valor_booleano(self):
+        respuesta = self.procesar({"op": "registrar_ingreso", "descripcion": "salario", "valor": True})
+        self.assertFalse(respuesta["ok"])
+        with self.assertRaises(ValueError):
+            calculadora.validar_numero_positivo(True)
+
+    def test_eliminar_donde_sin_filtros_de_verdad(self):
+        for nombre in ("bus", "pan", "luz"):
+            self.procesar({"op": "registrar_gasto", "nombre": nombre, "valor": "2", "categoria": 1})
+        for campos in ({"prefijo": True}, {"texto": "   "}, {"texto": "  ", "prefijo": True}, {}):
+            with self.subTest(campos=campos):
+                respuesta = self.procesar({"op": "eliminar_donde", "libro": "gastos", **campos})
+                self.assertFalse(respuesta["ok"])
+        respuesta = self.procesar({"op": "eliminar_donde", "libro": "gastos", "texto": " b ", "prefijo": True})
+        self.assertEqual(respuesta["resultado"]["eliminados"], 1)
+        self.assertEqual(self.procesar({"op": "resumen"})["resultado"]["cantidad_gastos"], 2)
+
+    def test_operacion_que_no_es_texto(self):
+        respuesta = self.procesar({"op": ["resumen"]})
+        self.assertFalse(respuesta["ok"])
+
+    def test_error_inesperado_no_corta_la_conexion(self):
+        import contextlib
+        import json
+
+        def explota(cuenta, comando):
+            raise KeyError(comando.get("id"))
+
+        class Escritor:
+            def __init__(self):
+                self.lineas = []
+
+            def write(self, datos):
+                self.lineas.append(json.loads(datos))
+
+            async def drain(self):
+                pass
+
+            def close(self):
+                pass
+
+        async def conversar():
+            lector = asyncio.StreamReader()
+            for peticion in ({"cuenta": "ana", "op": "explota", "id": 7},
+                             {"cuenta": "ana", "op": "registrar_ingreso", "descripcion": "x", "valor": "1"}):
+                lector.feed_data(json.dumps(peticion).encode("utf-8") + b"\n")
+            lector.feed_eof()
+            escritor = Escritor()
+            await self.servidor.atender(lector, escritor)
+            return escritor.lineas
+
+        with mock.patch.dict(calculadora.OPERACIONES, {"explota": explota}), \
+                contextlib.redirect_stderr(io.StringIO()) as consola:
+            respuestas = asyncio.run(conversar())
+        self.assertEqual([respuesta["ok"] for respuesta in respuestas], [False, True])
+        self.assertIn("KeyError", respuestas[0]["error"])
+        self.assertIn("Traceback", consola.getvalue())  # El detalle queda en la consola del servidor
+
+    def test_el_comando_bueno_sigue_funcionando(self):
+        respuesta = self.procesar({"op": "registrar_ingreso", "descripcion": "salario", "valor": "10"})
+        self.assertTrue(respuesta["ok"])
+        self.assertEqual(respuesta["resultado"]["valor"], 10.0)
+
+
+class PruebaDatosMalosEnElLote(unittest.TestCase):
+    """En el modo por lotes un dato malo es el error de su línea; los demás comandos siguen"""
+
+    def test_dato_malo_queda_en_su_linea(self):
+        comandos = [
+            {"op": "registrar_ingreso", "descripcion": 5, "valor": "10"},
+            {"op": "registrar_gasto", "nombre": "bus", "valor": "2", "categoria": 1.5},
+            {"op": "buscar", "libro": "gastos", "pagina": "2"},
+            {"op": "registrar_ingreso", "descripcion": "salario", "valor": "10"},
+        ]
+        reporte = calculadora.ejecutar_lote(comandos, calculadora.CuentaFinanciera())
+        self.assertEqual((reporte["correctos"], reporte["errores"]), (1, 3))
+        self.assertEqual([resultado["linea"] for resultado in reporte["resultados"] if not resultado["ok"]],
+                         [1, 2, 3])
+        self.assertEqual(reporte["resumen"]["total_ingresos"], 10.0)
+
+
+class PruebaCompactarEnOtroHilo(unittest.TestCase):
+    """El resumen no ve un libro a medio compactar (el servidor compacta en otro hilo)"""
+
+    def test_cantidades_durante_la_compactacion(self):
+        cuenta = calculadora.CuentaFinanciera()
+        cantidad = 400_000
+        cuenta.gastos.extender(["x"] * cantidad, array("q", [100]) * cantidad, array("H", [1]) * cantidad)
+        cuenta.gastos.eliminar_varios(range(1, cantidad // 5 + 1))
+        vivos = cantidad - cantidad // 5
+        hilo = threading.Thread(target=cuenta.gastos.compactar)
+        hilo.start()
+        while hilo.is_alive():
+            self.assertEqual(calculadora.calcular_resumen(cuenta.ingresos, cuenta.gastos)["cantidad_gastos"], vivos)
+            self.assertEqual(len(cuenta.gastos), vivos)
+        hilo.join()
+        self.assertEqual(cuenta.gastos._eliminados, 0)
+        self.assertEqual(len(cuenta.gastos._ids), vivos)
+
+
+class PruebaIndicesConLapidas(unittest.TestCase):
+    """libro[i] y pop(i) cuentan solo los vivos, sin compactar el libro en cada acceso"""
+
+    def test_indices_como_una_lista(self):
+        libro = calculadora.LibroColumnar("nombre", True)
+        cantidad = 3 * calculadora.BLOQUE_POSICIONES
+        libro.extender(["x"] * cantidad, array("q", [1]) * cantidad, array("H", [0]) * cantidad)
+        lista = list(range(1, cantidad + 1))
+        libro.eliminar_varios(range(1, cantidad, 3))
+        del lista[0::3]
+        for indice in (0, 1, calculadora.BLOQUE_POSICIONES, len(lista) - 1, -1, -len(lista)):
+            with self.subTest(indice=indice):
+                self.assertEqual(libro[indice].id, lista[indice])
+        self.assertEqual(libro.pop(0)["id"], lista.pop(0))
+        self.assertEqual(libro.pop(-2)["id"], lista.pop(-2))
+        self.assertTrue(libro._eliminados)  # Nada de esto compactó el libro
+        self.assertEqual([registro.id for registro in libro], lista)
+        with self.assertRaises(IndexError):
+            libro[len(lista)]
+
+
+class PruebaImportar(unittest.TestCase):
+    """Importar un CSV o JSONL: filas buenas al libro, malas al archivo de rechazos"""
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+
+    def archivo(self, nombre, texto):
+        ruta = os.path.join(self.carpeta, nombre)
+        with open(ruta, "w", encoding="utf-8", newline="") as archivo:
+            archivo.write(texto)
+        return ruta
+
+    def test_rechazos_con_el_encabezado_del_archivo(self):
+        import csv
+        ruta = self.archivo("gastos.csv", "Fecha,Categoria,Valor,Nombre\n"
+                                          "2024-01-02,transporte,2.5,bus\n"
+                                          "2024-01-03,transporte,-4,taxi\n"
+                                          "2024-01-04,nada,3,pan\n")
+        cuenta = calculadora.CuentaFinanciera()
+        reporte = calculadora.importar_archivo(ruta, cuenta.gastos)
+        self.assertEqual((reporte["aceptadas"], reporte["rechazadas"]), (1, 2))
+        self.assertEqual(cuenta.gastos[0].a_diccionario(), {"nombre": "bus", "valor": 2.5, "categoria": "transporte",
+                                                            "fecha": "2024-01-02", "id": 1})
+        with open(reporte["archivo_rechazos"], encoding="utf-8", newline="") as archivo:
+            filas = list(csv.reader(archivo))
+        self.assertEqual(filas[0], ["Fecha", "Categoria", "Valor", "Nombre", "motivo"])
+        self.assertEqual([fila[:4] for fila in filas[1:]], [["2024-01-03", "transporte", "-4", "taxi"],
+                                                              ["2024-01-04", "nada", "3", "pan"]])
+        # Corregido a mano, el archivo de rechazos se puede volver a importar tal cual
+        ruta = self.archivo("corregido.csv", "".join(
+            ",".join(fila[:4]) + "\n" for fila in [filas[0]] + [["2024-01-03", "transporte", "4", "taxi"]]))
+        self.assertEqual(calculadora.importar_archivo(ruta, cuenta.gastos)["aceptadas"], 1)
+
+    def test_jsonl(self):
+        ruta = self.archivo("ingresos.jsonl", '{"descripcion": "salario", "valor": "1000.50"}\n'
+                                              '[1, 2]\n'
+                                              '{"descripcion": "bono", "valor": 5, "fecha": "2024-02-01"}\n'
+                                              '{"descripcion": "roto"\n')
+        cuenta = calculadora.CuentaFinanciera()
+        reporte = calculadora.importar_archivo(ruta, cuenta.ingresos, tamano_bloque=1)
+        self.assertEqual((reporte["aceptadas"], reporte["rechazadas"]), (2, 2))
+        self.assertEqual(cuenta.ingresos.agregados.total, 100550)
+
+    def test_lo_importado_queda_en_disco(self):
+        ruta = self.archivo("gastos.csv", "nombre,valor,categoria\nbus,2,transporte\npan,3,alimentacion\n")
+        cuenta = calculadora.CuentaFinanciera()
+        almacen = calculadora.AlmacenPersistente(os.path.join(self.carpeta, "datos"), cuenta.libros()).abrir()
+        calculadora.importar_archivo(ruta, cuenta.gastos, almacen=almacen)
+        almacen._diario.close()  # Cierre brusco: sin cerrar() ni sincronizar()
+
+        otra = calculadora.CuentaFinanciera()
+        calculadora.AlmacenPersistente(almacen.directorio, otra.libros()).abrir().cerrar()
+        self.assertEqual(otra.gastos.agregados.total, 500)
+
+
+class PruebaDiarioDespuesDeImportar(unittest.TestCase):
+    """Lo importado llega a disco antes que los cambios que lo usan, y un diario malo no cierra el programa"""
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+
+    def abrir(self):
+        cuenta = calculadora.CuentaFinanciera()
+        almacen = calculadora.AlmacenPersistente(self.carpeta, cuenta.libros()).abrir()
+        return cuenta, almacen
+
+    def cierre_brusco(self, almacen):
+        # Lo escrito queda en disco pero no se llama a cerrar() (ni a la última sincronización)
+        almacen._fsync()
+        almacen._diario.close()
+
+    def test_eliminar_despues_de_importar(self):
+        cuenta, almacen = self.abrir()
+        cuenta.gastos.extender(["bus", "pan"], array("q", [200, 300]), array("H", [1, 1]))
+        cuenta.eliminar_gasto(1)
+        cuenta.registrar_gasto("luz", "5", 3)
+        self.cierre_brusco(almacen)
+
+        cuenta, almacen = self.abrir()
+        self.assertEqual([registro.id for registro in cuenta.gastos], [2, 3])
+        self.assertEqual(cuenta.gastos.agregados.total, 800)
+        almacen.cerrar()
+
+    def escribir_diario(self, *lineas):
+        with open(os.path.join(self.carpeta, "diario.jsonl"), "w", encoding="utf-8") as diario:
+            for linea in lineas:
+                diario.write(linea + "\n")
+
+    def test_agregar_conserva_el_id(self):
+        self.escribir_diario(
+            '{"n": 1, "libro": "gastos", "op": "agregar", "id": 7, '
+            '"registro": {"nombre": "bus", "valor": 2.0, "categoria": "transporte", "id": 7}}',
+            '{"n": 2, "libro": "gastos", "op": "eliminar", "id": 7}')
+        cuenta, almacen = self.abrir()
+        self.assertEqual(len(cuenta.gastos), 0)
+        self.assertEqual(cuenta.registrar_gasto("pan", "1", 1)["id"], 8)
+        almacen.cerrar()
+
+    def test_diario_que_no_se_puede_repetir(self):
+        self.escribir_diario('{"n": 1, "libro": "gastos", "op": "eliminar", "id": 1}')
+        with self.assertRaises(ValueError):
+            self.abrir()
+
+
+class PruebaAnalisisConTotalesGrandes(unittest.TestCase):
+    """analizar_lote da los mismos centavos que calcular_resumen aunque pasen de 2**53"""
+
+    @unittest.skipIf(calculadora.cargar_numpy() is None, "necesita NumPy")
+    def test_sumas_exactas(self):
+        cuenta = calculadora.CuentaFinanciera()
+        valores = array("q", [2**53 - 1, 9, 1])
+        cuenta.ingresos.extender(["salario"] * 3, valores)
+        cuenta.gastos.extender(["casa"] * 3, valores, array("H", [1, 1, 2]))
+        esperado = calculadora.calcular_resumen(cuenta.ingresos, cuenta.gastos)
+        obtenido = calculadora.analizar_lote([(cuenta.ingresos, cuenta.gastos)])[0]
+        for clave in ("total_ingresos", "total_gastos", "saldo_disponible"):
+            with self.subTest(clave=clave):
+                self.assertEqual(obtenido[clave], esperado[clave])
+        self.assertEqual({nombre: monto for nombre, (monto, _) in obtenido["gastos_por_categoria"].items()},
+                         {nombre: monto for nombre, (monto, _) in esperado["gastos_por_categoria"].items()})
+
+    @unittest.skipIf(calculadora.cargar_numpy() is None, "necesita NumPy")
+    def test_suma_de_todas_las_filas_que_no_cabe_en_int64(self):
+        # Cada casilla cabe en int64 pero la suma de todas las filas no: pesos.sum() daría la vuelta
+        # y los totales grandes se sumarían en float64, perdiendo centavos
+        np = calculadora.cargar_numpy()
+        casillas = np.array([0, 1, 1, 2], dtype=np.intp)
+        pesos = np.array([2**62 + 1, 2**61 + 3, 2**61 + 5, 7], dtype=np.int64)
+        sumas = calculadora._sumar_por_casilla(np, casillas, pesos, 3)
+        self.assertEqual(sumas.tolist(), [2**62 + 1, 2**62 + 8, 7])
+
+    @unittest.skipIf(calculadora.cargar_numpy() is None, "necesita NumPy")
+    def test_lote_vacio(self):
+        self.assertEqual(calculadora.analizar_lote([]), [])
+
+
+class PruebaArranque(unittest.TestCase):
+    """Importar el archivo (con -X importtime, en un Python nuevo) cabe en el presupuesto y no carga lo pesado"""
+
+    def test_presupuesto_de_importacion(self):
+        medida = calculadora.medir_importacion(repeticiones=3)
+        self.assertEqual(medida["pesados"], [])
+        self.assertLessEqual(medida["milisegundos"], calculadora.PRESUPUESTO_IMPORTACION_MS)
+
+    def test_no_carga_numpy_asyncio_ni_multiprocessing(self):
+        import subprocess
+        carpeta, archivo = os.path.split(_RUTA)
+        codigo = (f"import sys; sys.path.insert(0, {carpeta!r}); __import__({os.path.splitext(archivo)[0]!r}); "
+                  "print(*sorted(m for m in ('numpy', 'asyncio', 'multiprocessing') if m in sys.modules))")
+        proceso = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                                 capture_output=True, text=True, check=True)
+        self.assertEqual(proceso.stdout.strip(), "")
+        cargados = {linea.rpartition("|")[2].strip().partition(".")[0] for linea in proceso.stderr.splitlines()}
+        self.assertFalse(cargados & {"numpy", "asyncio", "multiprocessing"})
+
+
+if __name__ == "__main__":
+    unittest.main()